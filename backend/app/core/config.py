@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,11 +15,105 @@ class Settings(BaseSettings):
     
     # OpenAI Configuration
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Point the client at another OpenAI-compatible server (e.g. openai_stub_server.py)
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    
+    # OpenAI Rate Limiting (adaptive per-model concurrency, retries and budgets)
+    OPENAI_INITIAL_CONCURRENCY: int = int(os.getenv("OPENAI_INITIAL_CONCURRENCY", 8))
+    OPENAI_MIN_CONCURRENCY: int = int(os.getenv("OPENAI_MIN_CONCURRENCY", 1))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", 64))
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", 5))
+    OPENAI_BACKOFF_BASE_SECONDS: float = float(os.getenv("OPENAI_BACKOFF_BASE_SECONDS", 0.5))
+    OPENAI_BACKOFF_MAX_SECONDS: float = float(os.getenv("OPENAI_BACKOFF_MAX_SECONDS", 30))
+    # Share of concurrency and rate-limit budget that background work may not use
+    OPENAI_INTERACTIVE_RESERVE: float = float(os.getenv("OPENAI_INTERACTIVE_RESERVE", 0.2))
+    # Halve concurrency when average latency exceeds this multiple of the baseline (0 = off)
+    OPENAI_LATENCY_BACKOFF_FACTOR: float = float(os.getenv("OPENAI_LATENCY_BACKOFF_FACTOR", 3.0))
     
     # Pinecone Configuration
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "profile-embeddings")
     PINECONE_CLOUD: str = os.getenv("PINECONE_CLOUD", "aws")
     PINECONE_REGION: str = os.getenv("PINECONE_REGION", "us-east-1")
+    # "slim" keeps only filterable fields on vectors and hydrates profiles from MongoDB;
+    # "full" stores the whole profile as vector metadata
+    PINECONE_METADATA_MODE: str = os.getenv("PINECONE_METADATA_MODE", "slim")
+    # Store BM25 sparse vectors and run hybrid queries (needs an index with the dotproduct metric)
+    PINECONE_HYBRID_SEARCH: bool = os.getenv("PINECONE_HYBRID_SEARCH", "false").lower() == "true"
+    # Upserts are packed into requests of at most this many estimated bytes (Pinecone accepts
+    # 2 MB) and vectors, and this many requests run at once across the process
+    PINECONE_UPSERT_MAX_BYTES: int = int(os.getenv("PINECONE_UPSERT_MAX_BYTES", 1800000))
+    PINECONE_UPSERT_MAX_VECTORS: int = int(os.getenv("PINECONE_UPSERT_MAX_VECTORS", 1000))
+    PINECONE_UPSERT_CONCURRENCY: int = int(os.getenv("PINECONE_UPSERT_CONCURRENCY", 8))
+    PINECONE_UPSERT_MAX_RETRIES: int = int(os.getenv("PINECONE_UPSERT_MAX_RETRIES", 3))
+    
+    # Vector Store Configuration
+    # "pinecone", or "local" for the in-process exact index (no external vector database)
+    VECTOR_STORE: str = os.getenv("VECTOR_STORE", "pinecone")
+    LOCAL_VECTOR_STORE_DIR: str = os.getenv("LOCAL_VECTOR_STORE_DIR", "vector_store")
+    # float16 halves memory and disk per vector, but queries convert it to float32 and run slower
+    LOCAL_VECTOR_STORE_DTYPE: str = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")
+    # "int8" or "binary" scans compact codes in memory and rescores a shortlist from the full
+    # vectors on disk ("none" = exact scan); applies to namespaces created afterwards
+    LOCAL_VECTOR_STORE_QUANTIZATION: str = os.getenv("LOCAL_VECTOR_STORE_QUANTIZATION", "none")
+    # Shortlist size, as a multiple of top_k, rescored exactly after a quantized scan
+    LOCAL_VECTOR_STORE_RESCORE_FACTOR: int = int(os.getenv("LOCAL_VECTOR_STORE_RESCORE_FACTOR", 10))
+    
+    # Embedding Model Configuration
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Shortened text-embedding-3 vectors (e.g. 512 or 768) cut storage and query cost;
+    # change them on a running deployment with migrate_embedding_index.py
+    EMBEDDING_DIMENSIONS: int = int(os.getenv("EMBEDDING_DIMENSIONS", 1536))
+    
+    # Embedding Cache Configuration
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE", "float16")
+    EMBEDDING_CACHE_TTL_DAYS: float = float(os.getenv("EMBEDDING_CACHE_TTL_DAYS", 90))
+    EMBEDDING_CACHE_MAX_MB: float = float(os.getenv("EMBEDDING_CACHE_MAX_MB", 512))
+    
+    # Embedding Request Limits (per input, and per request across all inputs)
+    EMBEDDING_MAX_INPUT_TOKENS: int = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", 8191))
+    EMBEDDING_MAX_REQUEST_TOKENS: int = int(os.getenv("EMBEDDING_MAX_REQUEST_TOKENS", 300000))
+    EMBEDDING_MAX_REQUEST_INPUTS: int = int(os.getenv("EMBEDDING_MAX_REQUEST_INPUTS", 2048))
+    
+    # Ingestion Pipeline Configuration
+    INGEST_EMBED_CONCURRENCY: int = int(os.getenv("INGEST_EMBED_CONCURRENCY", 2))
+    INGEST_UPSERT_CONCURRENCY: int = int(os.getenv("INGEST_UPSERT_CONCURRENCY", 2))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", 4))
+    # CSVs at least this large are canonicalized in a process pool (0 = never)
+    INGEST_PROCESS_POOL_MIN_MB: float = float(os.getenv("INGEST_PROCESS_POOL_MIN_MB", 10))
+    # 0 = one worker per core, minus one for the API process
+    INGEST_PROCESS_POOL_WORKERS: int = int(os.getenv("INGEST_PROCESS_POOL_WORKERS", 0))
+    
+    # Ingestion Job Configuration
+    # "celery" runs jobs on dedicated workers (celery -A app.worker worker); "local" in the API process
+    INGEST_JOB_RUNNER: str = os.getenv("INGEST_JOB_RUNNER", "celery")
+    CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
+    # Uploaded CSVs wait here until their job finishes; must be shared with the workers
+    INGEST_UPLOAD_DIR: str = os.getenv("INGEST_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "superconnector_ingest"))
+    INGEST_JOB_MAX_ATTEMPTS: int = int(os.getenv("INGEST_JOB_MAX_ATTEMPTS", 3))
+    INGEST_JOB_HEARTBEAT_SECONDS: float = float(os.getenv("INGEST_JOB_HEARTBEAT_SECONDS", 10))
+    # A running job whose heartbeat is older than this is considered abandoned and resumed
+    INGEST_JOB_STALE_SECONDS: float = float(os.getenv("INGEST_JOB_STALE_SECONDS", 120))
+    # Build each upload into a new versioned namespace ({user_id}__v{n}) and switch searches
+    # to it once complete; "false" updates the user's namespace in place
+    INGEST_NAMESPACE_SWAP: bool = os.getenv("INGEST_NAMESPACE_SWAP", "true").lower() == "true"
+    # Replaced namespaces are deleted this long after the switch, once searches using them are done
+    NAMESPACE_GC_DELAY_SECONDS: float = float(os.getenv("NAMESPACE_GC_DELAY_SECONDS", 60))
+    
+    # Retrieval Configuration
+    RERANK_MAX_CONCURRENCY: int = int(os.getenv("RERANK_MAX_CONCURRENCY", 4))
+    # In-process LRU caches for query rewrites and query embeddings (0 entries = off)
+    QUERY_REWRITE_CACHE_SIZE: int = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", 2000))
+    QUERY_REWRITE_CACHE_TTL_SECONDS: float = float(os.getenv("QUERY_REWRITE_CACHE_TTL_SECONDS", 3600))
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 2000))
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", 86400))
+    # Also share both caches between API processes through the query_cache collection
+    QUERY_CACHE_SHARED: bool = os.getenv("QUERY_CACHE_SHARED", "false").lower() == "true"
+    # Ranked results of recent searches, so later pages are served without rerunning the search
+    SEARCH_SESSION_MAX_ENTRIES: int = int(os.getenv("SEARCH_SESSION_MAX_ENTRIES", 1000))
+    SEARCH_SESSION_TTL_SECONDS: float = float(os.getenv("SEARCH_SESSION_TTL_SECONDS", 1800))
+    # Identical searches in flight at the same time share one run of the pipeline
+    SEARCH_COALESCING_ENABLED: bool = os.getenv("SEARCH_COALESCING_ENABLED", "true").lower() == "true"
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, TypeVar
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+# How often a running search checks that its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+class DisconnectStats:
+    # Searches cancelled because their client went away
+    searches: int = 0
+
+disconnect_stats = DisconnectStats()
+
+async def cancel_on_disconnect(request: Request, search: asyncio.Task) -> bool:
+    """
+    Cancel a search, and the OpenAI calls it is waiting on, once its client
+    disconnects. Returns whether it was cancelled.
+    """
+    while not search.done():
+        if await request.is_disconnected():
+            search.cancel()
+            disconnect_stats.searches += 1
+            print("Search client disconnected; cancelled the search")
+            return True
+        await asyncio.wait({search}, timeout=DISCONNECT_POLL_SECONDS)
+    return False
+
+async def run_until_disconnected(request: Request, search: Awaitable[T]) -> T:
+    """Await a search, cancelling it if the client disconnects first (then raises a 499)."""
+    task = asyncio.ensure_future(search)
+    watcher = asyncio.create_task(cancel_on_disconnect(request, task))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if watcher.done() and watcher.result():
+            raise HTTPException(status_code=499, detail="Client closed request")
+        raise
+    finally:
+        watcher.cancel()
@@ -0,0 +1,49 @@
+import logging
+from typing import Optional
+import httpx
+import openai
+from .config import settings
+from .openai_governor import openai_governor
+
+logger = logging.getLogger(__name__)
+
+class OpenAIClient:
+    client: Optional[openai.AsyncOpenAI] = None
+    http_client: Optional[httpx.AsyncClient] = None
+
+openai_client = OpenAIClient()
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """
+    Return the process-wide AsyncOpenAI client, creating it on first use.
+
+    All services share one client so embedding, rewrite and rerank calls reuse
+    a single pooled httpx.AsyncClient and never block the event loop. Retries
+    are left to the OpenAI governor, which sees every response's rate-limit
+    headers through the client's response hook.
+    """
+    if openai_client.client is None:
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+        # Create a custom HTTP client without proxy configuration
+        openai_client.http_client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            event_hooks={"response": [openai_governor.observe_response]}
+        )
+        openai_client.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            max_retries=0,
+            http_client=openai_client.http_client
+        )
+        logger.info("Shared AsyncOpenAI client initialized.")
+    return openai_client.client
+
+async def close_openai_client():
+    logger.info("Closing shared AsyncOpenAI client...")
+    if openai_client.client is not None:
+        await openai_client.client.close()
+    openai_client.client = None
+    openai_client.http_client = None
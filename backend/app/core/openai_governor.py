@@ -0,0 +1,380 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import math
+import random
+import re
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+import httpx
+import openai
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Byte-pair tokens average ~4-5 UTF-8 bytes of English text; 3 keeps estimates
+# on the safe side without a tokenizer dependency.
+BYTES_PER_TOKEN = 3.0
+
+RESET_PART_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+RESET_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Set to a one-item list to count the requests a task (and the tasks it starts) sends
+request_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "openai_request_counter", default=None
+)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError,
+)
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+    INTERACTIVE = 0  # search, rerank, query rewrite, email drafting
+    BACKGROUND = 1   # ingestion
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token count for a text."""
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def estimate_chat_tokens(messages: List[Dict[str, Any]], max_tokens: int = 0) -> int:
+    """Tokens a chat completion counts against the budget: prompt plus max_tokens."""
+    return sum(estimate_tokens(str(message.get("content", ""))) for message in messages) + max_tokens
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse an x-ratelimit-reset-* value such as '1s', '6m0s' or '120ms' into seconds."""
+    if not value:
+        return None
+    parts = RESET_PART_PATTERN.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * RESET_UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+class PrioritySlots:
+    """
+    Semaphore with an adjustable limit that grants waiting slots by priority.
+
+    Background callers may only use the slots left after the interactive
+    reserve, so a search never queues behind ingestion.
+    """
+
+    def __init__(self, limit: int, interactive_reserve: float):
+        self.limit = limit
+        self.interactive_reserve = interactive_reserve
+        self.active = 0
+        self._waiters: List = []
+        self._sequence = itertools.count()
+
+    def _limit_for(self, priority: Priority) -> int:
+        if priority == Priority.INTERACTIVE or self.limit <= 1:
+            return self.limit
+        return max(1, self.limit - math.ceil(self.limit * self.interactive_reserve))
+
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: Priority) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        # Grants in priority order, so an interactive caller never waits behind
+        # background callers held back by the reserve
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled: hand the slot on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= self._limit_for(priority):
+                return
+            heapq.heappop(self._waiters)
+            self.active += 1
+            future.set_result(None)
+
+
+class ModelState:
+    """Rate-limit budget, adaptive concurrency and counters for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.slots = PrioritySlots(settings.OPENAI_INITIAL_CONCURRENCY, settings.OPENAI_INTERACTIVE_RESERVE)
+        self.successes_since_increase = 0
+        self.last_decrease = 0.0
+
+        # From x-ratelimit-* headers; None until the API has told us
+        self.limit_requests: Optional[int] = None
+        self.remaining_requests: Optional[float] = None
+        self.requests_reset_at: Optional[float] = None
+        self.requests_observed_at: Optional[float] = None
+        self.limit_tokens: Optional[int] = None
+        self.remaining_tokens: Optional[float] = None
+        self.tokens_reset_at: Optional[float] = None
+        self.tokens_observed_at: Optional[float] = None
+
+        self.latency_ewma: Optional[float] = None
+        self.latency_baseline: Optional[float] = None
+
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        # Requests abandoned in flight because the caller was cancelled
+        self.cancelled = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": self.slots.limit,
+            "active": self.slots.active,
+            "waiting": self.slots.waiting(),
+            "remaining_requests": self.remaining_requests,
+            "remaining_tokens": self.remaining_tokens,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma else None,
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "cancelled": self.cancelled,
+        }
+
+
+class OpenAIGovernor:
+    """
+    Client-side governor for all OpenAI traffic.
+
+    Every call goes through run(), which per model:
+    - waits for a concurrency slot, interactive calls ahead of background ones;
+    - waits when the request/token budget reported by x-ratelimit-* headers
+      (debited locally for calls in flight) would not cover the call, keeping a
+      reserve of the budget for interactive calls;
+    - adapts the concurrency limit AIMD-style: +1 after a limit's worth of
+      successes, halved on 429s, on a near-empty budget, or when latency climbs
+      well above its baseline;
+    - retries 429s, connection errors and 5xx with jittered exponential backoff,
+      honouring retry-after.
+
+    Response headers are observed through an httpx response hook on the shared
+    client (see observe_response), so callers only pass the model they call.
+    """
+
+    def __init__(self):
+        self.models: Dict[str, ModelState] = {}
+
+    def _state(self, model: str) -> ModelState:
+        if model not in self.models:
+            self.models[model] = ModelState(model)
+        return self.models[model]
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority = Priority.INTERACTIVE,
+        estimated_tokens: int = 0
+    ) -> T:
+        """
+        Run an OpenAI call under the governor.
+
+        Args:
+            model: Model the call uses (budgets and concurrency are per model)
+            call: Zero-argument function returning the API coroutine, called once per attempt
+            priority: INTERACTIVE for user-facing requests, BACKGROUND for ingestion
+            estimated_tokens: Tokens the call counts against the budget
+
+        Returns:
+            The call's result
+        """
+        state = self._state(model)
+        attempt = 0
+        while True:
+            await state.slots.acquire(priority)
+            started = None
+            try:
+                await self._wait_for_budget(state, priority, estimated_tokens)
+                self._debit(state, estimated_tokens)
+                state.requests += 1
+                counter = request_counter.get()
+                if counter is not None:
+                    counter[0] += 1
+                started = time.monotonic()
+                result = await call()
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, openai.RateLimitError):
+                    state.rate_limited += 1
+                    self._decrease(state, "rate limited")
+                if attempt >= settings.OPENAI_MAX_RETRIES:
+                    state.failures += 1
+                    raise
+                attempt += 1
+                state.retries += 1
+                delay = self._backoff(attempt, e)
+                logger.warning(f"OpenAI {model} call failed ({type(e).__name__}); retry {attempt} in {delay:.2f}s")
+            except asyncio.CancelledError:
+                if started is not None:
+                    state.cancelled += 1
+                raise
+            except Exception:
+                state.failures += 1
+                raise
+            else:
+                self._record_success(state, time.monotonic() - started)
+                return result
+            finally:
+                state.slots.release()
+            await asyncio.sleep(delay)
+
+    async def _wait_for_budget(self, state: ModelState, priority: Priority, tokens: int) -> None:
+        while True:
+            wait = self._budget_wait(state, priority, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(wait, settings.OPENAI_BACKOFF_MAX_SECONDS))
+
+    def _budget_wait(self, state: ModelState, priority: Priority, tokens: int) -> float:
+        """
+        Seconds until the budget covers this call, or 0 if it can go now.
+
+        The API refills budgets continuously, reaching the limit at the reset
+        time, so the remaining budget is projected linearly from the last
+        response's headers.
+        """
+        now = time.monotonic()
+        wait = 0.0
+        for kind, needed in (("requests", 1), ("tokens", tokens)):
+            remaining = getattr(state, f"remaining_{kind}")
+            limit = getattr(state, f"limit_{kind}")
+            reset_at = getattr(state, f"{kind}_reset_at")
+            observed_at = getattr(state, f"{kind}_observed_at")
+            if remaining is None or not limit or reset_at is None or now >= reset_at:
+                continue
+            reserve = limit * settings.OPENAI_INTERACTIVE_RESERVE if priority == Priority.BACKGROUND else 0
+            # A call larger than the whole budget can only wait for a full reset
+            deficit = min(needed + reserve, limit) - remaining
+            if deficit <= 0:
+                continue
+            refill_seconds = (reset_at - observed_at) * deficit / max(limit - remaining, 1)
+            wait = max(wait, observed_at + refill_seconds - now)
+        return wait
+
+    def _debit(self, state: ModelState, tokens: int) -> None:
+        # Headers only arrive with responses, so account for calls in flight ourselves
+        now = time.monotonic()
+        if state.remaining_requests is not None and state.requests_reset_at and now < state.requests_reset_at:
+            state.remaining_requests -= 1
+        if state.remaining_tokens is not None and state.tokens_reset_at and now < state.tokens_reset_at:
+            state.remaining_tokens -= tokens
+
+    def _record_success(self, state: ModelState, latency: float) -> None:
+        state.latency_ewma = latency if state.latency_ewma is None else 0.8 * state.latency_ewma + 0.2 * latency
+        # The baseline follows improvements immediately and degradations slowly
+        state.latency_baseline = state.latency_ewma if state.latency_baseline is None else min(
+            state.latency_ewma, state.latency_baseline * 1.01
+        )
+
+        factor = settings.OPENAI_LATENCY_BACKOFF_FACTOR
+        if factor and state.latency_ewma > factor * state.latency_baseline:
+            self._decrease(state, f"latency {state.latency_ewma:.2f}s vs baseline {state.latency_baseline:.2f}s")
+            return
+
+        state.successes_since_increase += 1
+        if state.successes_since_increase >= state.slots.limit and state.slots.limit < settings.OPENAI_MAX_CONCURRENCY:
+            state.successes_since_increase = 0
+            state.slots.set_limit(state.slots.limit + 1)
+
+    def _decrease(self, state: ModelState, reason: str) -> None:
+        now = time.monotonic()
+        # One decrease per congestion event: calls already in flight report the same event
+        if now - state.last_decrease < max(1.0, state.latency_ewma or 0):
+            return
+        state.last_decrease = now
+        state.successes_since_increase = 0
+        new_limit = max(settings.OPENAI_MIN_CONCURRENCY, state.slots.limit // 2)
+        if new_limit != state.slots.limit:
+            logger.info(f"OpenAI {state.model} concurrency {state.slots.limit} -> {new_limit} ({reason})")
+            state.slots.set_limit(new_limit)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's retry-after."""
+        ceiling = min(settings.OPENAI_BACKOFF_MAX_SECONDS, settings.OPENAI_BACKOFF_BASE_SECONDS * 2 ** attempt)
+        delay = random.uniform(0, ceiling)
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after-ms")
+            retry_after = float(retry_after) / 1000 if retry_after else parse_reset(response.headers.get("retry-after"))
+            if retry_after:
+                delay = min(settings.OPENAI_BACKOFF_MAX_SECONDS, retry_after) + random.uniform(0, settings.OPENAI_BACKOFF_BASE_SECONDS)
+        return delay
+
+    def observe_headers(self, model: str, headers: httpx.Headers) -> None:
+        """Update a model's budget from the x-ratelimit-* headers of a response."""
+        state = self._state(model)
+        now = time.monotonic()
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}"))
+            try:
+                setattr(state, f"remaining_{kind}", float(remaining))
+                if limit is not None:
+                    setattr(state, f"limit_{kind}", int(limit))
+            except ValueError:
+                continue
+            setattr(state, f"{kind}_reset_at", now + reset if reset is not None else None)
+            setattr(state, f"{kind}_observed_at", now)
+
+            # Running low: back off before the API starts refusing
+            limit_value = getattr(state, f"limit_{kind}")
+            if limit_value and float(remaining) < limit_value * settings.OPENAI_INTERACTIVE_RESERVE / 2:
+                self._decrease(state, f"{kind} budget low")
+
+    async def observe_response(self, response: httpx.Response) -> None:
+        """httpx response hook: feed rate-limit headers into the governor."""
+        if "x-ratelimit-remaining-requests" not in response.headers and "x-ratelimit-remaining-tokens" not in response.headers:
+            return
+        try:
+            model = json.loads(response.request.content or b"{}").get("model")
+        except (ValueError, AttributeError, httpx.RequestNotRead):
+            model = None
+        if model:
+            self.observe_headers(model, response.headers)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model concurrency, budget and retry counters."""
+        return {model: state.to_dict() for model, state in self.models.items()}
+
+
+# Global instance
+openai_governor = OpenAIGovernor()
@@ -0,0 +1,45 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class ProcessPool:
+    executor: Optional[ProcessPoolExecutor] = None
+    max_workers: int = 0
+
+process_pool = ProcessPool()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the process-wide pool for CPU-heavy ingestion work, creating it on first use.
+
+    Workers are spawned rather than forked, so they never inherit the event loop,
+    MongoDB client or open sockets of the API process, and sized to leave a core
+    for request handling.
+    """
+    # A worker that died (e.g. OOM-killed) leaves the pool unusable; start a fresh one
+    if process_pool.executor is not None and getattr(process_pool.executor, "_broken", False):
+        process_pool.executor.shutdown(wait=False, cancel_futures=True)
+        process_pool.executor = None
+        process_pool.max_workers = 0
+
+    if process_pool.executor is None:
+        max_workers = settings.INGEST_PROCESS_POOL_WORKERS or max(1, (os.cpu_count() or 1) - 1)
+        process_pool.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        process_pool.max_workers = max_workers
+        logger.info(f"Ingestion process pool started with {max_workers} workers.")
+    return process_pool.executor
+
+def close_process_pool():
+    logger.info("Shutting down ingestion process pool...")
+    if process_pool.executor is not None:
+        process_pool.executor.shutdown(wait=True, cancel_futures=True)
+    process_pool.executor = None
+    process_pool.max_workers = 0
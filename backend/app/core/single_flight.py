@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from .openai_governor import request_counter
+
+logger = logging.getLogger(__name__)
+
+EventCallback = Callable[[Any], None]
+
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.joined = 0
+        self.openai_requests = [0]
+        self.events: List[Any] = []
+        self.listeners: List[EventCallback] = []
+
+    def emit(self, event: Any) -> None:
+        self.events.append(event)
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Event listener failed: {e}")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    The first call for a key runs the work in its own task; calls for the same
+    key made while it runs await that task instead of starting their own. The
+    work reports progress through the emit function it is given; every caller
+    with an on_event callback gets the events emitted so far when it joins,
+    then each later one as it happens. The task is shielded from its callers:
+    a caller that is cancelled (say its client went away) stops waiting, and
+    the work is only cancelled once every caller has stopped waiting. Results
+    and errors go to every caller.
+
+    The OpenAI requests the work sends are counted (see
+    openai_governor.request_counter), so the stats report how many requests
+    coalescing saved.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.flights: Dict[Hashable, _Flight] = {}
+
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.openai_requests_saved = 0
+
+    async def run(
+        self,
+        key: Hashable,
+        work: Callable[[EventCallback], Awaitable[Any]],
+        on_event: Optional[EventCallback] = None
+    ) -> Any:
+        """
+        Run work for key, or join the run already in flight for key.
+
+        Args:
+            key: Identifies calls whose results are interchangeable
+            work: Function taking an emit callback and returning the coroutine to run
+            on_event: Called with each event the work emits
+
+        Returns:
+            The work's result, shared by every caller that joined
+        """
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.create_task(self._lead(flight, work))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, task))
+            self.flights[key] = flight
+            self.leaders += 1
+        else:
+            flight.joined += 1
+            self.coalesced += 1
+
+        if on_event is not None:
+            for event in flight.events:
+                on_event(event)
+            flight.listeners.append(on_event)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # The last caller is gone; stop the work, and let new callers start afresh
+                flight.task.cancel()
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+                self.cancelled += 1
+            raise
+        finally:
+            flight.waiters -= 1
+            if on_event is not None:
+                flight.listeners.remove(on_event)
+
+    async def _lead(self, flight: _Flight, work: Callable[[EventCallback], Awaitable[Any]]) -> Any:
+        # Runs in its own task, so the counter only sees this flight's requests
+        request_counter.set(flight.openai_requests)
+        return await work(flight.emit)
+
+    def _finish(self, key: Hashable, flight: _Flight, task: asyncio.Task) -> None:
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if task.cancelled():
+            return
+        if task.exception() is None and flight.joined:
+            self.openai_requests_saved += flight.openai_requests[0] * flight.joined
+            logger.info(
+                f"{self.name}: {flight.joined} identical calls joined one run, "
+                f"saving {flight.openai_requests[0] * flight.joined} OpenAI requests"
+            )
+
+    def get_stats(self) -> Dict[str, int]:
+        """Counters for this process."""
+        return {
+            "in_flight": len(self.flights),
+            "runs": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "openai_requests_saved": self.openai_requests_saved,
+        }
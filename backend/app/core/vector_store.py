@@ -0,0 +1,50 @@
+import logging
+import os
+from typing import Any, Dict, Optional
+from pinecone import Pinecone
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class VectorStore:
+    # Pinecone Index handles, or LocalVectorStores exposing the same methods, by index name
+    indexes: Dict[str, Any] = {}
+    pinecone_client: Optional[Pinecone] = None
+
+vector_store = VectorStore()
+
+def get_vector_index(index_name: Optional[str] = None) -> Optional[Any]:
+    """
+    Return the process-wide handle to a vector index (PINECONE_INDEX_NAME by
+    default) for the configured VECTOR_STORE backend, creating it on first use.
+
+    "pinecone" connects to the named Pinecone index (None without PINECONE_API_KEY);
+    "local" opens the in-process index under LOCAL_VECTOR_STORE_DIR/<index name>, so
+    the embeddings and retrieval services share one copy of each namespace.
+    """
+    index_name = index_name or settings.PINECONE_INDEX_NAME
+    if index_name not in vector_store.indexes:
+        if settings.VECTOR_STORE == "local":
+            from app.services.local_vector_store import LocalVectorStore
+            directory = os.path.join(settings.LOCAL_VECTOR_STORE_DIR, index_name)
+            vector_store.indexes[index_name] = LocalVectorStore(
+                directory,
+                settings.LOCAL_VECTOR_STORE_DTYPE,
+                settings.LOCAL_VECTOR_STORE_QUANTIZATION,
+                settings.LOCAL_VECTOR_STORE_RESCORE_FACTOR
+            )
+            logger.info(f"Local vector store opened at {directory}.")
+        elif settings.VECTOR_STORE != "pinecone":
+            raise ValueError(f"Unknown VECTOR_STORE '{settings.VECTOR_STORE}', expected 'pinecone' or 'local'")
+        elif settings.PINECONE_API_KEY:
+            if vector_store.pinecone_client is None:
+                vector_store.pinecone_client = Pinecone(api_key=settings.PINECONE_API_KEY)
+            vector_store.indexes[index_name] = vector_store.pinecone_client.Index(index_name)
+        else:
+            return None
+    return vector_store.indexes[index_name]
+
+def close_vector_store():
+    logger.info("Closing vector store...")
+    vector_store.indexes = {}
+    vector_store.pinecone_client = None
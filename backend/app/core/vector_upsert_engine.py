@@ -0,0 +1,244 @@
+import asyncio
+import collections
+import functools
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import urllib3
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upserts are sent as JSON. A vector value prints as up to ~22 characters (float16
+# values from the embedding cache have long exact representations) plus ", ".
+BYTES_PER_VALUE = 24
+# A sparse entry: a 32-bit index and a value, each with its separator
+BYTES_PER_SPARSE_ENTRY = 36
+# Keys and punctuation of one record
+VECTOR_OVERHEAD_BYTES = 64
+
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 10.0
+# Latencies kept for the percentiles in get_stats
+LATENCY_WINDOW = 500
+
+
+def estimate_vector_bytes(vector: Dict[str, Any]) -> int:
+    """Conservative size of one upsert record in the request body."""
+    size = VECTOR_OVERHEAD_BYTES + len(vector["id"].encode("utf-8")) + BYTES_PER_VALUE * len(vector["values"])
+    if vector.get("metadata"):
+        size += len(json.dumps(vector["metadata"], default=str).encode("utf-8"))
+    if vector.get("sparse_values"):
+        size += BYTES_PER_SPARSE_ENTRY * len(vector["sparse_values"]["indices"])
+    return size
+
+
+def plan_batches(
+    vectors: List[Dict[str, Any]],
+    max_bytes: int,
+    max_vectors: int
+) -> List[Tuple[List[Dict[str, Any]], int]]:
+    """
+    Pack vectors, in order, into requests under both the byte and vector limits.
+
+    Returns:
+        List of (vectors, estimated bytes) per request; a vector larger than
+        max_bytes on its own still gets a request, which the API will reject
+    """
+    batches = []
+    current: List[Dict[str, Any]] = []
+    current_bytes = 0
+    for vector in vectors:
+        size = estimate_vector_bytes(vector)
+        if current and (current_bytes + size > max_bytes or len(current) >= max_vectors):
+            batches.append((current, current_bytes))
+            current, current_bytes = [], 0
+        current.append(vector)
+        current_bytes += size
+    if current:
+        batches.append((current, current_bytes))
+    return batches
+
+
+def _is_retryable(error: Exception) -> bool:
+    # Rate limits, server errors and dropped connections are transient
+    status = getattr(error, "status", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, urllib3.exceptions.HTTPError))
+
+
+def _timed(request: Callable[[], Any]) -> float:
+    # Timed on the pool thread, so the latency leaves out the wait for a free thread
+    started = time.perf_counter()
+    request()
+    return time.perf_counter() - started
+
+
+class VectorUpsertEngine:
+    """
+    Writes vectors to a Pinecone (or local) index in parallel.
+
+    Vectors are packed into requests by estimated serialized size rather than a
+    fixed count, so profiles with heavy metadata stay under Pinecone's 2 MB
+    request limit. Requests run concurrently on a thread pool shared by the
+    whole process, so concurrent ingestions together never exceed
+    PINECONE_UPSERT_CONCURRENCY requests in flight. A failed request is retried
+    on its own with backoff while the others go ahead; one the API rejects as
+    invalid or too large is split in half, so a single bad vector only fails
+    itself.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_vectors: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None
+    ):
+        self.max_bytes = max_bytes or settings.PINECONE_UPSERT_MAX_BYTES
+        self.max_vectors = max_vectors or settings.PINECONE_UPSERT_MAX_VECTORS
+        self.concurrency = max(1, concurrency or settings.PINECONE_UPSERT_CONCURRENCY)
+        self.max_retries = settings.PINECONE_UPSERT_MAX_RETRIES if max_retries is None else max_retries
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+
+        self.requests = 0
+        self.vectors = 0
+        self.bytes = 0
+        self.retries = 0
+        self.splits = 0
+        self.failures = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="vector-upsert")
+        return self.executor
+
+    async def upsert(self, index: Any, vectors: List[Dict[str, Any]], namespace: str) -> Dict[str, Any]:
+        """
+        Upsert vectors in concurrent, byte-sized requests.
+
+        Args:
+            index: Pinecone Index or LocalVectorStore
+            vectors: Records with 'id', 'values', 'metadata' and optionally 'sparse_values'
+            namespace: Namespace to write to
+
+        Returns:
+            Summary with the number of requests and their latencies in ms
+
+        Raises:
+            The last error, once every request has finished, if any vectors could not be written
+        """
+        if not vectors:
+            return {"requests": 0, "vectors": 0, "bytes": 0, "seconds": 0.0, "latencies_ms": []}
+        started = time.perf_counter()
+        batches = plan_batches(vectors, self.max_bytes, self.max_vectors)
+        results = await asyncio.gather(
+            *(self._send(index, batch, size, namespace) for batch, size in batches),
+            return_exceptions=True
+        )
+
+        latencies = [latency for result in results if not isinstance(result, BaseException) for latency in result]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        seconds = time.perf_counter() - started
+        total_bytes = sum(size for _, size in batches)
+        print(
+            f"Upserted {len(vectors)} vectors to namespace {namespace} in {len(batches)} requests "
+            f"({total_bytes / 1024:.0f} KB, {seconds * 1000:.0f} ms" +
+            (f", request p50 {sorted(latencies)[len(latencies) // 2] * 1000:.0f} ms)" if latencies else ")")
+        )
+        if errors:
+            print(f"{len(errors)} of {len(batches)} upsert requests to namespace {namespace} failed")
+            raise errors[-1]
+        return {
+            "requests": len(batches),
+            "vectors": len(vectors),
+            "bytes": total_bytes,
+            "seconds": round(seconds, 3),
+            "latencies_ms": [round(latency * 1000, 1) for latency in latencies],
+        }
+
+    async def _send(self, index: Any, batch: List[Dict[str, Any]], size: int, namespace: str) -> List[float]:
+        """Send one request, retrying or splitting it on failure; returns the latencies of its requests."""
+        loop = asyncio.get_running_loop()
+        request = functools.partial(index.upsert, vectors=batch, namespace=namespace)
+        attempt = 0
+        while True:
+            self.pending += 1
+            try:
+                latency = await loop.run_in_executor(self._get_executor(), _timed, request)
+                break
+            except Exception as e:
+                error = e
+            finally:
+                self.pending -= 1
+
+            if getattr(error, "status", None) in (400, 413) and len(batch) > 1:
+                # Too large, or a record the API rejects: send each half on its own
+                self.splits += 1
+                half = len(batch) // 2
+                halves = await asyncio.gather(
+                    self._send(index, batch[:half], size // 2, namespace),
+                    self._send(index, batch[half:], size - size // 2, namespace),
+                    return_exceptions=True
+                )
+                for result in halves:
+                    if isinstance(result, BaseException):
+                        raise result
+                return halves[0] + halves[1]
+            if not _is_retryable(error) or attempt >= self.max_retries:
+                self.failures += 1
+                raise error
+            attempt += 1
+            self.retries += 1
+            delay = min(RETRY_BACKOFF_MAX_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            logger.warning(f"Upsert of {len(batch)} vectors to {namespace} failed ({error}); retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        logger.debug(f"Upserted {len(batch)} vectors ({size / 1024:.0f} KB) to {namespace} in {latency * 1000:.0f} ms")
+        self.requests += 1
+        self.vectors += len(batch)
+        self.bytes += size
+        self.latencies.append(latency)
+        return [latency]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request counters and recent request latency percentiles."""
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 1)
+
+        return {
+            "concurrency_limit": self.concurrency,
+            "pending": self.pending,
+            "requests": self.requests,
+            "vectors": self.vectors,
+            "megabytes": round(self.bytes / 1024 / 1024, 1),
+            "retries": self.retries,
+            "splits": self.splits,
+            "failures": self.failures,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        self.executor = None
+
+
+# Global instance
+vector_upsert_engine = VectorUpsertEngine()
+
+
+def close_vector_upsert_engine():
+    logger.info("Shutting down vector upsert pool...")
+    vector_upsert_engine.close()
@@ -1,8 +1,15 @@
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.core.db import connect_to_mongo, close_mongo_connection
+from app.core.openai_client import close_openai_client
+from app.core.process_pool import close_process_pool
+from app.core.vector_store import close_vector_store
+from app.core.vector_upsert_engine import close_vector_upsert_engine
+from app.services.ingest_job_service import watch_abandoned_jobs
+from app.services.namespace_alias_service import watch_garbage
 from app.routers import auth, connections, search, saved_searches, search_history, favorites, embeddings, pinecone_index, retrieval, generated_emails, tips, warm_intro_requests, health
 
 # Get the logger used by Uvicorn
@@ -14,8 +21,18 @@ uvicorn_error_logger.setLevel(logging.DEBUG)
 async def lifespan(app: FastAPI):
     # on startup
     await connect_to_mongo()
+    # Ingestion jobs whose runner died are resumed from their checkpoint
+    job_watchdog = asyncio.create_task(watch_abandoned_jobs())
+    # Namespaces replaced by re-uploads are deleted once searches stop using them
+    namespace_gc = asyncio.create_task(watch_garbage())
     yield
     # on shutdown
+    job_watchdog.cancel()
+    namespace_gc.cancel()
+    await close_openai_client()
+    close_process_pool()
+    close_vector_upsert_engine()
+    close_vector_store()
     await close_mongo_connection()
 
 app = FastAPI(lifespan=lifespan)
@@ -27,6 +44,7 @@ app.add_middleware(
     allow_credentials=False,  # Must be False when allow_origins is ["*"]
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Search-Id"],  # Lets browsers read the search ID for later pages
 )
 
 app.include_router(auth.router, prefix="/api/v1", tags=["Authentication"])
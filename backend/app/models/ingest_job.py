@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class IngestProgress(BaseModel):
+    chunks_done: int = 0
+    rows_processed: int = 0
+    vectors_upserted: int = 0
+    unchanged_count: int = 0
+    error_count: int = 0
+
+class IngestCheckpoint(IngestProgress):
+    # Chunks 1..chunk are fully indexed; a resumed run starts after it
+    chunk: int = 0
+
+class IngestJobPublic(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed
+    filename: Optional[str] = None
+    total_rows: Optional[int] = None  # estimated from the line count until the job completes
+    progress: IngestProgress = Field(default_factory=IngestProgress)
+    checkpoint: IngestCheckpoint = Field(default_factory=IngestCheckpoint)
+    attempts: int = 0
+    rows_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
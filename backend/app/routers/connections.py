@@ -1,47 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
 from uuid import UUID
+import asyncio
+import json
 import os
-import tempfile
 
 from app.services.auth_service import get_current_user
-from app.services import connections_service
-from app.services.embeddings_service import embeddings_service
+from app.services import connections_service, ingest_job_service
 from app.models.connection import ConnectionPublic
+from app.models.ingest_job import IngestJobPublic
 from app.core.db import get_database
 
 router = APIRouter()
 
-async def process_embeddings_background(csv_file_path: str, user_id: str):
-    """
-    Background task to process embeddings after file upload.
-    
-    Args:
-        csv_file_path: Path to the uploaded CSV file
-        user_id: User ID for namespace isolation
-    """
-    try:
-        print(f"Starting background embedding processing for user {user_id}")
-        result = await embeddings_service.process_profiles_and_upsert(
-            csv_path=csv_file_path,
-            user_id=user_id
-        )
-        print(f"Embedding processing completed: {result}")
-        
-        # Clean up temporary file
-        if os.path.exists(csv_file_path):
-            os.remove(csv_file_path)
-            print(f"Cleaned up temporary file: {csv_file_path}")
-            
-    except Exception as e:
-        print(f"Error in background embedding processing: {e}")
-        # Clean up temporary file even on error
-        if os.path.exists(csv_file_path):
-            os.remove(csv_file_path)
+# How often the progress stream checks the job, and sends a keep-alive when idle
+PROGRESS_POLL_SECONDS = 1.0
+PROGRESS_KEEPALIVE_SECONDS = 15.0
 
 @router.post("/connections/upload", status_code=status.HTTP_201_CREATED)
 async def upload_connections(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
@@ -51,33 +29,23 @@ async def upload_connections(
     
     user_id = UUID(current_user["id"])
     
-    # Process CSV upload to database first
-    count = await connections_service.process_and_store_connections(db, file, user_id)
+    # Spool the upload to disk once; the ingestion job parses it a single time
+    # to store the connections and index them
+    job_id = ingest_job_service.new_job_id()
+    csv_path = ingest_job_service.upload_path(job_id)
+    count = await ingest_job_service.spool_upload(file, csv_path)
     
-    # Save uploaded file to temporary location for embedding processing
-    # Reset file pointer to beginning
-    await file.seek(0)
-    file_content = await file.read()
-    
-    # Create temporary file
-    with tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False) as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
-    
-    # Add background task to process embeddings
-    background_tasks.add_task(
-        process_embeddings_background,
-        csv_file_path=temp_file_path,
-        user_id=str(user_id)
+    await ingest_job_service.create_job(
+        db, job_id, str(user_id), csv_path, filename=file.filename, total_rows=count
     )
     
     return {
-        "message": f"Successfully uploaded and processed {count} connections. Embedding processing started in background."
+        "message": f"Successfully uploaded about {count} connections. Processing queued.",
+        "job_id": job_id
     }
 
 @router.post("/connections/ingest", status_code=status.HTTP_201_CREATED)
 async def ingest_connections(
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
@@ -91,29 +59,79 @@ async def ingest_connections(
     if not os.path.exists(csv_file_path):
         raise HTTPException(status_code=404, detail=f"File not found at {csv_file_path}")
 
-    # Process CSV upload to database first
+    # The job gets its own copy, removed once it is done
+    job_id = ingest_job_service.new_job_id()
+    csv_path = ingest_job_service.upload_path(job_id)
     with open(csv_file_path, 'rb') as f:
-        # We need to pass a file-like object to the service
-        # The service expects an UploadFile, so we create a temporary one
         upload_file = UploadFile(filename="data.csv", file=f)
-        count = await connections_service.process_and_store_connections(db, upload_file, user_id)
-
-    # For the background task, we need a temporary copy of the file because the original file handle will be closed.
-    with tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False) as temp_file:
-        with open(csv_file_path, 'rb') as original_file:
-            temp_file.write(original_file.read())
-        temp_file_path = temp_file.name
-
-    # Add background task to process embeddings
-    background_tasks.add_task(
-        process_embeddings_background,
-        csv_file_path=temp_file_path,
-        user_id=str(user_id)
+        count = await ingest_job_service.spool_upload(upload_file, csv_path)
+
+    await ingest_job_service.create_job(
+        db, job_id, str(user_id), csv_path, filename="updated_connections.csv", total_rows=count
     )
     
     return {
-        "message": f"Successfully ingested and processed {count} connections. Embedding processing started in background."
+        "message": f"Successfully ingested about {count} connections. Processing queued.",
+        "job_id": job_id
     }
+
+@router.get("/connections/ingest/{job_id}", response_model=IngestJobPublic)
+async def get_ingest_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    job = await ingest_job_service.get_job(db, job_id, str(UUID(current_user["id"])))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return ingest_job_service.to_public(job)
+
+@router.get("/connections/ingest/{job_id}/events")
+async def stream_ingest_job(
+    job_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Server-sent events with the job's progress (rows, vectors upserted, ETA)
+    each time it changes; the stream ends once the job completes or fails.
+    """
+    user_id = str(UUID(current_user["id"]))
+    if await ingest_job_service.get_job(db, job_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+
+    async def generate_progress_stream():
+        last_update = None
+        idle_seconds = 0.0
+        while not await request.is_disconnected():
+            job = await ingest_job_service.get_job(db, job_id, user_id)
+            if job is None:
+                yield f"data: {json.dumps({'type': 'error', 'message': 'Ingestion job not found'})}\n\n"
+                return
+
+            if job.get("updated_at") != last_update:
+                last_update = job.get("updated_at")
+                idle_seconds = 0.0
+                public = ingest_job_service.to_public(job)
+                finished = public.status in (ingest_job_service.COMPLETED, ingest_job_service.FAILED)
+                event_type = public.status if finished else "progress"
+                yield f"data: {json.dumps({'type': event_type, 'job': public.model_dump(mode='json')})}\n\n"
+                if finished:
+                    return
+            elif idle_seconds >= PROGRESS_KEEPALIVE_SECONDS:
+                idle_seconds = 0.0
+                yield ": keep-alive\n\n"
+
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+            idle_seconds += PROGRESS_POLL_SECONDS
+
+    return StreamingResponse(
+        generate_progress_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
 @router.get("/connections", response_model=List[ConnectionPublic])
 async def get_connections(
     current_user: dict = Depends(get_current_user),
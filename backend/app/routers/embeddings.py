@@ -2,6 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
 from app.services.embeddings_service import embeddings_service
+from app.services.embedding_cache_service import embedding_cache_service
+from app.core.openai_governor import openai_governor
+from app.core.vector_upsert_engine import vector_upsert_engine
 from app.services.auth_service import get_current_user
 from app.models.user import UserInDB
 
@@ -17,6 +20,7 @@ class ProfileTextRequest(BaseModel):
 class ProcessProfilesRequest(BaseModel):
     csv_path: Optional[str] = "Connections.csv"
     chunk_size: Optional[int] = 100
+    incremental: Optional[bool] = True
 
 class EmbeddingResponse(BaseModel):
     embedding: List[float]
@@ -30,6 +34,8 @@ class ProcessingResponse(BaseModel):
     chunks_processed: int
     namespace: str
     message: str
+    unchanged_count: int = 0
+    vectors_deleted: int = 0
 
 @router.post("/canonicalize", response_model=Dict[str, str])
 async def canonicalize_profile_text(request: ProfileTextRequest):
@@ -83,19 +89,20 @@ async def generate_embedding(request: ProfileTextRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating embedding: {str(e)}")
 
-@router.get("/cached/{profile_id}")
-async def get_cached_embedding(profile_id: str):
+@router.get("/cached/{cache_key}")
+async def get_cached_embedding(cache_key: str):
     """
-    Get cached embedding for a profile.
+    Get a cached embedding by its content-addressed cache key
+    (SHA-256 of the model name and canonical text).
     """
     try:
-        embedding = await embeddings_service.get_cached_embedding(profile_id)
+        embedding = await embedding_cache_service.get_by_key(cache_key)
         
         if embedding is None:
             raise HTTPException(status_code=404, detail="Cached embedding not found")
         
         return {
-            "profile_id": profile_id,
+            "cache_key": cache_key,
             "embedding": embedding,
             "cached": True
         }
@@ -120,7 +127,8 @@ async def process_profiles(
         result = await embeddings_service.process_profiles_and_upsert(
             csv_path=request.csv_path,
             user_id=user_id,
-            chunk_size=request.chunk_size
+            chunk_size=request.chunk_size,
+            incremental=request.incremental
         )
         
         return ProcessingResponse(
@@ -130,6 +138,8 @@ async def process_profiles(
             vectors_upserted=result["vectors_upserted"],
             chunks_processed=result["chunks_processed"],
             namespace=result["namespace"],
+            unchanged_count=result["unchanged_count"],
+            vectors_deleted=result["vectors_deleted"],
             message=f"Successfully processed {result['processed_count']} profiles in {result['chunks_processed']} chunks and upserted {result['vectors_upserted']} vectors to Pinecone"
         )
     except Exception as e:
@@ -149,8 +159,9 @@ async def batch_upsert_vectors(
         if not vectors:
             raise HTTPException(status_code=400, detail="No vectors provided")
         
-        # Use the authenticated user's ID as the namespace
+        # Upsert into the namespace of the authenticated user's live upload
         user_id = str(current_user.id)
+        namespace = await embeddings_service.get_live_namespace(user_id)
         
         # Validate vector format
         for i, vector_data in enumerate(vectors):
@@ -160,12 +171,12 @@ async def batch_upsert_vectors(
                     detail=f"Vector {i} must be a tuple/list of (id, vector, metadata)"
                 )
         
-        embeddings_service.batch_upsert_to_pinecone(vectors, namespace=user_id)
+        await embeddings_service.batch_upsert_to_pinecone(vectors, namespace=namespace)
         
         return {
-            "message": f"Successfully upserted {len(vectors)} vectors to namespace {user_id}",
+            "message": f"Successfully upserted {len(vectors)} vectors to namespace {namespace}",
             "vectors_count": len(vectors),
-            "namespace": user_id
+            "namespace": namespace
         }
     except HTTPException:
         raise
@@ -178,6 +189,7 @@ async def embeddings_health_check():
     Health check for embeddings service.
     """
     try:
+        await embeddings_service.refresh_active_index()
         # Test OpenAI connection
         test_embedding = await embeddings_service.generate_embedding("test")
         
@@ -185,7 +197,11 @@ async def embeddings_health_check():
             "status": "healthy",
             "openai_connection": "ok",
             "embedding_dimension": len(test_embedding),
-            "model": embeddings_service.embedding_model
+            "model": embeddings_service.embedding_model,
+            "index_name": embeddings_service.index_name,
+            "embedding_cache": embedding_cache_service.get_stats(),
+            "openai_governor": openai_governor.get_stats(),
+            "vector_upserts": vector_upsert_engine.get_stats()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embeddings service unhealthy: {str(e)}")
\ No newline at end of file
@@ -1,5 +1,8 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
+from app.core.config import settings
 from app.core.db import db
+from app.core.vector_store import get_vector_index
 from app.services.pinecone_index_service import pinecone_index_service
 
 router = APIRouter()
@@ -21,12 +24,18 @@ async def health_check():
         mongo_status = "error"
         mongo_error = str(e)
 
-    # Check Pinecone index status
+    # Check Pinecone index status (or the local index, which needs no service)
     try:
-        index_info = pinecone_index_service.get_index_info()
-        if not index_info or not index_info.get("status", {}).get("ready"):
+        if settings.VECTOR_STORE == "local":
+            await asyncio.to_thread(lambda: get_vector_index().describe_index_stats())
+        elif pinecone_index_service is None:
             pinecone_status = "error"
-            pinecone_error = "Pinecone index is not ready or does not exist."
+            pinecone_error = "PINECONE_API_KEY is not set."
+        else:
+            index_info = pinecone_index_service.get_index_info()
+            if not index_info or not index_info.get("status", {}).get("ready"):
+                pinecone_status = "error"
+                pinecone_error = "Pinecone index is not ready or does not exist."
     except Exception as e:
         pinecone_status = "error"
         pinecone_error = str(e)
@@ -40,7 +49,8 @@ async def health_check():
             },
             "pinecone": {
                 "status": pinecone_status,
-                "error": pinecone_error
+                "error": pinecone_error,
+                "backend": settings.VECTOR_STORE
             }
         }
     }
@@ -1,12 +1,23 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any
 from app.services.pinecone_index_service import pinecone_index_service
+from app.services.embeddings_service import embeddings_service
+from app.services import ingest_manifest_service, namespace_alias_service, profile_store_service, sparse_vocabulary_service
 from app.services.auth_service import get_current_user
 from app.models.user import UserInDB
+from app.core.config import settings
+from app.core.db import get_database
 
 router = APIRouter(prefix="/api/v1/pinecone", tags=["pinecone"])
 
 
+def _require_pinecone():
+    if pinecone_index_service is None:
+        raise HTTPException(status_code=503, detail="Pinecone is not configured (PINECONE_API_KEY is not set)")
+    return pinecone_index_service
+
+
 @router.post("/index/setup", response_model=Dict[str, Any])
 async def setup_pinecone_index():
     """
@@ -16,6 +27,7 @@ async def setup_pinecone_index():
     Returns:
         Dictionary containing setup result and index information
     """
+    _require_pinecone()
     try:
         result = pinecone_index_service.setup_index()
         
@@ -36,6 +48,7 @@ async def get_index_info():
     Returns:
         Dictionary containing index information or None if index doesn't exist
     """
+    _require_pinecone()
     try:
         if not pinecone_index_service.index_exists():
             raise HTTPException(status_code=404, detail="Pinecone index does not exist")
@@ -64,6 +77,7 @@ async def check_index_exists():
     Returns:
         Dictionary indicating whether the index exists
     """
+    _require_pinecone()
     try:
         exists = pinecone_index_service.index_exists()
         
@@ -86,6 +100,7 @@ async def delete_pinecone_index():
     Returns:
         Dictionary containing deletion result
     """
+    _require_pinecone()
     try:
         result = pinecone_index_service.delete_index()
         
@@ -99,22 +114,39 @@ async def delete_pinecone_index():
 
 
 @router.delete("/namespace/clear", response_model=Dict[str, Any])
-async def clear_pinecone_namespace(current_user: dict = Depends(get_current_user)):
+async def clear_pinecone_namespace(
+    current_user: dict = Depends(get_current_user),
+    db = Depends(get_database)
+):
     """
     Clear a namespace in the Pinecone index.
-    The namespace is the user_id of the current user.
+    The namespace is the one holding the current user's live upload.
     
     Returns:
         Dictionary containing the result of the operation
     """
     try:
         user_id = str(current_user["id"])
-        result = pinecone_index_service.clear_namespace(namespace=user_id)
+        # Clear the user's live namespace in the index reads and writes currently go to
+        await embeddings_service.refresh_active_index()
+        namespace = await namespace_alias_service.get_namespace(db, user_id)
+        if settings.VECTOR_STORE == "local":
+            await asyncio.to_thread(embeddings_service.index.delete, delete_all=True, namespace=namespace)
+            result = {"success": True, "message": f"Successfully cleared namespace '{namespace}'"}
+        else:
+            result = _require_pinecone().clear_namespace(namespace=namespace, index_name=embeddings_service.index_name)
         
         if not result["success"]:
             raise HTTPException(status_code=500, detail=result["message"])
         
+        # Forget what was indexed so the next upload re-populates the namespace
+        await ingest_manifest_service.clear_manifest(db, namespace)
+        await profile_store_service.clear_profiles(db, namespace)
+        await sparse_vocabulary_service.clear_vocabulary(db, namespace)
+        
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to clear Pinecone namespace: {str(e)}")
\ No newline at end of file
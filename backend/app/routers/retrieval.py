@@ -5,8 +5,10 @@ from uuid import UUID
 
 from app.services.auth_service import get_current_user
 from app.services.retrieval_service import retrieval_service
-from app.services import search_history_service
+from app.services import search_history_service, search_session_service
+from app.services.query_cache_service import query_embedding_cache, query_rewrite_cache
 from app.models.search_history import SearchHistoryCreate
+from app.core.config import settings
 from app.core.db import get_database
 
 router = APIRouter()
@@ -161,7 +163,13 @@ async def retrieval_health_check():
         "openai_client": retrieval_service.openai_client is not None,
         "pinecone_client": retrieval_service.pinecone_client is not None,
         "pinecone_index": retrieval_service.index is not None,
+        "vector_store": settings.VECTOR_STORE,
         "embeddings_service": True,  # Always available
+        "query_rewrite_cache": query_rewrite_cache.get_stats(),
+        "query_embedding_cache": query_embedding_cache.get_stats(),
+        "search_sessions": search_session_service.get_stats(),
+        "search_coalescing": retrieval_service.search_flights.get_stats(),
+        "search_cancellations": retrieval_service.get_cancellation_stats(),
         "status": "healthy"
     }
     
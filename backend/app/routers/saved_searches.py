@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 
 from app.services.auth_service import get_current_user
-from app.services import saved_searches_service
-from app.services.retrieval_service import retrieval_service
+from app.services import saved_searches_service, search_session_service
 from app.models.saved_search import SavedSearchCreate, SavedSearchPublic
 from app.core.db import get_database
+from app.core.disconnect import run_until_disconnected
 
 router = APIRouter()
 
@@ -141,13 +141,17 @@ async def delete_saved_search(
 @router.post("/saved-searches/{search_id}/run")
 async def run_saved_search(
     search_id: UUID,
+    request: Request,
     page: int = Query(1, ge=1, description="Page number for pagination"),
     page_size: int = Query(20, ge=1, le=100, description="Number of results per page"),
+    session_id: Optional[str] = Query(None, description="search_id returned with an earlier page of this run"),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Execute a saved search using the new retrieval service
+    Execute a saved search using the new retrieval service. The response's
+    search_id, passed back as session_id, serves later pages from the run's
+    result session. The search is cancelled if the client disconnects.
     """
     try:
         user_id = UUID(current_user["id"])
@@ -185,12 +189,10 @@ async def run_saved_search(
                 # Continue without filters if conversion fails
                 filter_dict = None
         
-        # Use the new retrieval service for search and re-ranking
-        reranked_results = await retrieval_service.retrieve_and_rerank(
-            user_query=query,
-            user_id=str(user_id),
-            enable_query_rewrite=True,
-            filter_dict=filter_dict
+        # Use the new retrieval service for search and re-ranking, or the run's result session
+        session_id, reranked_results, _ = await run_until_disconnected(
+            request,
+            search_session_service.get_or_run_search(session_id, str(user_id), query, filter_dict)
         )
         
         # Apply pagination
@@ -212,6 +214,7 @@ async def run_saved_search(
         return {
             "saved_search": saved_search,
             "results": search_results,
+            "search_id": session_id,
             "pagination": {
                 "page": page,
                 "page_size": page_size,
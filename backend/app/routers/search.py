@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from fastapi.responses import StreamingResponse
-from typing import List, Optional, AsyncGenerator
+from typing import List, Optional, AsyncGenerator, Tuple
 from pydantic import BaseModel
 from uuid import UUID
 import json
@@ -8,11 +8,11 @@ import asyncio
 from datetime import datetime
 
 from app.services.auth_service import get_current_user
-from app.services import connections_service, search_history_service
+from app.services import connections_service, search_history_service, search_session_service
 from app.services.ai_service import search_connections
-from app.services.retrieval_service import retrieval_service
 from app.models.search_history import SearchHistoryCreate
 from app.core.db import get_database
+from app.core.disconnect import cancel_on_disconnect, disconnect_stats, run_until_disconnected
 
 router = APIRouter()
 
@@ -39,13 +39,19 @@ class SearchResult(BaseModel):
 @router.post("/search", response_model=List[SearchResult])
 async def ai_search_connections(
     search_request: SearchRequest,
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1, description="Page number for pagination"),
     page_size: int = Query(20, ge=1, le=100, description="Number of results per page"),
+    search_id: Optional[str] = Query(None, description="X-Search-Id returned with an earlier page of this search"),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Perform AI-powered search on user's connections using the new retrieval service
+    Perform AI-powered search on user's connections using the new retrieval service.
+    The search ID is returned in the X-Search-Id header; passing it back serves
+    later pages from the search's result session. The search is cancelled if the
+    client disconnects.
     """
     if not search_request.query.strip():
         raise HTTPException(
@@ -61,13 +67,12 @@ async def ai_search_connections(
         if search_request.filters:
             filter_dict = convert_search_filters_to_pinecone_filter(search_request.filters)
         
-        # Use the new retrieval service for search and re-ranking
-        reranked_results = await retrieval_service.retrieve_and_rerank(
-            user_query=search_request.query,
-            user_id=user_id,
-            enable_query_rewrite=True,
-            filter_dict=filter_dict
+        # Use the new retrieval service for search and re-ranking, or the search's result session
+        search_id, reranked_results, from_session = await run_until_disconnected(
+            request,
+            search_session_service.get_or_run_search(search_id, user_id, search_request.query, filter_dict)
         )
+        response.headers["X-Search-Id"] = search_id
         
         # Apply pagination
         start_idx = (page - 1) * page_size
@@ -89,20 +94,23 @@ async def ai_search_connections(
                 cons=cons
             ))
         
-        # Save search to history
+        # Save search to history (once per search, not per page)
         try:
-            history_entry = SearchHistoryCreate(
-                query=search_request.query,
-                filters=search_request.filters.model_dump() if search_request.filters else None,
-                results_count=len(search_results)
-            )
-            await search_history_service.create_search_history_entry(db, UUID(user_id), history_entry)
+            if not from_session:
+                history_entry = SearchHistoryCreate(
+                    query=search_request.query,
+                    filters=search_request.filters.model_dump() if search_request.filters else None,
+                    results_count=len(search_results)
+                )
+                await search_history_service.create_search_history_entry(db, UUID(user_id), history_entry)
         except Exception as history_error:
             print(f"Failed to save search history: {history_error}")
             # Don't fail the search if history saving fails
         
         return search_results
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Search router error: {e}")
         raise HTTPException(
@@ -110,16 +118,82 @@ async def ai_search_connections(
             detail=f"Search failed: {str(e)}"
         )
 
+def format_search_result(result: dict) -> dict:
+    """Convert a re-ranked result to the SearchResult format"""
+    # Use enhanced pros and cons if available, fallback to single pro/con
+    pros = result.get("pros", [result.get("pro", "Strong candidate match.")])
+    cons = result.get("cons", [result.get("con", "Some limitations may apply.")])
+    return {
+        "connection": result["profile"],
+        "score": result["score"],
+        "summary": result.get("pro", pros[0] if pros else "Strong candidate match."),
+        "pros": pros,
+        "cons": cons
+    }
+
+def describe_search_stage(event: dict) -> Tuple[int, str]:
+    """Progress percentage and message for a retrieval stage event"""
+    stage = event["stage"]
+    if stage == "rewrite":
+        return 20, "Understood the query"
+    if stage == "embedding":
+        return 35, "Searching your connections..."
+    if stage == "candidates":
+        return 50, f"Found {event['count']} candidates, ranking them..."
+    return 50 + 45 * event["chunk"] // event["chunks"], f"Ranked {event['chunk']} of {event['chunks']} batches"
+
+async def search_with_events(
+    request: Request,
+    search_id: Optional[str],
+    user_id: str,
+    query: str,
+    filter_dict: Optional[dict]
+) -> AsyncGenerator[dict, None]:
+    """
+    Run a search (or serve it from its result session), yielding its stage
+    events as they happen, then {"stage": "done", "search_id", "results",
+    "from_session"}. If the client disconnects, or the generator is closed
+    early, the search is cancelled and the generator ends without "done".
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    search = asyncio.create_task(search_session_service.get_or_run_search(
+        search_id, user_id, query, filter_dict, on_event=events.put_nowait
+    ))
+    search.add_done_callback(lambda _: events.put_nowait(None))
+    # Between events nothing is sent, so a disconnect would otherwise go unnoticed
+    watcher = asyncio.create_task(cancel_on_disconnect(request, search))
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        if search.cancelled():
+            return
+        search_id, results, from_session = search.result()
+        yield {"stage": "done", "search_id": search_id, "results": results, "from_session": from_session}
+    finally:
+        watcher.cancel()
+        if not search.done():
+            search.cancel()
+            disconnect_stats.searches += 1
+
 @router.post("/search/stream")
 async def ai_search_connections_stream(
     search_request: SearchRequest,
+    request: Request,
     page: int = Query(1, ge=1, description="Page number for pagination"),
     page_size: int = Query(20, ge=1, le=100, description="Number of results per page"),
+    search_id: Optional[str] = Query(None, description="search_id sent with an earlier page of this search"),
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Perform AI-powered search with streaming results using Server-Sent Events
+    Perform AI-powered search with streaming results using Server-Sent Events.
+    
+    A status event is sent as each stage of the search finishes. On the first
+    page, each re-ranking batch's relevant profiles are sent as a results event
+    as soon as that batch is scored, best first within the batch. The complete
+    event carries the page's final, fully sorted results and the search_id that
+    serves later pages from the search's result session. The search is
+    cancelled if the client disconnects.
     """
     if not search_request.query.strip():
         raise HTTPException(
@@ -128,6 +202,7 @@ async def ai_search_connections_stream(
         )
     
     async def generate_search_stream() -> AsyncGenerator[str, None]:
+        nonlocal search_id
         try:
             user_id = current_user["id"]
             
@@ -139,62 +214,42 @@ async def ai_search_connections_stream(
             if search_request.filters:
                 filter_dict = convert_search_filters_to_pinecone_filter(search_request.filters)
             
-            yield f"data: {json.dumps({'type': 'status', 'message': 'Generating query embedding...'})}\n\n"
-            
-            # Use the new retrieval service for search and re-ranking
-            reranked_results = await retrieval_service.retrieve_and_rerank(
-                user_query=search_request.query,
-                user_id=user_id,
-                enable_query_rewrite=True,
-                filter_dict=filter_dict
-            )
-            
-            yield f"data: {json.dumps({'type': 'status', 'message': f'Found {len(reranked_results)} results, applying pagination...'})}\n\n"
+            # Use the new retrieval service for search and re-ranking, or the search's result session
+            reranked_results = None
+            async for event in search_with_events(request, search_id, user_id, search_request.query, filter_dict):
+                if event["stage"] == "done":
+                    search_id, reranked_results, from_session = event["search_id"], event["results"], event["from_session"]
+                    break
+                progress, message = describe_search_stage(event)
+                yield f"data: {json.dumps({'type': 'status', 'stage': event['stage'], 'progress': progress, 'message': message})}\n\n"
+                if event["stage"] == "rerank" and page == 1 and event["results"]:
+                    # Provisional: this batch's scores, before merging with the other batches
+                    search_results = [format_search_result(result) for result in event["results"][:page_size]]
+                    yield f"data: {json.dumps({'type': 'results', 'data': search_results, 'chunk': event['chunk'], 'chunks': event['chunks']})}\n\n"
+            if reranked_results is None:
+                # The client disconnected and the search was cancelled
+                return
             
             # Apply pagination
             start_idx = (page - 1) * page_size
             end_idx = start_idx + page_size
             paginated_results = reranked_results[start_idx:end_idx]
+            search_results = [format_search_result(result) for result in paginated_results]
             
-            # Stream results in chunks
-            chunk_size = 5  # Send 5 results at a time
-            for i in range(0, len(paginated_results), chunk_size):
-                chunk = paginated_results[i:i + chunk_size]
-                
-                # Convert to the expected SearchResult format
-                search_results = []
-                for result in chunk:
-                    # Use enhanced pros and cons if available, fallback to single pro/con
-                    pros = result.get("pros", [result.get("pro", "Strong candidate match.")])
-                    cons = result.get("cons", [result.get("con", "Some limitations may apply.")])
-                    
-                    search_results.append({
-                        "connection": result["profile"],
-                        "score": result["score"],
-                        "summary": result.get("pro", pros[0] if pros else "Strong candidate match."),
-                        "pros": pros,
-                        "cons": cons
-                    })
-                
-                # Send chunk of results
-                yield f"data: {json.dumps({'type': 'results', 'data': search_results, 'chunk': i//chunk_size + 1})}\n\n"
-                
-                # Small delay to simulate streaming
-                await asyncio.sleep(0.1)
-            
-            # Save search to history
+            # Save search to history (once per search, not per page)
             try:
-                history_entry = SearchHistoryCreate(
-                    query=search_request.query,
-                    filters=search_request.filters.model_dump() if search_request.filters else None,
-                    results_count=len(paginated_results)
-                )
-                await search_history_service.create_search_history_entry(db, UUID(user_id), history_entry)
+                if not from_session:
+                    history_entry = SearchHistoryCreate(
+                        query=search_request.query,
+                        filters=search_request.filters.model_dump() if search_request.filters else None,
+                        results_count=len(paginated_results)
+                    )
+                    await search_history_service.create_search_history_entry(db, UUID(user_id), history_entry)
             except Exception as history_error:
                 print(f"Failed to save search history: {history_error}")
             
             # Send completion message
-            yield f"data: {json.dumps({'type': 'complete', 'total_results': len(paginated_results)})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', 'data': search_results, 'total_results': len(paginated_results), 'search_id': search_id})}\n\n"
             
         except Exception as e:
             print(f"Streaming search error: {e}")
@@ -213,11 +268,15 @@ async def ai_search_connections_stream(
 @router.post("/search/progress")
 async def ai_search_connections_progress(
     search_request: SearchRequest,
+    request: Request,
     current_user: dict = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Perform AI-powered search with progress updates.
+    Perform AI-powered search with progress updates, sent as each stage of the
+    search finishes. Progress events of the re-ranking stage carry the relevant
+    profiles of the batch just ranked in partial_results. The search is
+    cancelled if the client disconnects.
     """
     if not search_request.query.strip():
         raise HTTPException(
@@ -226,12 +285,6 @@ async def ai_search_connections_progress(
         )
 
     async def progress_generator():
-        # Simulate progress
-        for i in range(5):
-            await asyncio.sleep(0.5)
-            yield f"data: {json.dumps({'progress': (i + 1) * 10})}\n\n"
-
-        # Perform the actual search
         try:
             user_id = current_user["id"]
             
@@ -239,31 +292,23 @@ async def ai_search_connections_progress(
             if search_request.filters:
                 filter_dict = convert_search_filters_to_pinecone_filter(search_request.filters)
             
-            yield f"data: {json.dumps({'progress': 60, 'message': 'Reranking results...'})}\n\n"
-            await asyncio.sleep(1)
-
-            reranked_results = await retrieval_service.retrieve_and_rerank(
-                user_query=search_request.query,
-                user_id=user_id,
-                enable_query_rewrite=True,
-                filter_dict=filter_dict
-            )
+            yield f"data: {json.dumps({'progress': 5, 'message': 'Starting search...'})}\n\n"
 
-            yield f"data: {json.dumps({'progress': 80, 'message': 'Finalizing...'})}\n\n"
-            await asyncio.sleep(1)
+            reranked_results = None
+            async for event in search_with_events(request, None, user_id, search_request.query, filter_dict):
+                if event["stage"] == "done":
+                    search_id, reranked_results = event["search_id"], event["results"]
+                    break
+                progress, message = describe_search_stage(event)
+                update = {'progress': progress, 'stage': event['stage'], 'message': message}
+                if event["stage"] == "rerank":
+                    update['partial_results'] = [format_search_result(result) for result in event["results"]]
+                yield f"data: {json.dumps(update)}\n\n"
+            if reranked_results is None:
+                # The client disconnected and the search was cancelled
+                return
 
-            search_results = []
-            for result in reranked_results:
-                pros = result.get("pros", [result.get("pro", "Strong candidate match.")])
-                cons = result.get("cons", [result.get("con", "Some limitations may apply.")])
-                
-                search_results.append(SearchResult(
-                    connection=result["profile"],
-                    score=result["score"],
-                    summary=result.get("pro", pros[0] if pros else "Strong candidate match."),
-                    pros=pros,
-                    cons=cons
-                ).model_dump())
+            search_results = [format_search_result(result) for result in reranked_results]
 
             # Save search to history
             try:
@@ -276,7 +321,7 @@ async def ai_search_connections_progress(
             except Exception as history_error:
                 print(f"Failed to save search history: {history_error}")
 
-            yield f"data: {json.dumps({'progress': 100, 'results': search_results})}\n\n"
+            yield f"data: {json.dumps({'progress': 100, 'results': search_results, 'search_id': search_id})}\n\n"
 
         except Exception as e:
             print(f"Search router error: {e}")
@@ -2,7 +2,8 @@ import json
 import re
 from typing import List, Dict, Any
 from app.core.config import settings
-import openai
+from app.core.openai_client import get_openai_client
+from app.core.openai_governor import Priority, estimate_chat_tokens, openai_governor
 
 async def search_connections(user_id: str, query: str, connections: List[dict]) -> List[dict]:
     # This is a placeholder for the actual AI search logic.
@@ -28,20 +29,26 @@ async def generate_email_content(reason: str) -> str:
     if not settings.OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
 
-    client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+    client = get_openai_client()
 
     try:
         system_prompt = "You are a helpful assistant that writes professional outreach emails."
         user_prompt = f"Write a professional outreach email for the following reason: {reason}"
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.7
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        response = await openai_governor.run(
+            "gpt-4o",
+            lambda: client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7
+            ),
+            priority=Priority.INTERACTIVE,
+            estimated_tokens=estimate_chat_tokens(messages, 500)
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
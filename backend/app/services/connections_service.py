@@ -1,84 +1,161 @@
-import csv
-import io
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 from uuid import UUID
-from fastapi import HTTPException, status, UploadFile
+import pandas as pd
+from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError, OperationFailure
 from app.models.connection import ConnectionInDB
+from app.services import profile_canonicalizer
 import random
 
-async def process_and_store_connections(db, file: UploadFile, user_id: UUID):
-    # First, delete all existing connections for this user
-    await db.connections.delete_many({"user_id": str(user_id)})
+# Each upload's connections are stored under its ingestion job's ID (upload_id)
+# next to the set the user currently sees. The user's document in
+# connection_uploads points at the live set and is switched in one update once
+# the upload is live in search, then the set it replaced is deleted. Reads only
+# see the live set, so a running, retried or failed upload never empties or
+# mixes a user's connections. Connections stored before uploads were tagged
+# have no upload_id and stay live until the user's next upload.
+_indexes_ready = False
 
-    # Read the CSV file content
-    content = await file.read()
-    stream = io.StringIO(content.decode("utf-8"))
-    reader = csv.DictReader(stream)
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        # Connection IDs are the stable profile IDs also used for Pinecone vectors,
+        # so a re-upload keeps them and a repeated row is stored once per upload
+        try:
+            # Replaced by the per-upload index; it would reject every re-upload as a duplicate
+            await db.connections.drop_index("user_id_1_id_1")
+        except OperationFailure:
+            pass
+        await db.connections.create_index([("user_id", 1), ("upload_id", 1), ("id", 1)], unique=True)
+        _indexes_ready = True
+
+async def get_live_upload(db, user_id: UUID) -> Optional[str]:
+    """ID of the upload whose connections the user sees (None for untagged connections)"""
+    live = await db.connection_uploads.find_one({"_id": str(user_id)}, {"upload_id": 1})
+    return live["upload_id"] if live else None
 
-    records_to_insert = []
-    for row in reader:
-        # Map CSV columns to your Connection model fields
-        # This assumes CSV headers match your model field names (e.g., "first_name", "last_name")
-        # You might need to adjust this mapping based on the actual CSV format.
-        record = {
-            # Personal Information
-            "first_name": row.get("firstName", ""),
-            "last_name": row.get("lastName", ""),
-            "linkedin_url": f"https://www.linkedin.com/in/{row.get('publicIdentifier')}" if row.get('publicIdentifier') else None,
-            "email_address": None,  # Not available in new CSV
-            "city": row.get("city") or None,
-            "state": None,  # Not available in new CSV
-            "country": row.get("country") or None,
-            "followers": row.get("followerCount") or None,
-            "description": row.get("about") or None,
-            "headline": row.get("headline") or None,
-            
-            # Connection Information
-            "connected_on": None,  # Not available in new CSV
-            
-            # Current Company Information
-            "company": row.get("companyName") or None,
-            "title": None,  # Not available in new CSV
-            
-            # Company Details
-            "company_size": None,  # Not available in new CSV
-            "company_name": row.get("companyName") or None,
-            "company_website": None,  # Not available in new CSV
-            "company_phone": None,  # Not available in new CSV
-            "company_industry": None,  # Not available in new CSV
-            "company_industry_topics": None,  # Not available in new CSV
-            "company_description": None,  # Not available in new CSV
-            "company_address": None,  # Not available in new CSV
-            "company_city": None,  # Not available in new CSV
-            "company_state": None,  # Not available in new CSV
-            "company_country": None,  # Not available in new CSV
-            "company_revenue": None,  # Not available in new CSV
-            "company_latest_funding": None,  # Not available in new CSV
-            "company_linkedin": None,  # Not available in new CSV
-        }
-        record['user_id'] = user_id
-        record['rating'] = random.randint(1, 10)
+async def live_connections_query(db, user_id: UUID) -> Dict[str, Any]:
+    """Query matching the user's live connections"""
+    return {"user_id": str(user_id), "upload_id": await get_live_upload(db, user_id)}
+
+def connection_record(row: Dict[str, str], user_id: UUID, profile_id: str) -> Dict[str, Any]:
+    """Map one CSV row (column -> text) to a connections document with the row's profile ID."""
+    record = {
+        # Personal Information
+        "first_name": row.get("firstName", ""),
+        "last_name": row.get("lastName", ""),
+        "linkedin_url": f"https://www.linkedin.com/in/{row.get('publicIdentifier')}" if row.get('publicIdentifier') else None,
+        "email_address": None,  # Not available in new CSV
+        "city": row.get("city") or None,
+        "state": None,  # Not available in new CSV
+        "country": row.get("country") or None,
+        "followers": row.get("followerCount") or None,
+        "description": row.get("about") or None,
+        "headline": row.get("headline") or None,
+        
+        # Connection Information
+        "connected_on": None,  # Not available in new CSV
         
-        # Create a ConnectionInDB instance to get default values and validate
-        new_connection = ConnectionInDB(**record)
-        # Convert UUIDs to strings for MongoDB storage
-        connection_dict = new_connection.model_dump(by_alias=True)
-        connection_dict["id"] = str(connection_dict["id"])
-        connection_dict["user_id"] = str(connection_dict["user_id"])
-        records_to_insert.append(connection_dict)
+        # Current Company Information
+        "company": row.get("companyName") or None,
+        "title": None,  # Not available in new CSV
+        
+        # Company Details
+        "company_size": None,  # Not available in new CSV
+        "company_name": row.get("companyName") or None,
+        "company_website": None,  # Not available in new CSV
+        "company_phone": None,  # Not available in new CSV
+        "company_industry": None,  # Not available in new CSV
+        "company_industry_topics": None,  # Not available in new CSV
+        "company_description": None,  # Not available in new CSV
+        "company_address": None,  # Not available in new CSV
+        "company_city": None,  # Not available in new CSV
+        "company_state": None,  # Not available in new CSV
+        "company_country": None,  # Not available in new CSV
+        "company_revenue": None,  # Not available in new CSV
+        "company_latest_funding": None,  # Not available in new CSV
+        "company_linkedin": None,  # Not available in new CSV
+    }
+    record['id'] = profile_id
+    record['user_id'] = user_id
+    record['rating'] = random.randint(1, 10)
+    
+    # Create a ConnectionInDB instance to get default values and validate
+    new_connection = ConnectionInDB(**record)
+    # Convert UUIDs to strings for MongoDB storage
+    connection_dict = new_connection.model_dump(by_alias=True)
+    connection_dict["id"] = str(connection_dict["id"])
+    connection_dict["user_id"] = str(connection_dict["user_id"])
+    return connection_dict
+
+def build_connection_records(chunk_df: pd.DataFrame, user_id: UUID) -> List[Dict[str, Any]]:
+    """Connections documents for a chunk read with dtype=str and keep_default_na=False."""
+    profile_ids = profile_canonicalizer.resolve_profile_ids(chunk_df)
+    return [
+        connection_record(row, user_id, profile_id)
+        for row, profile_id in zip(chunk_df.to_dict("records"), profile_ids)
+    ]
 
+async def store_connections_chunk(db, chunk_df: pd.DataFrame, user_id: UUID, upload_id: str) -> int:
+    """
+    Insert the connections in one chunk of a parsed upload, under the upload's ID.
+    They stay hidden until activate_connections makes the upload live.
+
+    Ingestion jobs call this for every chunk they read, so the upload is parsed
+    once for both the connections collection and the embedding pipeline. A
+    retried job stores its chunks again; rows it already stored are skipped.
+    """
+    records_to_insert = await asyncio.to_thread(build_connection_records, chunk_df, user_id)
+    for record in records_to_insert:
+        record["upload_id"] = upload_id
     if records_to_insert:
+        await _ensure_indexes(db)
         try:
             await db.connections.insert_many(records_to_insert, ordered=False)
+        except BulkWriteError as e:
+            # Rows repeating a profile already stored are rejected as duplicate keys;
+            # with `ordered=False` every other row is still inserted.
+            write_errors = e.details.get("writeErrors", [])
+            duplicates = sum(1 for error in write_errors if error.get("code") == 11000)
+            if duplicates:
+                print(f"Skipped {duplicates} duplicate connections")
+            if len(write_errors) > duplicates:
+                print(f"An error occurred during bulk insert, but some records may have been inserted: {write_errors[-1].get('errmsg')}")
         except Exception as e:
-            # This will catch errors like duplicate keys if any slip through,
-            # but with `ordered=False`, it will attempt to insert all non-dups.
             print(f"An error occurred during bulk insert, but some records may have been inserted: {e}")
     
     return len(records_to_insert)
 
+async def activate_connections(db, user_id: UUID, upload_id: str) -> int:
+    """
+    Switch the user to an upload's connections and delete the set it replaces.
+
+    Returns:
+        Number of replaced connections deleted
+    """
+    previous = await db.connection_uploads.find_one_and_update(
+        {"_id": str(user_id)},
+        {"$set": {"upload_id": upload_id, "activated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    previous_upload = previous["upload_id"] if previous else None
+    if previous_upload == upload_id:
+        return 0
+    result = await db.connections.delete_many({"user_id": str(user_id), "upload_id": previous_upload})
+    return result.deleted_count
+
+async def discard_connections(db, user_id: UUID, upload_id: str) -> int:
+    """Delete the connections stored by an upload that will not go live"""
+    if upload_id == await get_live_upload(db, user_id):
+        return 0
+    result = await db.connections.delete_many({"user_id": str(user_id), "upload_id": upload_id})
+    return result.deleted_count
+
 async def get_user_connections(db, user_id: UUID, page: int = 1, limit: int = 100, min_rating: int = None):
     skip = (page - 1) * limit
-    query = {"user_id": str(user_id)}
+    query = await live_connections_query(db, user_id)
     if min_rating is not None:
         query["rating"] = {"$gte": min_rating}
     
@@ -91,5 +168,5 @@ async def delete_user_connections(db, user_id: UUID):
     return result.deleted_count
 
 async def get_user_connections_count(db, user_id: UUID):
-    count = await db.connections.count_documents({"user_id": str(user_id)})
+    count = await db.connections.count_documents(await live_connections_query(db, user_id))
     return count
\ No newline at end of file
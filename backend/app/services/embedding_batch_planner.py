@@ -0,0 +1,81 @@
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.openai_governor import BYTES_PER_TOKEN, estimate_tokens
+
+# Inputs the API still rejects as too long despite the conservative
+# BYTES_PER_TOKEN estimate are shrunk further on retry.
+
+
+class EmbeddingBatchPlanner:
+    """
+    Splits a list of texts into embedding requests the API will accept.
+
+    Each text is kept under the per-input token limit (truncating it if needed)
+    and texts are packed, in order, into requests that stay under both the
+    per-request token ceiling and the per-request input count.
+    """
+
+    def __init__(
+        self,
+        max_input_tokens: Optional[int] = None,
+        max_request_tokens: Optional[int] = None,
+        max_request_inputs: Optional[int] = None
+    ):
+        self.max_input_tokens = max_input_tokens or settings.EMBEDDING_MAX_INPUT_TOKENS
+        self.max_request_tokens = max_request_tokens or settings.EMBEDDING_MAX_REQUEST_TOKENS
+        self.max_request_inputs = max_request_inputs or settings.EMBEDDING_MAX_REQUEST_INPUTS
+
+    def estimate_tokens(self, text: str) -> int:
+        """Conservative token count for a text."""
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut a text down to roughly max_tokens estimated tokens.
+
+        Canonical profile text leads with name, headline and about, so keeping
+        the start keeps the most identifying content.
+        """
+        max_bytes = int(max_tokens * BYTES_PER_TOKEN)
+        encoded = text.encode("utf-8")
+        if len(encoded) <= max_bytes:
+            return text
+        # Drop any multi-byte character cut in half at the boundary
+        return encoded[:max_bytes].decode("utf-8", errors="ignore")
+
+    def plan(self, texts: List[str]) -> Tuple[List[str], List[List[int]]]:
+        """
+        Plan the requests for a list of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Tuple of (texts to send, truncated where needed; requests as lists of
+            indexes into texts). Blank texts, which the API rejects, are left out.
+        """
+        prepared = []
+        requests: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for index, text in enumerate(texts):
+            if self.estimate_tokens(text) > self.max_input_tokens:
+                text = self.truncate(text, self.max_input_tokens)
+            prepared.append(text)
+            if not text.strip():
+                continue
+
+            tokens = self.estimate_tokens(text)
+            if current and (
+                current_tokens + tokens > self.max_request_tokens
+                or len(current) >= self.max_request_inputs
+            ):
+                requests.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+
+        if current:
+            requests.append(current)
+        return prepared, requests
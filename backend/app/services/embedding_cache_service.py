@@ -0,0 +1,196 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from bson.binary import Binary
+from pymongo import UpdateOne
+from app.core.config import settings
+from app.core.db import get_database
+
+
+class EmbeddingCacheService:
+    """
+    Content-addressed embedding cache stored in the `embedding_cache` collection.
+
+    Entries are keyed by a hash of the canonical text plus the model name, so an
+    unchanged profile hits the cache no matter which upload or user it came from.
+    Vectors are stored as compact float16/float32 BSON Binary. A TTL index on
+    `last_accessed` expires entries that have not been read recently, and a
+    size cap evicts the least recently used entries once the collection grows
+    past EMBEDDING_CACHE_MAX_MB.
+    """
+
+    COLLECTION_NAME = "embedding_cache"
+
+    def __init__(self):
+        self.enabled = settings.EMBEDDING_CACHE_ENABLED
+        self.dtype = np.float16 if settings.EMBEDDING_CACHE_DTYPE == "float16" else np.float32
+        self.ttl_seconds = int(settings.EMBEDDING_CACHE_TTL_DAYS * 24 * 60 * 60)
+        self.max_bytes = int(settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        # Enforcing the size cap scans the collection, so do it at most this often
+        self.eviction_interval_seconds = 60
+        self._last_eviction_check = 0.0
+        self._indexes_ready = False
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, text: str, model: str) -> str:
+        """
+        Build the cache key for a canonical text embedded with a given model.
+
+        Args:
+            text: Canonical text that was embedded
+            model: Embedding model name
+
+        Returns:
+            Hex SHA-256 digest of the model name and text
+        """
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _encode(self, embedding: List[float]) -> Binary:
+        return Binary(np.asarray(embedding, dtype=self.dtype).tobytes())
+
+    def _decode(self, document: dict) -> List[float]:
+        dtype = np.float16 if document.get("dtype") == "float16" else np.float32
+        return np.frombuffer(document["embedding"], dtype=dtype).astype(np.float32).tolist()
+
+    async def _get_collection(self):
+        """Return the cache collection, or None when caching is unavailable."""
+        if not self.enabled:
+            return None
+        try:
+            collection = get_database()[self.COLLECTION_NAME]
+        except Exception:
+            # Scripts that never connected to MongoDB simply run uncached
+            return None
+
+        if not self._indexes_ready:
+            await collection.create_index("last_accessed", expireAfterSeconds=self.ttl_seconds)
+            self._indexes_ready = True
+        return collection
+
+    async def get_many(self, texts: List[str], model: str) -> Dict[str, List[float]]:
+        """
+        Look up cached embeddings for several texts with a single query.
+
+        Args:
+            texts: Canonical texts to look up
+            model: Embedding model name
+
+        Returns:
+            Mapping of text to embedding for every text that was cached
+        """
+        collection = await self._get_collection()
+        if collection is None or not texts:
+            return {}
+
+        keys_to_texts: Dict[str, str] = {self.make_key(text, model): text for text in texts}
+        try:
+            cursor = collection.find({"_id": {"$in": list(keys_to_texts)}})
+            documents = await cursor.to_list(length=None)
+
+            found = {keys_to_texts[doc["_id"]]: self._decode(doc) for doc in documents}
+            if documents:
+                # Refresh recency so the TTL and LRU eviction keep hot entries
+                await collection.update_many(
+                    {"_id": {"$in": [doc["_id"] for doc in documents]}},
+                    {"$set": {"last_accessed": datetime.now(timezone.utc)}}
+                )
+        except Exception as e:
+            print(f"Error reading embedding cache: {e}")
+            return {}
+
+        self.hits += len(found)
+        self.misses += len(keys_to_texts) - len(found)
+        return found
+
+    async def put_many(self, items: List[Tuple[str, List[float]]], model: str) -> None:
+        """
+        Store embeddings for several texts.
+
+        Args:
+            items: List of (canonical_text, embedding) tuples
+            model: Embedding model name
+        """
+        collection = await self._get_collection()
+        if collection is None or not items:
+            return
+
+        now = datetime.now(timezone.utc)
+        dtype_name = "float16" if self.dtype == np.float16 else "float32"
+        documents = {}
+        for text, embedding in items:
+            encoded = self._encode(embedding)
+            documents[self.make_key(text, model)] = {
+                "model": model,
+                "dtype": dtype_name,
+                "dimension": len(embedding),
+                "nbytes": len(encoded),
+                "embedding": encoded,
+                "created_at": now,
+                "last_accessed": now,
+            }
+
+        try:
+            # Insert-only: an existing entry for the same key is already identical
+            await collection.bulk_write(
+                [UpdateOne({"_id": key}, {"$setOnInsert": doc}, upsert=True) for key, doc in documents.items()],
+                ordered=False
+            )
+            await self._enforce_size_limit(collection)
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+
+    async def get(self, text: str, model: str) -> Optional[List[float]]:
+        """Look up the cached embedding for a single text."""
+        return (await self.get_many([text], model)).get(text)
+
+    async def put(self, text: str, embedding: List[float], model: str) -> None:
+        """Store the embedding for a single text."""
+        await self.put_many([(text, embedding)], model)
+
+    async def get_by_key(self, key: str) -> Optional[List[float]]:
+        """Look up a cached embedding directly by its cache key."""
+        collection = await self._get_collection()
+        if collection is None:
+            return None
+        document = await collection.find_one({"_id": key})
+        return self._decode(document) if document else None
+
+    async def _enforce_size_limit(self, collection) -> None:
+        """Evict least recently used entries until the cache fits EMBEDDING_CACHE_MAX_MB."""
+        if self.max_bytes <= 0:
+            return
+        if time.monotonic() - self._last_eviction_check < self.eviction_interval_seconds:
+            return
+        self._last_eviction_check = time.monotonic()
+
+        totals = await collection.aggregate([
+            {"$group": {"_id": None, "bytes": {"$sum": "$nbytes"}}}
+        ]).to_list(length=1)
+        total_bytes = totals[0]["bytes"] if totals else 0
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Evict down to 90% of the cap so we don't evict again on the next write
+        bytes_to_free = total_bytes - int(self.max_bytes * 0.9)
+        keys_to_delete = []
+        cursor = collection.find({}, {"_id": 1, "nbytes": 1}).sort("last_accessed", 1)
+        async for document in cursor:
+            keys_to_delete.append(document["_id"])
+            bytes_to_free -= document.get("nbytes", 0)
+            if bytes_to_free <= 0:
+                break
+
+        if keys_to_delete:
+            result = await collection.delete_many({"_id": {"$in": keys_to_delete}})
+            print(f"Evicted {result.deleted_count} least recently used embeddings from cache")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for this process."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Global instance
+embedding_cache_service = EmbeddingCacheService()
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# The vector index that reads and writes currently use, with the embedding
+# model and dimensions its vectors were made with. Only written by
+# migrate_embedding_index.py; without it the settings apply. Switching is a
+# single-document update, so every process moves to the new index at once.
+ACTIVE_INDEX_ID = "active"
+
+# Output size of each model when no `dimensions` are requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+def embedding_key(model: str, dimensions: int) -> str:
+    """
+    Name of the embedding space a (model, dimensions) pair produces, used in
+    cache keys and content hashes. Native dimensions keep the bare model name,
+    so existing caches and manifests stay valid.
+    """
+    if dimensions == NATIVE_DIMENSIONS.get(model):
+        return model
+    return f"{model}:{dimensions}"
+
+async def get_active_index(db) -> Optional[Dict[str, Any]]:
+    """Return {index_name, model, dimensions} of the active index, or None if never migrated"""
+    return await db.embedding_index.find_one({"_id": ACTIVE_INDEX_ID}, {"_id": 0, "previous": 0})
+
+async def set_active_index(db, index_name: str, model: str, dimensions: int) -> Optional[Dict[str, Any]]:
+    """Switch reads and writes to another index; returns the previously active one"""
+    previous = await get_active_index(db)
+    await db.embedding_index.update_one(
+        {"_id": ACTIVE_INDEX_ID},
+        {"$set": {
+            "index_name": index_name,
+            "model": model,
+            "dimensions": dimensions,
+            "switched_at": datetime.now(timezone.utc),
+            "previous": previous,
+        }},
+        upsert=True
+    )
+    return previous
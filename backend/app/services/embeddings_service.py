@@ -1,18 +1,37 @@
-import re
 import csv
 import asyncio
+import copy
 import os
-from typing import List, Dict, Any, Tuple, Optional
+import time
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable
 from datetime import datetime
-import pandas as pd
-from bs4 import BeautifulSoup
-import emoji
 import openai
-import httpx
-from pinecone import Pinecone
+import pandas as pd
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.core.config import settings
 from app.core.db import get_database
+from app.core.openai_client import get_openai_client
+from app.core.openai_governor import Priority, openai_governor
+from app.core.process_pool import get_process_pool, process_pool
+from app.core.vector_store import get_vector_index, vector_store
+from app.core.vector_upsert_engine import vector_upsert_engine
+from app.services.embedding_cache_service import embedding_cache_service
+from app.services.embedding_batch_planner import EmbeddingBatchPlanner
+from app.services import embedding_index_service, ingest_manifest_service, namespace_alias_service, profile_canonicalizer, profile_store_service, sparse_encoder, sparse_vocabulary_service
+from app.services.ingestion_pipeline import IngestionPipeline
+
+# How often each process checks whether migrate_embedding_index.py switched indexes
+ACTIVE_INDEX_REFRESH_SECONDS = 10
+# Pinecone fetches at most this many IDs per request
+FETCH_BATCH_SIZE = 100
+# Vectors copied between namespaces per round of concurrent fetches and one upsert
+COPY_BATCH_SIZE = 1000
+
+def _sparse_dict(sparse_values: Any) -> Optional[Dict[str, list]]:
+    """Sparse values of a fetched vector in upsert form (Pinecone returns a SparseValues object)."""
+    if sparse_values is None or isinstance(sparse_values, dict):
+        return sparse_values
+    return {"indices": list(sparse_values.indices), "values": list(sparse_values.values)}
 
 class EmbeddingsService:
     def __init__(self):
@@ -21,38 +40,68 @@ class EmbeddingsService:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
         try:
-            # Create a custom HTTP client without proxy configuration
-            http_client = httpx.Client(
-                timeout=60.0,
-                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
-            )
-            
-            # Initialize OpenAI client with custom HTTP client
-            self.openai_client = openai.OpenAI(
-                api_key=settings.OPENAI_API_KEY,
-                http_client=http_client
-            )
+            # Shared AsyncOpenAI client so embedding calls never block the event loop
+            self.openai_client = get_openai_client()
             print("OpenAI client initialized successfully in embeddings service")
         except Exception as e:
             print(f"Error initializing OpenAI client in embeddings service: {e}")
             raise ValueError(f"Failed to initialize OpenAI client: {e}")
             
-        # Initialize Pinecone client only if API key is provided
-        if settings.PINECONE_API_KEY:
-            try:
-                self.pinecone_client = Pinecone(api_key=settings.PINECONE_API_KEY)
-                self.index = self.pinecone_client.Index(settings.PINECONE_INDEX_NAME)
-            except Exception as e:
-                print(f"Warning: Could not initialize Pinecone client: {e}")
-                self.pinecone_client = None
-                self.index = None
-        else:
-            self.pinecone_client = None
+        # Pinecone index, or the local index when VECTOR_STORE=local
+        self.index_name = settings.PINECONE_INDEX_NAME
+        try:
+            self.index = get_vector_index(self.index_name)
+        except Exception as e:
+            print(f"Warning: Could not initialize vector store: {e}")
             self.index = None
+        self.pinecone_client = vector_store.pinecone_client
             
-        self.embedding_model = "text-embedding-3-small"
-        self.batch_size = 500
+        self.embedding_model = settings.EMBEDDING_MODEL
+        self.embedding_dimensions = settings.EMBEDDING_DIMENSIONS
+        self._active_index_checked_at = 0.0
+        self.metadata_mode = settings.PINECONE_METADATA_MODE
+        self.hybrid_search = settings.PINECONE_HYBRID_SEARCH
+        self.batch_planner = EmbeddingBatchPlanner()
         
+    @property
+    def embedding_key(self) -> str:
+        """Embedding space of the current model and dimensions (part of cache keys and content hashes)."""
+        return embedding_index_service.embedding_key(self.embedding_model, self.embedding_dimensions)
+    
+    def _dimensions_option(self) -> Dict[str, int]:
+        """The `dimensions` request option, only sent for shortened embeddings."""
+        if self.embedding_dimensions == embedding_index_service.NATIVE_DIMENSIONS.get(self.embedding_model):
+            return {}
+        return {"dimensions": self.embedding_dimensions}
+    
+    def use_index(self, index_name: str, model: str, dimensions: int) -> None:
+        """
+        Point reads and writes at another vector index, whose vectors are made
+        with the given embedding model and dimensions.
+        """
+        self.index = get_vector_index(index_name)
+        self.index_name = index_name
+        self.embedding_model = model
+        self.embedding_dimensions = dimensions
+    
+    async def refresh_active_index(self) -> None:
+        """
+        Follow an index switch made by migrate_embedding_index.py (checked at most
+        every ACTIVE_INDEX_REFRESH_SECONDS). Without MongoDB the current index is kept.
+        """
+        if time.monotonic() - self._active_index_checked_at < ACTIVE_INDEX_REFRESH_SECONDS:
+            return
+        self._active_index_checked_at = time.monotonic()
+        try:
+            active = await embedding_index_service.get_active_index(get_database())
+        except Exception:
+            return
+        if not active:
+            return
+        if (active["index_name"], active["model"], active["dimensions"]) != (self.index_name, self.embedding_model, self.embedding_dimensions):
+            self.use_index(active["index_name"], active["model"], active["dimensions"])
+            print(f"Switched to vector index {self.index_name} ({self.embedding_key})")
+    
     def canonicalize_profile_text(self, row: pd.Series) -> str:
         """
         Canonicalize profile text by merging all relevant fields from a row into a clean string.
@@ -63,49 +112,11 @@ class EmbeddingsService:
         Returns:
             A single canonicalized text string for vectorization.
         """
-        # Extract all relevant textual information from the row
-        full_name = str(row.get("fullName", "")).strip()
-        headline = str(row.get("headline", "")).strip()
-        about = str(row.get("about", "")).strip()
-        experiences = str(row.get("experiences", "")).strip()
-        education = str(row.get("education", "")).strip()
-        skills = str(row.get("skills", "")).strip()
-        company_name = str(row.get("companyName", "")).strip()
-        location = f"{str(row.get('city', '')).strip()} {str(row.get('country', '')).strip()}".strip()
-
-        # Combine all fields into a comprehensive string
-        combined_text = " ".join(filter(None, [
-            full_name,
-            headline,
-            about,
-            "Past Experience: " + experiences if experiences else "",
-            "Education: " + education if education else "",
-            "Skills: " + skills if skills else "",
-            "Current Company: " + company_name if company_name else "",
-            "Location: " + location if location else ""
-        ]))
-        
-        # Remove HTML tags
-        soup = BeautifulSoup(combined_text, 'html.parser')
-        text = soup.get_text()
-        
-        # Remove emojis
-        text = emoji.replace_emoji(text, replace='')
-        
-        # Expand "Sr." to "Senior"
-        text = re.sub(r'\bSr\.?\s*', 'Senior ', text, flags=re.IGNORECASE)
-        
-        # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Convert to lowercase and strip
-        text = text.lower().strip()
-        
-        return text
+        return profile_canonicalizer.canonicalize_profile_row(row)
     
     async def generate_embedding(self, text: str) -> List[float]:
         """
-        Generate embedding for the given text using OpenAI's text-embedding-3-small model.
+        Generate embedding for the given text with the configured model and dimensions.
         
         Args:
             text: Text to generate embedding for
@@ -117,81 +128,157 @@ class EmbeddingsService:
             raise ValueError("OpenAI client not initialized. Please check OPENAI_API_KEY configuration.")
             
         try:
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model,
-                input=text
+            response = await openai_governor.run(
+                self.embedding_model,
+                lambda: self.openai_client.embeddings.create(model=self.embedding_model, input=text, **self._dimensions_option()),
+                priority=Priority.INTERACTIVE,
+                estimated_tokens=self.batch_planner.estimate_tokens(text)
             )
             return response.data[0].embedding
         except Exception as e:
             print(f"Error generating embedding: {e}")
             raise
     
-    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    async def generate_embeddings_batch(
+        self,
+        texts: List[str],
+        priority: Priority = Priority.BACKGROUND
+    ) -> List[Optional[List[float]]]:
         """
-        Generate embeddings for a batch of texts using OpenAI's text-embedding-3-small model.
-        This makes a single API call for all texts, which is much more efficient than individual calls.
+        Generate embeddings for a batch of texts with the configured model and dimensions.
+        
+        Texts are packed into as few requests as the API's per-input and per-request
+        token limits allow; texts over the per-input limit are truncated. If a request
+        is rejected, it is bisected to isolate the offending input, so one bad text
+        never fails the rest of the batch.
         
         Args:
             texts: List of texts to generate embeddings for
+            priority: Governor priority; batches are ingestion work by default
             
         Returns:
-            List of embedding vectors corresponding to each input text
+            List of embedding vectors corresponding to each input text, with None for
+            texts that could not be embedded
         """
         if not self.openai_client:
             raise ValueError("OpenAI client not initialized. Please check OPENAI_API_KEY configuration.")
             
         if not texts:
             return []
-            
+        
+        prepared_texts, requests = self.batch_planner.plan(texts)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for indexes in requests:
+            await self._embed_request(prepared_texts, indexes, embeddings, priority)
+        return embeddings
+    
+    async def _embed_request(
+        self,
+        texts: List[str],
+        indexes: List[int],
+        embeddings: List[Optional[List[float]]],
+        priority: Priority = Priority.BACKGROUND,
+        shrink_attempts: int = 3
+    ) -> None:
+        """
+        Embed texts[i] for every i in indexes into embeddings[i], bisecting on rejected input.
+        
+        Only errors about the input itself (400/422) are bisected; rate limits and
+        transient failures are retried by the governor, and anything it gives up on
+        affects every input alike and is raised.
+        """
+        batch = [texts[i] for i in indexes]
         try:
-            response = self.openai_client.embeddings.create(
-                model=self.embedding_model,
-                input=texts
+            response = await openai_governor.run(
+                self.embedding_model,
+                lambda: self.openai_client.embeddings.create(model=self.embedding_model, input=batch, **self._dimensions_option()),
+                priority=priority,
+                estimated_tokens=sum(self.batch_planner.estimate_tokens(text) for text in batch)
             )
-            return [data.embedding for data in response.data]
-        except Exception as e:
-            print(f"Error generating batch embeddings: {e}")
-            raise
+            for index, data in zip(indexes, response.data):
+                embeddings[index] = data.embedding
+            return
+        except (openai.BadRequestError, openai.UnprocessableEntityError) as e:
+            error = e
+        
+        if len(indexes) > 1:
+            middle = len(indexes) // 2
+            await self._embed_request(texts, indexes[:middle], embeddings, priority)
+            await self._embed_request(texts, indexes[middle:], embeddings, priority)
+            return
+        
+        # A single input rejected as too long: it has more tokens than estimated
+        index = indexes[0]
+        estimated_tokens = self.batch_planner.estimate_tokens(texts[index])
+        too_long = getattr(error, "code", None) == "context_length_exceeded" or "maximum context length" in str(error)
+        if too_long and shrink_attempts > 0 and estimated_tokens > 1:
+            texts[index] = self.batch_planner.truncate(texts[index], estimated_tokens // 2)
+            print(f"Embedding input {index} rejected ({error}); retrying truncated to ~{estimated_tokens // 2} tokens")
+            await self._embed_request(texts, indexes, embeddings, priority, shrink_attempts - 1)
+            return
+        
+        print(f"Error generating embedding for input {index}: {error}")
     
-    async def get_cached_embedding(self, profile_id: str) -> Optional[List[float]]:
+    async def get_cached_embedding(self, text: str) -> Optional[List[float]]:
         """
-        Retrieve cached embedding for a profile.
+        Retrieve the cached embedding for a canonical text.
+        
+        The cache is content-addressed (hash of text + model and dimensions), so an unchanged
+        profile hits the cache regardless of its profile ID or upload.
         
         Args:
-            profile_id: Profile ID to look up
+            text: Canonical text to look up
             
         Returns:
             Cached embedding vector or None if not found
         """
-        # Caching disabled to prevent disk space issues on deployment environment.
-        return None
+        return await embedding_cache_service.get(text, self.embedding_key)
     
-    async def cache_embedding(self, profile_id: str, embedding: List[float]) -> None:
+    async def cache_embedding(self, text: str, embedding: List[float]) -> None:
         """
-        Cache embedding for a profile.
+        Cache the embedding for a canonical text.
         
         Args:
-            profile_id: Profile ID
+            text: Canonical text that was embedded
             embedding: Embedding vector to cache
         """
-        # Caching disabled to prevent disk space issues on deployment environment.
-        return
+        await embedding_cache_service.put(text, embedding, self.embedding_key)
     
-    async def get_or_generate_embedding(self, profile_id: str, text: str) -> List[float]:
+    async def get_cached_embeddings_batch(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Retrieve cached embeddings for several canonical texts with one lookup.
+        
+        Args:
+            texts: Canonical texts to look up
+            
+        Returns:
+            Mapping of text to embedding for every cached text
+        """
+        return await embedding_cache_service.get_many(texts, self.embedding_key)
+    
+    async def cache_embeddings_batch(self, items: List[Tuple[str, List[float]]]) -> None:
+        """
+        Cache embeddings for several canonical texts with one write.
+        
+        Args:
+            items: List of (canonical_text, embedding) tuples
+        """
+        await embedding_cache_service.put_many(items, self.embedding_key)
+    
+    async def get_or_generate_embedding(self, text: str) -> List[float]:
         """
         Get cached embedding or generate new one if not cached.
         This method is kept for backward compatibility and single-item processing.
         For batch processing, use generate_embeddings_batch directly.
         
         Args:
-            profile_id: Profile ID
             text: Text to generate embedding for
             
         Returns:
             Embedding vector
         """
         # Try to get cached embedding first
-        cached_embedding = await self.get_cached_embedding(profile_id)
+        cached_embedding = await self.get_cached_embedding(text)
         if cached_embedding:
             return cached_embedding
         
@@ -199,47 +286,71 @@ class EmbeddingsService:
         embedding = await self.generate_embedding(text)
         
         # Cache the embedding
-        await self.cache_embedding(profile_id, embedding)
+        await self.cache_embedding(text, embedding)
         
         return embedding
     
-    def batch_upsert_to_pinecone(self, vectors: List[Tuple[str, List[float], Dict[str, Any]]], namespace: str) -> None:
+    async def batch_upsert_to_pinecone(self, vectors: List[Tuple[str, List[float], Dict[str, Any]]], namespace: str) -> Dict[str, Any]:
         """
-        Perform batch upsert to Pinecone index.
+        Upsert vectors to the Pinecone index in concurrent requests sized by
+        payload bytes (see VectorUpsertEngine).
         
         Args:
-            vectors: List of tuples (id, vector, metadata)
+            vectors: List of tuples (id, vector, metadata), or (id, vector, metadata, sparse_values)
+                for hybrid search
             namespace: Namespace for tenant isolation (user_id)
+            
+        Returns:
+            Upsert summary: requests sent, bytes and per-request latencies
         """
         if not self.index:
-            raise ValueError("Pinecone client not initialized. Please check PINECONE_API_KEY and PINECONE_INDEX_NAME configuration.")
+            raise ValueError("Vector index not initialized. Please check PINECONE_API_KEY and PINECONE_INDEX_NAME, or set VECTOR_STORE=local.")
             
         try:
-            # Process vectors in batches
-            for i in range(0, len(vectors), self.batch_size):
-                batch = vectors[i:i + self.batch_size]
-                
-                # Format vectors for Pinecone
-                formatted_vectors = []
-                for vector_id, vector, metadata in batch:
-                    formatted_vectors.append({
-                        "id": vector_id,
-                        "values": vector,
-                        "metadata": metadata
-                    })
-                
-                # Upsert batch to Pinecone
-                self.index.upsert(
-                    vectors=formatted_vectors,
-                    namespace=namespace
-                )
-                
-                print(f"Upserted batch {i//self.batch_size + 1} with {len(batch)} vectors to namespace {namespace}")
+            # Format vectors for Pinecone
+            formatted_vectors = []
+            for vector_id, vector, metadata, *sparse_values in vectors:
+                formatted_vector = {
+                    "id": vector_id,
+                    "values": vector,
+                    "metadata": metadata
+                }
+                if sparse_values and sparse_values[0]:
+                    formatted_vector["sparse_values"] = sparse_values[0]
+                formatted_vectors.append(formatted_vector)
+            
+            return await vector_upsert_engine.upsert(self.index, formatted_vectors, namespace)
                 
         except Exception as e:
             print(f"Error upserting to Pinecone: {e}")
             raise
     
+    async def index_profiles(self, items: List[Dict[str, Any]], namespace: str) -> None:
+        """
+        Store embedded profiles: upsert their vectors (with sparse values, when
+        prepared for hybrid search) to Pinecone and, in slim metadata mode, their
+        full metadata to the profiles collection.
+        
+        Args:
+            items: Prepared profiles with 'profile_id', 'embedding' and 'metadata'
+                (and optionally 'sparse_values')
+            namespace: Namespace for tenant isolation (user_id)
+        """
+        if self.metadata_mode == "slim":
+            # Profiles go in first, so a vector is never searchable without its profile
+            await profile_store_service.store_profiles(
+                get_database(),
+                namespace,
+                [(item['profile_id'], item['metadata']) for item in items]
+            )
+            vectors = [
+                (item['profile_id'], item['embedding'], profile_canonicalizer.slim_metadata(item['profile_id'], item['metadata']), item.get('sparse_values'))
+                for item in items
+            ]
+        else:
+            vectors = [(item['profile_id'], item['embedding'], item['metadata'], item.get('sparse_values')) for item in items]
+        await self.batch_upsert_to_pinecone(vectors, namespace)
+    
     def load_connections_data(self, csv_path: str = "updated_connections.csv") -> pd.DataFrame:
         """
         Load connections data from CSV file.
@@ -271,273 +382,386 @@ class EmbeddingsService:
         Returns:
             Metadata dictionary with flattened profile data.
         """
-        metadata = {}
-
-        # Helper to safely get a value from the row
-        def safe_get(key, default=None):
-            val = row.get(key)
-            # Check for pandas missing values (NaT, nan, None)
-            if pd.isna(val):
-                return default
-            return val
-
-        # Helper to convert to string, returning None for empty strings
-        def to_str(value):
-            if value is None:
-                return None
-            s = str(value).strip()
-            return s if s else None
-
-        # Helper to convert to integer
-        def to_int(value):
-            if value is None:
-                return None
-            try:
-                # Handle cases like '500+' by removing non-digits
-                if isinstance(value, str):
-                    cleaned_value = re.sub(r'[^\d]', '', value)
-                    return int(cleaned_value) if cleaned_value else None
-                return int(float(value))
-            except (ValueError, TypeError):
-                return None
-
-        # Helper to convert to boolean
-        def to_bool(value):
-            if value is None:
-                return False # Default to False for boolean flags
-            if isinstance(value, bool):
-                return value
-            return str(value).lower() in ['true', '1', 't', 'y', 'yes']
-
-        # Define all possible profile fields and their conversion functions
-        # This combines fields from the Connection model and observed CSV columns
-        field_map = {
-            # Personal Info
-            'fullName': to_str,
-            'firstName': to_str,
-            'lastName': to_str,
-            'headline': to_str,
-            'about': to_str,
-            'description': to_str,
-            'city': to_str,
-            'state': to_str,
-            'country': to_str,
-            'location': to_str,
-            'profilePicture': to_str,
-            'publicIdentifier': to_str,
-            'linkedin_url': to_str,
-            'email_address': to_str,
+        return profile_canonicalizer.extract_metadata_row(row)
+    
+    def resolve_profile_id(self, row: pd.Series, fallback: str) -> str:
+        """
+        Resolve the stable profile ID used as the vector ID (and the connection ID) for a row.
+        
+        Derived from 'urn' as the primary unique identifier, then publicIdentifier,
+        then linkedin_url, and finally the supplied row-based fallback.
+        
+        Args:
+            row: A pandas Series representing a row from the connections DataFrame.
+            fallback: Key to derive the ID from when the row has no identifier columns
             
-            # Connection & Stats
-            'connected_on': to_str,
-            'followerCount': to_int,
-            'followers': to_int,
-            'connectionsCount': to_int,
+        Returns:
+            Profile ID (UUID string)
+        """
+        return profile_canonicalizer.resolve_profile_id_row(row, fallback)
+    
+    def compute_content_hash(self, canonical_text: str, metadata: Dict[str, Any]) -> str:
+        """
+        Hash everything that ends up in a profile's vector record, so an unchanged
+        profile can be skipped on re-ingestion.
+        
+        Args:
+            canonical_text: Canonicalized profile text (determines the embedding)
+            metadata: Metadata stored alongside the vector
             
-            # Flags
-            'isCreator': to_bool,
-            'isPremium': to_bool,
-            'isTopVoice': to_bool,
-            'isOpenToWork': to_bool,
-            'isHiring': to_bool,
-            'isInfluencer': to_bool,
+        Returns:
+            Hex SHA-256 digest
+        """
+        return profile_canonicalizer.compute_content_hash(self.embedding_key, canonical_text, metadata, self.metadata_mode)
+    
+    def delete_vectors_from_pinecone(self, profile_ids: List[str], namespace: str) -> None:
+        """
+        Delete vectors by ID from a Pinecone namespace.
+        
+        Args:
+            profile_ids: Vector IDs to delete
+            namespace: Namespace for tenant isolation (user_id)
+        """
+        if not self.index:
+            raise ValueError("Vector index not initialized. Please check PINECONE_API_KEY and PINECONE_INDEX_NAME, or set VECTOR_STORE=local.")
+        
+        # Pinecone accepts at most 1000 IDs per delete request
+        for i in range(0, len(profile_ids), 1000):
+            self.index.delete(ids=profile_ids[i:i + 1000], namespace=namespace)
+    
+    async def copy_profiles(self, profiles: Dict[str, str], source_namespace: str, target_namespace: str) -> int:
+        """
+        Copy indexed profiles to another namespace without re-embedding them: their
+        vectors (with metadata and sparse values), their stored profiles in slim
+        metadata mode, and their ingest manifest entries.
+        
+        Args:
+            profiles: {profile_id: content_hash} of the profiles to copy
+            source_namespace: Namespace the profiles are indexed in
+            target_namespace: Namespace to copy them to
             
-            # Professional Details
-            'title': to_str,
-            'experiences': to_str,
-            'education': to_str,
-            'skills': to_str,
-            'schoolName': to_str,
-            'pronoun': to_str,
-            'associated_hashtags': to_str,
+        Returns:
+            Number of profiles copied; ones missing from the source index are left
+            out of the target manifest, so the next upload embeds them again
+        """
+        db = get_database()
+        profile_ids = list(profiles)
+        copied = 0
+        for start in range(0, len(profile_ids), COPY_BATCH_SIZE):
+            batch = profile_ids[start:start + COPY_BATCH_SIZE]
+            responses = await asyncio.gather(*(
+                asyncio.to_thread(self.index.fetch, ids=batch[i:i + FETCH_BATCH_SIZE], namespace=source_namespace)
+                for i in range(0, len(batch), FETCH_BATCH_SIZE)
+            ))
+            fetched = {vector_id: vector for response in responses for vector_id, vector in response.vectors.items()}
+            if not fetched:
+                continue
+            if self.metadata_mode == "slim":
+                # Profiles go in first, so a vector is never searchable without its profile
+                stored = await profile_store_service.get_profiles(db, source_namespace, list(fetched))
+                await profile_store_service.store_profiles(db, target_namespace, list(stored.items()))
+            await self.batch_upsert_to_pinecone(
+                [(vector_id, vector.values, vector.metadata, _sparse_dict(vector.sparse_values)) for vector_id, vector in fetched.items()],
+                target_namespace
+            )
+            await ingest_manifest_service.record_profiles(db, target_namespace, [(vector_id, profiles[vector_id]) for vector_id in fetched])
+            copied += len(fetched)
+        if copied < len(profile_ids):
+            print(f"{len(profile_ids) - copied} profiles were missing from namespace {source_namespace}; the next upload embeds them again")
+        return copied
+    
+    async def _get_ingest_manifest(self, namespace: str) -> Optional[Dict[str, str]]:
+        """Load the ingest manifest for a namespace, or None when MongoDB is unavailable."""
+        try:
+            db = get_database()
+        except Exception:
+            return None
+        return await ingest_manifest_service.get_manifest(db, namespace)
+    
+    async def get_live_namespace(self, user_id: str) -> str:
+        """The namespace searches read the user's profiles from (the user ID without MongoDB)."""
+        try:
+            db = get_database()
+        except Exception:
+            return user_id
+        return await namespace_alias_service.get_namespace(db, user_id)
+    
+    def prepare_chunk(
+        self,
+        chunk_df: pd.DataFrame,
+        indexed_profiles: Optional[Dict[str, str]] = None,
+        avg_doc_length: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        CPU stage of ingestion: canonicalize, extract metadata and diff one chunk of rows.
+        
+        Args:
+            chunk_df: Chunk of rows from the connections CSV
+            indexed_profiles: {profile_id: content_hash} already indexed, or None to upsert everything
+            avg_doc_length: Average document length for BM25 sparse vectors, or None for dense only
             
-            # Company Details
-            'companyName': to_str,
-            'company': to_str,
-            'company_size': to_str,
-            'company_website': to_str,
-            'company_phone': to_str,
-            'company_industry': to_str,
-            'company_industry_topics': to_str,
-            'company_description': to_str,
-            'company_address': to_str,
-            'company_city': to_str,
-            'company_state': to_str,
-            'company_country': to_str,
-            'company_revenue': to_str,
-            'company_latest_funding': to_str,
-            'company_linkedin': to_str,
-            'urn': to_str,
-        }
-
-        for field, converter in field_map.items():
-            value = safe_get(field)
-            if value is not None:
-                converted_value = converter(value)
-                # Add to metadata only if it's not None and not an empty string
-                if converted_value is not None and converted_value != '':
-                    # Use a consistent key, e.g., 'companyName' over 'company'
-                    key = 'companyName' if field == 'company' else field
-                    key = 'followerCount' if field == 'followers' else key
-                    if key not in metadata: # Prioritize first-seen key
-                        metadata[key] = converted_value
-
-        # Post-processing to ensure consistency
-        if 'fullName' not in metadata and ('firstName' in metadata or 'lastName' in metadata):
-            first = metadata.get('firstName', '') or ''
-            last = metadata.get('lastName', '') or ''
-            full_name = f"{first} {last}".strip()
-            if full_name:
-                metadata['fullName'] = full_name
-
-        return metadata
+        Returns:
+            Dictionary with the profiles to index ('items'), the IDs seen in the chunk,
+            unchanged/error counts and term statistics ('vocabulary')
+        """
+        return profile_canonicalizer.prepare_profiles(
+            chunk_df, indexed_profiles, self.embedding_key, self.metadata_mode, avg_doc_length
+        )
     
-    async def process_profiles_and_upsert(self, csv_path: str = "updated_connections.csv", user_id: str = "default_user", chunk_size: int = 100) -> Dict[str, Any]:
+    async def _get_avg_doc_length(self, namespace: str) -> Optional[float]:
+        """Average document length to encode sparse vectors with, or None without hybrid search."""
+        if not self.hybrid_search:
+            return None
+        # The previous fit of the namespace; a new one is saved after this run
+        try:
+            stats = await sparse_vocabulary_service.get_stats(get_database(), namespace)
+        except Exception:
+            stats = None
+        return stats["avg_doc_length"] if stats else sparse_encoder.DEFAULT_AVG_DOC_LENGTH
+    
+    async def embed_prepared_items(self, items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Network stage of ingestion: attach an embedding to each prepared profile,
+        reusing cached embeddings and generating the rest in token-packed batch calls.
+        
+        Args:
+            items: Prepared profiles from prepare_chunk
+            
+        Returns:
+            Tuple of (items that now carry an 'embedding', number of items that failed)
+        """
+        if not items:
+            return [], 0
+        
+        # Look up cached embeddings for the whole chunk in one query
+        cached_embeddings = await self.get_cached_embeddings_batch([item['canonical_text'] for item in items])
+        
+        embedded = []
+        batch_data = []
+        for item in items:
+            cached_embedding = cached_embeddings.get(item['canonical_text'])
+            if cached_embedding:
+                embedded.append({**item, 'embedding': cached_embedding})
+            else:
+                batch_data.append(item)
+        
+        if not batch_data:
+            return embedded, 0
+        
+        try:
+            # Generate embeddings in as few API calls as the token limits allow
+            texts_to_embed = [item['canonical_text'] for item in batch_data]
+            embeddings = await self.generate_embeddings_batch(texts_to_embed)
+        except Exception as e:
+            print(f"Error generating batch embeddings: {e}")
+            return embedded, len(batch_data)
+        
+        # Only inputs the API rejected count as errors; the rest of the chunk goes ahead
+        generated = [(item, embedding) for item, embedding in zip(batch_data, embeddings) if embedding is not None]
+        
+        # Cache the new embeddings
+        await self.cache_embeddings_batch([(item['canonical_text'], embedding) for item, embedding in generated])
+        
+        for item, embedding in generated:
+            embedded.append({**item, 'embedding': embedding})
+        return embedded, len(batch_data) - len(generated)
+    
+    def _use_process_pool(self, csv_path: str) -> bool:
+        """Whether a CSV is large enough to be worth preparing in worker processes."""
+        if settings.INGEST_PROCESS_POOL_MIN_MB <= 0:
+            return False
+        try:
+            size_mb = os.path.getsize(csv_path) / (1024 * 1024)
+        except OSError:
+            return False
+        return size_mb >= settings.INGEST_PROCESS_POOL_MIN_MB
+    
+    async def process_profiles_and_upsert(
+        self,
+        csv_path: str = "updated_connections.csv",
+        user_id: str = "default_user",
+        chunk_size: int = 100,
+        incremental: bool = True,
+        on_chunk_done: Optional[Callable[[int, Dict[str, int]], Awaitable[None]]] = None,
+        resume_after_chunk: int = 0,
+        on_chunk_read: Optional[Callable[[pd.DataFrame], Awaitable[None]]] = None,
+        namespace: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Process all profiles from CSV in chunks, generate embeddings in batches, and upsert to Pinecone.
         
+        Chunks flow through a pipeline (parse -> embed -> upsert) connected by
+        bounded queues, so embedding chunk N+1 overlaps with upserting chunk N.
+        
+        With INGEST_NAMESPACE_SWAP the upload is built into a new versioned
+        namespace, and searches are switched to it only once every chunk is
+        indexed; the namespace it replaces is garbage-collected later. In
+        incremental mode the new namespace is diffed against the live one's
+        manifest: only new or changed profiles are embedded and upserted,
+        unchanged ones are copied from the live namespace, and an upload with
+        no changes at all keeps the live namespace. A run with failed chunks
+        raises instead, leaving the previous upload live.
+        
+        Otherwise the user's live namespace is updated in place. In incremental
+        mode each row's profile ID and content hash are compared with the ingest
+        manifest for the namespace: unchanged profiles are skipped, new or
+        changed ones are embedded and upserted, and vectors for profiles missing
+        from the CSV are deleted. Without a manifest (or with incremental=False)
+        every profile is upserted.
+        
+        CSVs of at least INGEST_PROCESS_POOL_MIN_MB are canonicalized in worker
+        processes so the work scales with cores and stays off the API process.
+        
         Args:
             csv_path: Path to the CSV file
             user_id: User ID for namespace isolation
             chunk_size: Number of rows to process in each chunk
+            incremental: Whether to diff against what is already indexed
+            on_chunk_done: Awaited with (chunk_number, counts) as each chunk finishes,
+                e.g. to checkpoint an ingestion job
+            resume_after_chunk: Number of leading chunks already indexed by an
+                interrupted run; they are read for their profile IDs (and term statistics) only
+            on_chunk_read: Awaited with every chunk as it is read, so other consumers
+                of the CSV can share this single parse
+            namespace: Versioned namespace an earlier attempt of this upload was
+                building (see namespace_alias_service.allocate_namespace); by default
+                a new one is allocated, or with INGEST_NAMESPACE_SWAP off (or when
+                resuming an in-place run) the live namespace is updated
             
         Returns:
-            Processing results summary
+            Processing results summary, including per-stage throughput
         """
+        # Work on a snapshot of the service, so every chunk of this run goes to the
+        # index (and embedding space) that was active when it started
+        await self.refresh_active_index()
+        run = copy.copy(self)
+        
+        live_namespace = await run.get_live_namespace(user_id)
+        allocated = False
+        if namespace is None and settings.INGEST_NAMESPACE_SWAP and not resume_after_chunk:
+            try:
+                db = get_database()
+            except Exception:
+                db = None  # Without MongoDB there is no alias to switch; update in place
+            if db is not None:
+                namespace = await namespace_alias_service.allocate_namespace(db, user_id)
+                allocated = True
+        namespace = namespace or live_namespace
+        swap = namespace != live_namespace
+        
         try:
-            # Initialize counters
-            total_processed_count = 0
-            total_error_count = 0
-            total_vectors_upserted = 0
-            chunk_number = 0
-            total_rows = 0
+            # Profiles already indexed in this namespace: {profile_id: content_hash}
+            indexed_profiles = await run._get_ingest_manifest(namespace) if incremental else None
+            # A new version is diffed against the live one, so unchanged profiles are
+            # copied over afterwards instead of being embedded and upserted again
+            live_profiles = None
+            if swap and indexed_profiles is not None:
+                live_profiles = await run._get_ingest_manifest(live_namespace)
+                # What an earlier attempt of this build already indexed takes precedence
+                indexed_profiles = {**live_profiles, **indexed_profiles}
             
-            print(f"Starting chunked processing of {csv_path} with chunk size {chunk_size}")
+            mode = "incremental" if indexed_profiles is not None else "full"
+            print(f"Starting {mode} chunked processing of {csv_path} into namespace {namespace} with chunk size {chunk_size}")
             
-            # Process CSV in chunks
-            for chunk_df in pd.read_csv(csv_path, chunksize=chunk_size):
-                chunk_number += 1
-                chunk_vectors = []
-                chunk_processed_count = 0
-                chunk_error_count = 0
-                
-                print(f"Processing batch of {len(chunk_df)} profiles for chunk {chunk_number}...")
-                
-                try:
-                    # Prepare batch data
-                    batch_data = []
-                    valid_rows = []
-                    
-                    # First pass: extract and validate profile data
-                    for index, row in chunk_df.iterrows():
-                        try:
-                            # Use 'urn' as the primary unique identifier, fallback to publicIdentifier, then linkedin_url
-                            profile_id = str(row.get('urn', '')).strip()
-                            if not profile_id:
-                                profile_id = str(row.get('publicIdentifier', '')).strip()
-                            if not profile_id:
-                                profile_id = str(row.get('linkedin_url', '')).strip()
-                            
-                            # Fallback to a row-based ID if still no identifier
-                            if not profile_id:
-                                profile_id = f"profile_{total_rows + index}"
-
-                            # Skip if essential data is missing
-                            if not str(row.get('fullName', '')).strip():
-                                continue
-                            
-                            # Canonicalize the entire row's text for vectorization
-                            canonical_text = self.canonicalize_profile_text(row)
-                            
-                            # Skip if canonical text is too short
-                            if len(canonical_text.strip()) < 20: # Increased threshold for meaningful content
-                                continue
-                            
-                            # Check for cached embedding first
-                            cached_embedding = await self.get_cached_embedding(profile_id)
-                            if cached_embedding:
-                                # Use cached embedding
-                                metadata = self.extract_metadata(row)
-                                metadata["canonical_text"] = canonical_text # Add canonical text to metadata
-                                chunk_vectors.append((profile_id, cached_embedding, metadata))
-                                chunk_processed_count += 1
-                            else:
-                                # Add to batch for embedding generation
-                                batch_data.append({
-                                    'profile_id': profile_id,
-                                    'canonical_text': canonical_text,
-                                    'row': row,
-                                })
-                                valid_rows.append(row)
-                            
-                        except Exception as e:
-                            chunk_error_count += 1
-                            print(f"Error preparing row {total_rows + index} in chunk {chunk_number}: {e}")
-                            continue
-                    
-                    # Generate embeddings for the batch (if any)
-                    if batch_data:
-                        try:
-                            # Extract texts for batch embedding generation
-                            texts_to_embed = [item['canonical_text'] for item in batch_data]
-                            
-                            # Generate embeddings in a single API call
-                            embeddings = await self.generate_embeddings_batch(texts_to_embed)
-                            
-                            # Process the results and cache embeddings
-                            for i, embedding in enumerate(embeddings):
-                                item = batch_data[i]
-                                profile_id = item['profile_id']
-                                
-                                # Cache the new embedding
-                                await self.cache_embedding(profile_id, embedding)
-                                
-                                # Extract metadata from the new columns
-                                metadata = self.extract_metadata(item['row'])
-                                metadata["canonical_text"] = item['canonical_text'] # Add canonical text to metadata
-                                
-                                # Add to chunk vectors list for upserting
-                                chunk_vectors.append((profile_id, embedding, metadata))
-                                chunk_processed_count += 1
-                                
-                        except Exception as e:
-                            chunk_error_count += len(batch_data)
-                            print(f"Error generating batch embeddings for chunk {chunk_number}: {e}")
-                    
-                    # Batch upsert chunk to Pinecone
-                    if chunk_vectors:
-                        print(f"Upserting {len(chunk_vectors)} vectors from chunk {chunk_number} to Pinecone...")
-                        self.batch_upsert_to_pinecone(chunk_vectors, namespace=user_id)
-                        total_vectors_upserted += len(chunk_vectors)
-                        print(f"Successfully upserted chunk {chunk_number} with {len(chunk_vectors)} vectors")
-                    
-                    # Update totals
-                    total_processed_count += chunk_processed_count
-                    total_error_count += chunk_error_count
-                    total_rows += len(chunk_df)
-                    
-                    print(f"Completed chunk {chunk_number}: {chunk_processed_count} processed, {chunk_error_count} errors")
-                    
-                except Exception as e:
-                    print(f"Error processing batch for chunk {chunk_number}: {e}")
-                    # Continue with next chunk instead of failing entirely
-                    total_error_count += len(chunk_df)
-                    total_rows += len(chunk_df)
-                    continue
+            pipeline_options = {}
+            if run._use_process_pool(csv_path):
+                # Large upload: canonicalize on other cores, away from request handling
+                pipeline_options["process_pool"] = get_process_pool()
+                pipeline_options["process_window"] = 2 * process_pool.max_workers
+                print(f"Preparing chunks on {process_pool.max_workers} worker processes")
+            
+            pipeline = IngestionPipeline(
+                run,
+                namespace=namespace,
+                indexed_profiles=indexed_profiles,
+                # Sparse values use the BM25 fit of the upload being replaced
+                avg_doc_length=await run._get_avg_doc_length(live_namespace),
+                on_chunk_done=on_chunk_done,
+                resume_after_chunk=resume_after_chunk,
+                on_chunk_read=on_chunk_read,
+                **pipeline_options
+            )
+            # Cells are read as their CSV text, so connections get them verbatim
+            # ("NA" stays "NA", "02134" keeps its zero) and empty cells are ""
+            chunks = pd.read_csv(csv_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+            result = await pipeline.run(chunks)
+            if swap and result["failed_chunks"]:
+                raise RuntimeError(f"{result['failed_chunks']} chunks failed; the previous upload stays live")
+            
+            total_vectors_deleted = 0
+            vectors_copied = 0
+            if live_profiles is not None:
+                built_profiles = await run._get_ingest_manifest(namespace)
+                dropped = [pid for pid in live_profiles if pid not in result["seen_profile_ids"]]
+                if not built_profiles and not dropped:
+                    # Nothing differs from the live upload: keep it, and discard the new namespace
+                    await namespace_alias_service.queue_garbage(get_database(), user_id, namespace, run.index_name)
+                    print(f"Upload matches namespace {live_namespace}; keeping it live")
+                    namespace, swap, allocated = live_namespace, False, False
+                else:
+                    unchanged = {
+                        pid: content_hash for pid, content_hash in live_profiles.items()
+                        if pid in result["seen_profile_ids"] and pid not in built_profiles
+                    }
+                    if unchanged:
+                        print(f"Copying {len(unchanged)} unchanged profiles from namespace {live_namespace}...")
+                        vectors_copied = await run.copy_profiles(unchanged, live_namespace, namespace)
+                # Profiles left out of the new version disappear from search when it goes live
+                total_vectors_deleted = len(dropped)
+                # Only what was built into this namespace can need deleting from it
+                indexed_profiles = built_profiles
+            
+            # Delete vectors for profiles that are no longer in the upload. If a whole
+            # chunk failed we can't tell which profiles it held, so keep everything.
+            if indexed_profiles is not None and result["failed_chunks"]:
+                print(f"Skipping deletion of removed profiles: {result['failed_chunks']} chunks failed")
+            elif indexed_profiles is not None:
+                removed_profile_ids = [pid for pid in indexed_profiles if pid not in result["seen_profile_ids"]]
+                if removed_profile_ids:
+                    print(f"Deleting {len(removed_profile_ids)} vectors for profiles no longer present...")
+                    await asyncio.to_thread(run.delete_vectors_from_pinecone, removed_profile_ids, namespace)
+                    await ingest_manifest_service.remove_profiles(get_database(), namespace, removed_profile_ids)
+                    await profile_store_service.remove_profiles(get_database(), namespace, removed_profile_ids)
+                    if live_profiles is None:
+                        total_vectors_deleted = len(removed_profile_ids)
+            
+            # Refit the namespace's BM25 statistics, from every profile in the upload
+            if result["vocabulary"] is not None:
+                if result["failed_chunks"]:
+                    print("Keeping the previous sparse vocabulary: not every chunk was parsed in this run")
+                else:
+                    await sparse_vocabulary_service.save_vocabulary(get_database(), namespace, result["vocabulary"])
+            
+            # Switch searches to the new upload in one step
+            if swap:
+                if await namespace_alias_service.activate_namespace(get_database(), user_id, namespace, run.index_name):
+                    print(f"Switched searches from namespace {live_namespace} to {namespace}")
+                else:
+                    print(f"Namespace {namespace} was superseded by a newer upload; discarding it")
             
-            print(f"Completed processing all chunks. Total: {total_processed_count} processed, {total_error_count} errors, {total_vectors_upserted} vectors upserted")
+            print(f"Completed processing all chunks. Total: {result['processed_count']} processed, {result['unchanged_count']} unchanged, {result['error_count']} errors, {result['vectors_upserted']} vectors upserted, {vectors_copied} vectors copied, {total_vectors_deleted} vectors deleted")
             
             return {
-                "total_rows": total_rows,
-                "processed_count": total_processed_count,
-                "error_count": total_error_count,
-                "vectors_upserted": total_vectors_upserted,
-                "chunks_processed": chunk_number,
-                "namespace": user_id
+                "total_rows": result["total_rows"],
+                "processed_count": result["processed_count"],
+                "unchanged_count": result["unchanged_count"],
+                "error_count": result["error_count"],
+                "vectors_upserted": result["vectors_upserted"],
+                "vectors_copied": vectors_copied,
+                "vectors_deleted": total_vectors_deleted,
+                "chunks_processed": result["chunks_processed"],
+                "chunks_skipped": result["chunks_skipped"],
+                "failed_chunks": result["failed_chunks"],
+                "namespace": namespace,
+                "mode": mode,
+                "stage_stats": result["stage_stats"]
             }
             
         except Exception as e:
             print(f"Error in process_profiles_and_upsert: {e}")
+            if allocated:
+                # Nothing will resume this build; a job keeps its namespace for its retries
+                await namespace_alias_service.queue_garbage(get_database(), user_id, namespace, run.index_name)
             raise
 
 # Global instance
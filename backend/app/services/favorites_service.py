@@ -1,9 +1,20 @@
 from uuid import UUID
 from typing import List, Optional
 from app.models.favorite_connection import FavoriteConnectionInDB, FavoriteConnectionCreate
+from app.services import connections_service
+
+_indexes_ready = False
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        # connection_id is the stable profile ID, shared with connections and search results
+        await db.favorite_connections.create_index([("user_id", 1), ("connection_id", 1)])
+        _indexes_ready = True
 
 async def add_favorite_connection(db, user_id: UUID, connection_id: UUID) -> dict:
     """Add a connection to user's favorites"""
+    await _ensure_indexes(db)
     # Check if already favorited
     existing = await db.favorite_connections.find_one({
         "user_id": str(user_id),
@@ -53,7 +64,7 @@ async def get_user_favorite_connections(db, user_id: UUID) -> List[dict]:
     # Get actual connection details
     connections_cursor = db.connections.find({
         "id": {"$in": connection_ids},
-        "user_id": str(user_id)
+        **await connections_service.live_connections_query(db, user_id)
     })
     connections = await connections_cursor.to_list(length=None)
     
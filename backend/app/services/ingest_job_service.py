@@ -0,0 +1,414 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.db import get_database
+from app.models.ingest_job import IngestCheckpoint, IngestJobPublic, IngestProgress
+from app.services import connections_service, namespace_alias_service
+from app.services.embeddings_service import embeddings_service
+
+logger = logging.getLogger(__name__)
+
+# Ingestion jobs live in the ingest_jobs collection. A job is claimed by one
+# runner at a time (a Celery worker, or the API process with
+# INGEST_JOB_RUNNER=local), which keeps a heartbeat and a per-chunk checkpoint
+# on it. If the runner dies, the job goes stale and is resumed after the
+# checkpoint by the next runner to start.
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+RETRY_BACKOFF_SECONDS = 10
+# Uploads are copied to the job's file in blocks of this size, never read whole
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+
+_indexes_ready = False
+# Jobs run by this process in local mode; referenced so they aren't garbage collected
+_local_tasks = set()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # MongoDB hands datetimes back naive (but in UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.ingest_jobs.create_index([("user_id", 1), ("created_at", -1)])
+        await db.ingest_jobs.create_index([("status", 1), ("heartbeat_at", 1)])
+        _indexes_ready = True
+
+
+def new_job_id() -> str:
+    return str(uuid.uuid4())
+
+
+def upload_path(job_id: str) -> str:
+    """Where a job's CSV waits until the job finishes."""
+    os.makedirs(settings.INGEST_UPLOAD_DIR, exist_ok=True)
+    return os.path.join(settings.INGEST_UPLOAD_DIR, f"{job_id}.csv")
+
+
+async def spool_upload(file, path: str) -> int:
+    """
+    Copy an uploaded file to disk block by block.
+
+    Returns:
+        Estimated row count (lines minus the header); quoted fields spanning
+        lines make it an overestimate until the job has parsed the file
+    """
+    lines = 0
+    last_block = b""
+    with open(path, "wb") as out:
+        while True:
+            block = await file.read(UPLOAD_BLOCK_BYTES)
+            if not block:
+                break
+            out.write(block)
+            lines += block.count(b"\n")
+            last_block = block
+    if last_block and not last_block.endswith(b"\n"):
+        lines += 1
+    return max(0, lines - 1)
+
+
+async def create_job(
+    db,
+    job_id: str,
+    user_id: str,
+    csv_path: str,
+    filename: Optional[str] = None,
+    total_rows: Optional[int] = None
+) -> Dict[str, Any]:
+    """Record a queued ingestion job and hand it to a runner."""
+    await _ensure_indexes(db)
+    now = _now()
+    job = {
+        "_id": job_id,
+        "user_id": user_id,
+        "status": QUEUED,
+        "csv_path": csv_path,
+        "filename": filename,
+        "total_rows": total_rows,
+        "progress": IngestProgress().model_dump(),
+        "checkpoint": IngestCheckpoint().model_dump(),
+        "attempts": 0,
+        "error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db.ingest_jobs.insert_one(job)
+    await enqueue_job(job_id)
+    return job
+
+
+async def get_job(db, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    query = {"_id": job_id}
+    if user_id is not None:
+        query["user_id"] = user_id
+    return await db.ingest_jobs.find_one(query)
+
+
+def to_public(job: Dict[str, Any]) -> IngestJobPublic:
+    """Public view of a job, with throughput and ETA for the current attempt."""
+    progress = job.get("progress") or {}
+    rows_per_second = None
+    eta_seconds = None
+    attempt_started_at = _as_utc(job.get("attempt_started_at"))
+    if job["status"] == RUNNING and attempt_started_at is not None:
+        elapsed = (_now() - attempt_started_at).total_seconds()
+        rows = progress.get("rows_processed", 0) - job.get("attempt_start_rows", 0)
+        if elapsed > 0 and rows > 0:
+            rows_per_second = round(rows / elapsed, 1)
+            if job.get("total_rows"):
+                eta_seconds = round(max(0, job["total_rows"] - progress.get("rows_processed", 0)) / rows_per_second, 1)
+
+    return IngestJobPublic(
+        job_id=job["_id"],
+        status=job["status"],
+        filename=job.get("filename"),
+        total_rows=job.get("total_rows"),
+        progress=IngestProgress(**progress),
+        checkpoint=IngestCheckpoint(**(job.get("checkpoint") or {})),
+        attempts=job.get("attempts", 0),
+        rows_per_second=rows_per_second,
+        eta_seconds=eta_seconds,
+        error=job.get("error"),
+        result=job.get("result"),
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        updated_at=job.get("updated_at"),
+        finished_at=job.get("finished_at"),
+    )
+
+
+async def enqueue_job(job_id: str, countdown: float = 0) -> None:
+    """Hand a job to the configured runner."""
+    if settings.INGEST_JOB_RUNNER == "local":
+        task = asyncio.create_task(_run_local(job_id, countdown))
+        _local_tasks.add(task)
+        task.add_done_callback(_local_tasks.discard)
+        return
+
+    from app.worker import run_ingest_job
+    # Publishing talks to the broker synchronously
+    await asyncio.to_thread(run_ingest_job.apply_async, args=[job_id], countdown=countdown)
+
+
+async def _run_local(job_id: str, countdown: float) -> None:
+    if countdown:
+        await asyncio.sleep(countdown)
+    try:
+        await run_job(job_id)
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} crashed: {e}")
+
+
+async def claim_job(db, job_id: str, worker: str) -> Optional[Dict[str, Any]]:
+    """
+    Mark a job as running on this worker, unless it is finished or another
+    worker is alive and running it.
+    """
+    now = _now()
+    stale_before = now - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    job = await db.ingest_jobs.find_one({"_id": job_id})
+    if job is None:
+        return None
+    return await db.ingest_jobs.find_one_and_update(
+        {
+            "_id": job_id,
+            "attempts": {"$lt": settings.INGEST_JOB_MAX_ATTEMPTS},
+            "$or": [
+                {"status": QUEUED},
+                {"status": RUNNING, "heartbeat_at": {"$lt": stale_before}},
+            ],
+        },
+        {
+            "$set": {
+                "status": RUNNING,
+                "error": None,
+                "worker": worker,
+                "heartbeat_at": now,
+                "updated_at": now,
+                "started_at": job.get("started_at") or now,
+                "attempt_started_at": now,
+                "attempt_start_rows": (job.get("checkpoint") or {}).get("rows_processed", 0),
+                # Chunks past the checkpoint are redone, so progress restarts from it
+                "progress": IngestProgress(**{
+                    key: value for key, value in (job.get("checkpoint") or {}).items() if key != "chunk"
+                }).model_dump(),
+            },
+            "$inc": {"attempts": 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+class JobProgress:
+    """
+    Folds per-chunk results into a job's progress and checkpoint.
+
+    Chunks finish out of order; the checkpoint only advances over an unbroken
+    run of chunks that finished without failing, so everything up to it is
+    indexed and a resumed run can skip it.
+    """
+
+    def __init__(self, db, job: Dict[str, Any]):
+        self.db = db
+        self.job_id = job["_id"]
+        self.checkpoint = IngestCheckpoint(**(job.get("checkpoint") or {}))
+        self.progress = IngestProgress(**self.checkpoint.model_dump(exclude={"chunk"}))
+        self.done: Dict[int, Dict[str, int]] = {}
+
+    async def __call__(self, chunk_number: int, counts: Dict[str, int]) -> None:
+        self.done[chunk_number] = counts
+        while self.checkpoint.chunk + 1 in self.done and not self.done[self.checkpoint.chunk + 1]["failed"]:
+            self.checkpoint.chunk += 1
+            self._add(self.checkpoint, self.done.pop(self.checkpoint.chunk))
+
+        self.progress = IngestProgress(**self.checkpoint.model_dump(exclude={"chunk"}))
+        for chunk_counts in self.done.values():
+            self._add(self.progress, chunk_counts)
+
+        now = _now()
+        await self.db.ingest_jobs.update_one(
+            {"_id": self.job_id},
+            {"$set": {
+                "progress": self.progress.model_dump(),
+                "checkpoint": self.checkpoint.model_dump(),
+                "heartbeat_at": now,
+                "updated_at": now,
+            }},
+        )
+
+    @staticmethod
+    def _add(progress: IngestProgress, counts: Dict[str, int]) -> None:
+        progress.chunks_done += 1
+        progress.rows_processed += counts["rows"]
+        progress.vectors_upserted += counts["vectors_upserted"]
+        progress.unchanged_count += counts["unchanged"]
+        progress.error_count += counts["errors"]
+
+
+async def _heartbeat(db, job_id: str) -> None:
+    while True:
+        await asyncio.sleep(settings.INGEST_JOB_HEARTBEAT_SECONDS)
+        await db.ingest_jobs.update_one({"_id": job_id, "status": RUNNING}, {"$set": {"heartbeat_at": _now()}})
+
+
+def _remove_upload(csv_path: str) -> None:
+    if csv_path and os.path.exists(csv_path):
+        os.remove(csv_path)
+        print(f"Cleaned up uploaded file: {csv_path}")
+
+
+async def run_job(job_id: str, worker: Optional[str] = None) -> Optional[str]:
+    """
+    Run (or resume) an ingestion job to the end.
+
+    Returns:
+        The job's status afterwards, or None if it could not be claimed
+        (finished already, or alive on another worker)
+    """
+    db = get_database()
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    job = await claim_job(db, job_id, worker)
+    if job is None:
+        return None
+    user_id = UUID(job["user_id"])
+
+    checkpoint = job["checkpoint"]["chunk"]
+    print(f"Running ingestion job {job_id} for user {job['user_id']} (attempt {job['attempts']}"
+          + (f", resuming after chunk {checkpoint})" if checkpoint else ")"))
+    # Every attempt builds into the same versioned namespace, so a resumed run
+    # only indexes the chunks after the checkpoint
+    namespace = job.get("namespace")
+    if namespace is None and settings.INGEST_NAMESPACE_SWAP and not checkpoint:
+        namespace = await namespace_alias_service.allocate_namespace(db, job["user_id"])
+        await db.ingest_jobs.update_one({"_id": job_id}, {"$set": {"namespace": namespace}})
+    progress = JobProgress(db, job)
+    heartbeat = asyncio.create_task(_heartbeat(db, job_id))
+    try:
+        # The upload replaces the user's connections. Every chunk, including ones a
+        # resumed run skips embedding, is parsed once and stored as it is read, under
+        # the job's ID; the user keeps seeing their previous connections meanwhile.
+        result = await embeddings_service.process_profiles_and_upsert(
+            csv_path=job["csv_path"],
+            user_id=job["user_id"],
+            on_chunk_done=progress,
+            resume_after_chunk=checkpoint,
+            on_chunk_read=lambda chunk_df: connections_service.store_connections_chunk(db, chunk_df, user_id, job_id),
+            namespace=namespace
+        )
+        # Switch connections once the upload is live in search; an upload superseded
+        # by a newer one never goes live
+        if result["namespace"] == await namespace_alias_service.get_namespace(db, job["user_id"]):
+            await connections_service.activate_connections(db, user_id, job_id)
+        else:
+            await connections_service.discard_connections(db, user_id, job_id)
+    except Exception as e:
+        retry = job["attempts"] < settings.INGEST_JOB_MAX_ATTEMPTS
+        status = QUEUED if retry else FAILED
+        now = _now()
+        await db.ingest_jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": status, "error": str(e), "updated_at": now, **({} if retry else {"finished_at": now})}},
+        )
+        print(f"Ingestion job {job_id} failed on attempt {job['attempts']}: {e}")
+        if retry:
+            await enqueue_job(job_id, countdown=RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1))
+        else:
+            _remove_upload(job["csv_path"])
+            await connections_service.discard_connections(db, user_id, job_id)
+            if namespace is not None:
+                await namespace_alias_service.queue_garbage(db, job["user_id"], namespace, embeddings_service.index_name)
+        return status
+    finally:
+        heartbeat.cancel()
+
+    # Counts for the whole job, including chunks indexed by earlier attempts
+    totals = progress.progress
+    result.update(
+        processed_count=totals.vectors_upserted,
+        vectors_upserted=totals.vectors_upserted,
+        unchanged_count=totals.unchanged_count,
+        error_count=totals.error_count,
+    )
+    now = _now()
+    await db.ingest_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {
+            "status": COMPLETED,
+            "total_rows": result["total_rows"],
+            "result": result,
+            "error": None,
+            "updated_at": now,
+            "finished_at": now,
+        }},
+    )
+    _remove_upload(job["csv_path"])
+    print(f"Ingestion job {job_id} completed: {result['vectors_upserted']} vectors upserted")
+    return COMPLETED
+
+
+async def resume_abandoned_jobs(db) -> int:
+    """
+    Re-enqueue jobs whose runner went away: running jobs with a stale heartbeat,
+    and queued jobs that have waited longer than that. Jobs out of attempts fail.
+
+    Returns:
+        Number of jobs re-enqueued
+    """
+    await _ensure_indexes(db)
+    stale_before = _now() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+    cursor = db.ingest_jobs.find({
+        "$or": [
+            {"status": RUNNING, "heartbeat_at": {"$lt": stale_before}},
+            {"status": QUEUED, "updated_at": {"$lt": stale_before}},
+        ]
+    }, {"_id": 1, "user_id": 1, "attempts": 1, "csv_path": 1, "namespace": 1})
+
+    resumed = 0
+    async for job in cursor:
+        if job.get("attempts", 0) >= settings.INGEST_JOB_MAX_ATTEMPTS:
+            now = _now()
+            await db.ingest_jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {"status": FAILED, "error": "Worker lost too many times", "updated_at": now, "finished_at": now}},
+            )
+            _remove_upload(job.get("csv_path"))
+            await connections_service.discard_connections(db, UUID(job["user_id"]), job["_id"])
+            if job.get("namespace"):
+                await namespace_alias_service.queue_garbage(db, job["user_id"], job["namespace"], embeddings_service.index_name)
+            continue
+        await enqueue_job(job["_id"])
+        resumed += 1
+    if resumed:
+        print(f"Re-enqueued {resumed} abandoned ingestion jobs")
+    return resumed
+
+
+async def watch_abandoned_jobs() -> None:
+    """Periodically resume abandoned jobs; runs for the lifetime of the API process."""
+    while True:
+        try:
+            await resume_abandoned_jobs(get_database())
+        except Exception as e:
+            logger.error(f"Could not resume abandoned ingestion jobs: {e}")
+        await asyncio.sleep(settings.INGEST_JOB_STALE_SECONDS)
@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from pymongo import UpdateOne
+
+# The manifest records, per Pinecone namespace, which profile IDs are indexed
+# and the content hash they were indexed with, so re-uploads can be diffed.
+_indexes_ready = False
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.ingest_manifest.create_index([("namespace", 1), ("profile_id", 1)], unique=True)
+        _indexes_ready = True
+
+async def get_manifest(db, namespace: str) -> Dict[str, str]:
+    """Return {profile_id: content_hash} for everything indexed in a namespace"""
+    await _ensure_indexes(db)
+    cursor = db.ingest_manifest.find({"namespace": namespace}, {"_id": 0, "profile_id": 1, "content_hash": 1})
+    return {doc["profile_id"]: doc["content_hash"] async for doc in cursor}
+
+async def record_profiles(db, namespace: str, entries: List[Tuple[str, str]]) -> None:
+    """Record (profile_id, content_hash) pairs that were upserted to a namespace"""
+    if not entries:
+        return
+    await _ensure_indexes(db)
+    now = datetime.now(timezone.utc)
+    await db.ingest_manifest.bulk_write([
+        UpdateOne(
+            {"namespace": namespace, "profile_id": profile_id},
+            {"$set": {"content_hash": content_hash, "updated_at": now}},
+            upsert=True
+        )
+        for profile_id, content_hash in entries
+    ], ordered=False)
+
+async def remove_profiles(db, namespace: str, profile_ids: List[str]) -> int:
+    """Forget profiles whose vectors were deleted from a namespace"""
+    if not profile_ids:
+        return 0
+    result = await db.ingest_manifest.delete_many({"namespace": namespace, "profile_id": {"$in": profile_ids}})
+    return result.deleted_count
+
+async def clear_manifest(db, namespace: str) -> int:
+    """Forget everything recorded for a namespace (e.g. after clearing it)"""
+    result = await db.ingest_manifest.delete_many({"namespace": namespace})
+    return result.deleted_count
@@ -0,0 +1,355 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+import pandas as pd
+from app.core.config import settings
+from app.core.db import get_database
+from app.services import ingest_manifest_service, profile_canonicalizer, sparse_encoder
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 0
+        self.profiles = 0
+        self.busy_seconds = 0.0
+
+    def record(self, profiles: int, seconds: float) -> None:
+        self.chunks += 1
+        self.profiles += profiles
+        self.busy_seconds += seconds
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "profiles": self.profiles,
+            "busy_seconds": round(self.busy_seconds, 3),
+            # Throughput while the stage was working vs. over the whole run;
+            # the stage whose busy time is closest to the wall time is the bottleneck
+            "profiles_per_sec": round(self.profiles / self.busy_seconds, 1) if self.busy_seconds else 0.0,
+            "wall_profiles_per_sec": round(self.profiles / wall_seconds, 1) if wall_seconds else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """
+    Staged producer/consumer pipeline for profile ingestion.
+
+    parse -> embed -> upsert, connected by bounded asyncio queues. The parse stage
+    reads and prepares CSV chunks off the event loop; several embed and upsert
+    workers then run concurrently, so embedding chunk N+1 overlaps with upserting
+    chunk N. Full queues block the upstream stage, which bounds memory.
+
+    With a process pool the parse stage ships each chunk to a worker process as a
+    column block instead, keeping up to `process_window` chunks in flight, and
+    hands the results to the embedders in CSV order.
+
+    `on_chunk_read(chunk_df)` is awaited for every chunk as it is read, so other
+    consumers of the upload (the connections collection) share the one parse.
+    `on_chunk_done(chunk_number, counts)` is awaited once per chunk when it has
+    left the pipeline, successfully or not; chunks finish out of order. The first
+    `resume_after_chunk` chunks are only read for their profile IDs (they were
+    indexed by an earlier, interrupted run) so removed-profile deletion still
+    sees them.
+    """
+
+    def __init__(
+        self,
+        embeddings_service,
+        namespace: str,
+        indexed_profiles: Optional[Dict[str, str]] = None,
+        avg_doc_length: Optional[float] = None,
+        embed_concurrency: Optional[int] = None,
+        upsert_concurrency: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        process_pool: Optional[Executor] = None,
+        process_window: int = 2,
+        on_chunk_done: Optional[Callable[[int, Dict[str, int]], Awaitable[None]]] = None,
+        resume_after_chunk: int = 0,
+        on_chunk_read: Optional[Callable[[pd.DataFrame], Awaitable[None]]] = None
+    ):
+        self.service = embeddings_service
+        self.namespace = namespace
+        self.indexed_profiles = indexed_profiles
+        self.avg_doc_length = avg_doc_length
+        self.embed_concurrency = max(1, embed_concurrency or settings.INGEST_EMBED_CONCURRENCY)
+        self.upsert_concurrency = max(1, upsert_concurrency or settings.INGEST_UPSERT_CONCURRENCY)
+        queue_size = max(1, queue_size or settings.INGEST_QUEUE_SIZE)
+        self.embed_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.process_pool = process_pool
+        self.process_window = max(1, process_window)
+        self.on_chunk_done = on_chunk_done
+        self.on_chunk_read = on_chunk_read
+        self.resume_after_chunk = resume_after_chunk
+
+        self.stats = {name: StageStats(name) for name in ("parse", "embed", "upsert")}
+        self.seen_profile_ids = set()
+        # Term statistics of every parsed profile, when building sparse vectors
+        self.vocabulary = sparse_encoder.VocabularyStats() if avg_doc_length is not None else None
+        self.total_rows = 0
+        self.chunks_processed = 0
+        self.failed_chunks = 0
+        self.processed_count = 0
+        self.unchanged_count = 0
+        self.error_count = 0
+        self.vectors_upserted = 0
+        self.chunks_skipped = 0
+        # Per-chunk counts until the chunk leaves the pipeline
+        self.chunk_counts: Dict[int, Dict[str, int]] = {}
+
+    async def run(self, chunks: Iterator[pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Run every chunk through the pipeline.
+
+        Args:
+            chunks: Iterator of DataFrame chunks, e.g. pd.read_csv(..., chunksize=n)
+
+        Returns:
+            Totals for the run plus per-stage throughput in 'stage_stats'
+        """
+        start = time.perf_counter()
+        embed_workers = [asyncio.create_task(self._embed_worker()) for _ in range(self.embed_concurrency)]
+        upsert_workers = [asyncio.create_task(self._upsert_worker()) for _ in range(self.upsert_concurrency)]
+
+        try:
+            await self._skip_resumed_chunks(chunks)
+            await self._produce(chunks)
+            # Drain stage by stage: one sentinel per worker
+            for _ in embed_workers:
+                await self.embed_queue.put(None)
+            await asyncio.gather(*embed_workers)
+            for _ in upsert_workers:
+                await self.upsert_queue.put(None)
+            await asyncio.gather(*upsert_workers)
+        except BaseException:
+            for task in embed_workers + upsert_workers:
+                task.cancel()
+            await asyncio.gather(*embed_workers, *upsert_workers, return_exceptions=True)
+            raise
+
+        wall_seconds = time.perf_counter() - start
+        stage_stats = {name: stats.to_dict(wall_seconds) for name, stats in self.stats.items()}
+        print(f"Ingestion pipeline finished in {wall_seconds:.2f}s: " + ", ".join(
+            f"{name} {stats['profiles_per_sec']} profiles/s" for name, stats in stage_stats.items()
+        ))
+
+        return {
+            "total_rows": self.total_rows,
+            "processed_count": self.processed_count,
+            "unchanged_count": self.unchanged_count,
+            "error_count": self.error_count,
+            "vectors_upserted": self.vectors_upserted,
+            "chunks_processed": self.chunks_processed,
+            "chunks_skipped": self.chunks_skipped,
+            "failed_chunks": self.failed_chunks,
+            "seen_profile_ids": self.seen_profile_ids,
+            "vocabulary": self.vocabulary,
+            "wall_seconds": round(wall_seconds, 3),
+            "stage_stats": stage_stats,
+        }
+
+    async def _skip_resumed_chunks(self, chunks: Iterator[pd.DataFrame]) -> None:
+        """
+        Read past chunks an earlier run already indexed, keeping only their profile
+        IDs and, when building sparse vectors, their term statistics.
+        """
+        while self.chunks_skipped < self.resume_after_chunk:
+            chunk_df = await self._read_chunk(chunks)
+            if chunk_df is None:
+                return
+            self.chunks_skipped += 1
+            self.chunks_processed += 1
+            self.total_rows += len(chunk_df)
+            if self.vocabulary is None:
+                self.seen_profile_ids.update(await asyncio.to_thread(profile_canonicalizer.resolve_profile_ids, chunk_df))
+                continue
+            prepared = await asyncio.to_thread(
+                profile_canonicalizer.prepare_profiles,
+                chunk_df, None, self.service.embedding_key, self.service.metadata_mode, self.avg_doc_length
+            )
+            self.seen_profile_ids.update(prepared["seen_profile_ids"])
+            self.vocabulary.merge(prepared["vocabulary"])
+
+    async def _read_chunk(self, chunks: Iterator[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """Read the next chunk off the event loop and pass it to on_chunk_read."""
+        chunk_df = await asyncio.to_thread(next, chunks, None)
+        if chunk_df is not None and self.on_chunk_read is not None:
+            await self.on_chunk_read(chunk_df)
+        return chunk_df
+
+    def _track(self, chunk_number: int, **counts: int) -> Dict[str, int]:
+        chunk = self.chunk_counts.setdefault(
+            chunk_number, {"rows": 0, "unchanged": 0, "errors": 0, "vectors_upserted": 0, "failed": 0}
+        )
+        for key, value in counts.items():
+            chunk[key] += value
+        return chunk
+
+    async def _chunk_done(self, chunk_number: int, **counts: int) -> None:
+        """A chunk has left the pipeline: report its counts."""
+        chunk = self._track(chunk_number, **counts)
+        del self.chunk_counts[chunk_number]
+        if self.on_chunk_done is not None:
+            await self.on_chunk_done(chunk_number, chunk)
+
+    async def _produce(self, chunks: Iterator[pd.DataFrame]) -> None:
+        """Parse stage: read and prepare chunks in a worker thread, then hand them to the embedders."""
+        if self.process_pool is not None:
+            await self._produce_in_processes(chunks)
+            return
+
+        while True:
+            started = time.perf_counter()
+            chunk_df = await self._read_chunk(chunks)
+            if chunk_df is None:
+                return
+
+            self.chunks_processed += 1
+            chunk_number = self.chunks_processed
+            self.total_rows += len(chunk_df)
+            try:
+                prepared = await asyncio.to_thread(
+                    self.service.prepare_chunk, chunk_df, self.indexed_profiles, self.avg_doc_length
+                )
+            except Exception as e:
+                print(f"Error processing batch for chunk {chunk_number}: {e}")
+                self.failed_chunks += 1
+                self.error_count += len(chunk_df)
+                await self._chunk_done(chunk_number, rows=len(chunk_df), errors=len(chunk_df), failed=1)
+                continue
+
+            await self._hand_off(chunk_number, len(chunk_df), started, prepared)
+
+    async def _produce_in_processes(self, chunks: Iterator[pd.DataFrame]) -> None:
+        """Parse stage on the process pool: several chunks in flight, collected in order."""
+        loop = asyncio.get_running_loop()
+        in_flight = deque()
+        while True:
+            started = time.perf_counter()
+            chunk_df = await self._read_chunk(chunks)
+            if chunk_df is None:
+                break
+
+            self.chunks_processed += 1
+            rows = len(chunk_df)
+            block, indexed_subset = await asyncio.to_thread(self._column_block, chunk_df)
+            self.total_rows += rows
+            future = loop.run_in_executor(
+                self.process_pool,
+                profile_canonicalizer.prepare_column_block,
+                block,
+                indexed_subset,
+                self.service.embedding_key,
+                self.service.metadata_mode,
+                self.avg_doc_length
+            )
+            in_flight.append((self.chunks_processed, rows, started, future))
+
+            # Waiting on the oldest chunk keeps results in order and bounds what is in flight
+            if len(in_flight) >= self.process_window:
+                await self._collect(*in_flight.popleft())
+
+        while in_flight:
+            await self._collect(*in_flight.popleft())
+
+    def _column_block(self, chunk_df: pd.DataFrame) -> Tuple[Dict[str, Any], Optional[Dict[str, str]]]:
+        """Serialize a chunk for a worker process, with just the manifest entries it needs."""
+        indexed_subset = None
+        if self.indexed_profiles is not None:
+            indexed_subset = {
+                profile_id: self.indexed_profiles[profile_id]
+                for profile_id in profile_canonicalizer.resolve_profile_ids(chunk_df)
+                if profile_id in self.indexed_profiles
+            }
+        return profile_canonicalizer.to_column_block(chunk_df), indexed_subset
+
+    async def _collect(self, chunk_number: int, rows: int, started: float, future: asyncio.Future) -> None:
+        try:
+            prepared = await future
+        except Exception as e:
+            print(f"Error processing batch for chunk {chunk_number}: {e}")
+            self.failed_chunks += 1
+            self.error_count += rows
+            await self._chunk_done(chunk_number, rows=rows, errors=rows, failed=1)
+            return
+        await self._hand_off(chunk_number, rows, started, prepared)
+
+    async def _hand_off(self, chunk_number: int, rows: int, started: float, prepared: Dict[str, Any]) -> None:
+        self.seen_profile_ids.update(prepared["seen_profile_ids"])
+        if self.vocabulary is not None and prepared.get("vocabulary") is not None:
+            self.vocabulary.merge(prepared["vocabulary"])
+        self.unchanged_count += prepared["unchanged_count"]
+        self.error_count += prepared["error_count"]
+        self.stats["parse"].record(rows, time.perf_counter() - started)
+        self._track(
+            chunk_number,
+            rows=rows,
+            unchanged=prepared["unchanged_count"],
+            errors=prepared["error_count"]
+        )
+
+        if prepared["items"]:
+            # Blocks while the embedders are behind (backpressure)
+            await self.embed_queue.put((chunk_number, prepared["items"]))
+        else:
+            await self._chunk_done(chunk_number)
+
+    async def _embed_worker(self) -> None:
+        while True:
+            job = await self.embed_queue.get()
+            if job is None:
+                return
+            chunk_number, items = job
+            started = time.perf_counter()
+            try:
+                embedded, failed = await self.service.embed_prepared_items(items)
+            except Exception as e:
+                print(f"Error embedding chunk {chunk_number}: {e}")
+                self.failed_chunks += 1
+                self.error_count += len(items)
+                await self._chunk_done(chunk_number, errors=len(items), failed=1)
+                continue
+
+            self.error_count += failed
+            self.stats["embed"].record(len(items), time.perf_counter() - started)
+            if embedded:
+                self._track(chunk_number, errors=failed)
+                await self.upsert_queue.put((chunk_number, embedded))
+            else:
+                await self._chunk_done(chunk_number, errors=failed)
+
+    async def _upsert_worker(self) -> None:
+        while True:
+            job = await self.upsert_queue.get()
+            if job is None:
+                return
+            chunk_number, embedded = job
+            started = time.perf_counter()
+            try:
+                print(f"Upserting {len(embedded)} vectors from chunk {chunk_number} to Pinecone...")
+                await self.service.index_profiles(embedded, self.namespace)
+
+                # Only record what actually reached Pinecone, so failures are retried next time
+                if self.indexed_profiles is not None:
+                    await ingest_manifest_service.record_profiles(
+                        get_database(),
+                        self.namespace,
+                        [(item['profile_id'], item['content_hash']) for item in embedded]
+                    )
+            except Exception as e:
+                print(f"Error upserting chunk {chunk_number}: {e}")
+                self.failed_chunks += 1
+                self.error_count += len(embedded)
+                await self._chunk_done(chunk_number, errors=len(embedded), failed=1)
+                continue
+
+            self.processed_count += len(embedded)
+            self.vectors_upserted += len(embedded)
+            self.stats["upsert"].record(len(embedded), time.perf_counter() - started)
+            print(f"Successfully upserted chunk {chunk_number} with {len(embedded)} vectors")
+            await self._chunk_done(chunk_number, vectors_upserted=len(embedded))
@@ -0,0 +1,609 @@
+"""
+In-process exact vector index, a drop-in alternative to a Pinecone index.
+
+Each namespace is a directory holding a memory-mapped float32 (or float16)
+matrix of unit-length vectors and an append-only JSON-lines log of the ID,
+metadata and sparse values stored in each row. A query is a single
+matrix-vector product (exact cosine similarity, plus the dot product with the
+query's sparse vector for hybrid search), metadata filters use Pinecone's
+filter language, and upserts overwrite rows in place or append new ones.
+
+Other processes sharing the directory (an API process reading what an
+ingestion worker writes) pick up new log entries and a grown matrix before
+every operation. Each namespace must have a single writer at a time.
+
+With quantization, a compact copy of each vector is also kept: int8 codes with
+a per-vector scale (a quarter of float32) or one sign bit per dimension (1/32).
+Queries scan only the compact copy for a shortlist of rescore_factor * top_k
+candidates, then rescore the shortlist exactly from the full-precision matrix,
+whose pages are only read for those rows.
+
+LocalVectorStore implements the subset of the Pinecone Index API this app
+uses: upsert, query, delete, describe_index_stats, list and fetch.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set
+from urllib.parse import quote, unquote
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+# float16 matrices are multiplied in float32 blocks of this many rows
+DENSE_BLOCK_ROWS = 2048
+QUANTIZATIONS = ("none", "int8", "binary")
+# Shortlist size, as a multiple of top_k, rescored exactly after a quantized scan
+DEFAULT_RESCORE_FACTOR = 10
+# Rewrite a namespace's log once it holds this many times more entries than live vectors
+LOG_COMPACTION_FACTOR = 4
+
+
+@dataclass
+class ScoredVector:
+    id: str
+    score: float
+    metadata: Optional[Dict[str, Any]] = None
+    values: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "score": self.score, "metadata": self.metadata, "values": self.values}
+
+
+@dataclass
+class QueryResponse:
+    matches: List[ScoredVector]
+    namespace: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"matches": [match.to_dict() for match in self.matches], "namespace": self.namespace}
+
+
+@dataclass
+class FetchedVector:
+    id: str
+    values: List[float]
+    metadata: Optional[Dict[str, Any]] = None
+    sparse_values: Optional[Dict[str, list]] = None
+
+
+@dataclass
+class FetchResponse:
+    vectors: Dict[str, FetchedVector]
+    namespace: str
+
+
+@dataclass
+class NamespaceStats:
+    vector_count: int
+
+
+@dataclass
+class IndexStats:
+    namespaces: Dict[str, NamespaceStats]
+    dimension: Optional[int]
+    total_vector_count: int
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if operator == "$exists":
+        return (value is not None) == bool(operand)
+    if value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported filter operator: {operator}")
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per uint64 word (SWAR; numpy 1.x has no bitwise_count)."""
+    words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    words = (words + (words >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return (words * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _sign_bits(values: np.ndarray, words: int) -> np.ndarray:
+    """Pack the sign of each dimension into `words` uint64 words per row."""
+    bits = np.packbits(values > 0, axis=-1)
+    padded = np.zeros(bits.shape[:-1] + (words * 8,), dtype=np.uint8)
+    padded[..., :bits.shape[-1]] = bits
+    return padded.view(np.uint64)
+
+
+def matches_filter(metadata: Optional[Dict[str, Any]], metadata_filter: Dict[str, Any]) -> bool:
+    """Evaluate a Pinecone metadata filter ($eq, $in, $gt, $and, $or, ...) against one vector's metadata."""
+    metadata = metadata or {}
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                # Like Pinecone, list-valued metadata matches if any element does
+                if isinstance(value, list) and operator in ("$eq", "$in"):
+                    if not any(_compare(element, operator, operand) for element in value):
+                        return False
+                elif not _compare(value, operator, operand):
+                    return False
+    return True
+
+
+class _Namespace:
+    """One namespace: memory-mapped matrices, row bookkeeping and sparse postings."""
+
+    def __init__(self, path: str, dtype: np.dtype, quantization: str, rescore_factor: int):
+        self.path = path
+        self.dtype = dtype
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.lock = threading.RLock()
+        self.meta_path = os.path.join(path, "meta.json")
+        self.matrix_path = os.path.join(path, "vectors.bin")
+        self.codes_path = os.path.join(path, "codes.bin")
+        self.scales_path = os.path.join(path, "scales.bin")
+        self.log_path = os.path.join(path, "records.jsonl")
+        self._reset()
+
+    def _reset(self) -> None:
+        self.dimension: Optional[int] = None
+        self.matrix: Optional[np.memmap] = None
+        self.codes: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self.capacity = 0
+        self.row_count = 0  # rows ever allocated; rows below it are live or free
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.sparse: List[Optional[Dict[str, list]]] = []
+        self.rows: Dict[str, int] = {}
+        self.free_rows: Set[int] = set()
+        self.live = np.zeros(0, dtype=bool)
+        self.postings: Dict[int, Dict[int, float]] = {}
+        self.log_entries = 0
+        self.log_offset = 0
+        self.log_inode = None
+
+    # -- loading other processes' writes -------------------------------------------------
+
+    def refresh(self) -> None:
+        """Apply log entries written since the last refresh (by this or another process)."""
+        if self.dimension is None and os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dimension = meta["dimension"]
+            self.dtype = np.dtype(meta["dtype"])
+            # A namespace keeps the layout it was created with
+            self.quantization = meta.get("quantization", "none")
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return
+        if self.log_inode is not None and stat.st_ino != self.log_inode:
+            # The log was compacted by the writer: start over from the new file
+            dimension, dtype = self.dimension, self.dtype
+            self._reset()
+            self.dimension, self.dtype = dimension, dtype
+        self.log_inode = stat.st_ino
+        if stat.st_size == self.log_offset:
+            return
+
+        self._map_matrix()
+        loading = self.log_offset == 0
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # an entry still being written
+                self._apply(json.loads(line))
+                self.log_offset += len(line)
+                self.log_entries += 1
+        if loading:
+            # A compacted log has no entries for the gaps deletions left; reuse those rows
+            self.free_rows = {row for row in range(self.row_count) if row >= len(self.ids) or self.ids[row] is None}
+
+    def _map_matrix(self) -> None:
+        if self.dimension is None or not os.path.exists(self.matrix_path):
+            return
+        row_bytes = self.dimension * self.dtype.itemsize
+        capacity = os.path.getsize(self.matrix_path) // row_bytes
+        if capacity != self.capacity:
+            self.matrix = np.memmap(self.matrix_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dimension))
+            if self.quantization == "int8":
+                self.codes = np.memmap(self.codes_path, dtype=np.int8, mode="r+", shape=(capacity, self.dimension))
+                self.scales = np.memmap(self.scales_path, dtype=np.float32, mode="r+", shape=(capacity,))
+            elif self.quantization == "binary":
+                self.codes = np.memmap(self.codes_path, dtype=np.uint64, mode="r+", shape=(capacity, self._code_words()))
+            self.capacity = capacity
+            live = np.zeros(capacity, dtype=bool)
+            live[:len(self.live)] = self.live[:capacity]
+            self.live = live
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        op = entry["op"]
+        if op == "put":
+            row = entry["row"]
+            previous = self.rows.get(entry["id"])
+            if previous is not None and previous != row:
+                self._free(previous)
+            while len(self.ids) <= row:
+                self.ids.append(None)
+                self.metadata.append(None)
+                self.sparse.append(None)
+            self._unpost(row)
+            self.ids[row] = entry["id"]
+            self.metadata[row] = entry.get("metadata")
+            self.sparse[row] = entry.get("sparse")
+            self.rows[entry["id"]] = row
+            self.row_count = max(self.row_count, row + 1)
+            self.free_rows.discard(row)
+            self.live[row] = True
+            if self.sparse[row]:
+                for index, value in zip(self.sparse[row]["indices"], self.sparse[row]["values"]):
+                    self.postings.setdefault(index, {})[row] = value
+        elif op == "delete":
+            row = self.rows.get(entry["id"])
+            if row is not None:
+                self._free(row)
+        elif op == "clear":
+            for row in list(self.rows.values()):
+                self._free(row)
+
+    def _unpost(self, row: int) -> None:
+        if row < len(self.sparse) and self.sparse[row]:
+            for index in self.sparse[row]["indices"]:
+                posting = self.postings.get(index)
+                if posting is not None:
+                    posting.pop(row, None)
+                    if not posting:
+                        del self.postings[index]
+
+    def _free(self, row: int) -> None:
+        self._unpost(row)
+        self.rows.pop(self.ids[row], None)
+        self.ids[row] = None
+        self.metadata[row] = None
+        self.sparse[row] = None
+        self.live[row] = False
+        self.free_rows.add(row)
+
+    # -- writes --------------------------------------------------------------------------
+
+    def _code_words(self) -> int:
+        return (self.dimension + 63) // 64
+
+    def _ensure_capacity(self, rows_needed: int) -> None:
+        if rows_needed <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < rows_needed:
+            capacity *= 2
+        files = [(self.matrix_path, self.dimension * self.dtype.itemsize)]
+        if self.quantization == "int8":
+            files += [(self.codes_path, self.dimension), (self.scales_path, 4)]
+        elif self.quantization == "binary":
+            files += [(self.codes_path, self._code_words() * 8)]
+        # The matrix is grown last: its size is the capacity readers map
+        for path, row_bytes in reversed(files):
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._map_matrix()
+
+    def _write_rows(self, rows: List[int], values: np.ndarray) -> None:
+        self.matrix[rows] = values.astype(self.dtype)
+        self.matrix.flush()
+        if self.quantization == "int8":
+            scales = np.abs(values).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self.codes[rows] = np.round(values / scales[:, None]).astype(np.int8)
+            self.scales[rows] = scales
+            self.scales.flush()
+        elif self.quantization == "binary":
+            self.codes[rows] = _sign_bits(values, self._code_words())
+        if self.codes is not None:
+            self.codes.flush()
+
+    def _append_log(self, entries: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries).encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+        # Our own entries are already applied; just move past them
+        self.log_offset += len(data)
+        self.log_entries += len(entries)
+        self.log_inode = os.stat(self.log_path).st_ino
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        self.refresh()
+        if not vectors:
+            return 0
+        if self.dimension is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.dimension = len(vectors[0]["values"])
+            with open(self.meta_path, "w") as f:
+                json.dump({"dimension": self.dimension, "dtype": self.dtype.name, "quantization": self.quantization}, f)
+
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        if values.ndim != 2 or values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {values.shape[-1]} does not match the namespace dimension {self.dimension}")
+        norms = np.linalg.norm(values, axis=1, keepdims=True)
+        values /= np.where(norms == 0, 1, norms)
+
+        # Existing IDs keep their row; new ones reuse freed rows, then append
+        rows, new_rows, free_rows = [], 0, set(self.free_rows)
+        for vector in vectors:
+            row = self.rows.get(vector["id"])
+            if row is None:
+                if free_rows:
+                    row = free_rows.pop()
+                else:
+                    row = self.row_count + new_rows
+                    new_rows += 1
+            rows.append(row)
+        self._ensure_capacity(self.row_count + new_rows)
+
+        # Vectors first, so a reader never sees a log entry before its row
+        self._write_rows(rows, values)
+        entries = [
+            {"op": "put", "id": vector["id"], "row": row, "metadata": vector.get("metadata"), "sparse": vector.get("sparse_values")}
+            for vector, row in zip(vectors, rows)
+        ]
+        for entry in entries:
+            self._apply(entry)
+        self._append_log(entries)
+        self._compact_if_needed()
+        return len(vectors)
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False) -> None:
+        self.refresh()
+        if delete_all:
+            entries = [{"op": "clear"}]
+        else:
+            entries = [{"op": "delete", "id": vector_id} for vector_id in ids or [] if vector_id in self.rows]
+        if not entries or not os.path.exists(self.path):
+            return
+        for entry in entries:
+            self._apply(entry)
+        self._append_log(entries)
+        self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        """Rewrite the log with one entry per live vector once it is mostly superseded entries."""
+        if self.log_entries <= LOG_COMPACTION_FACTOR * len(self.rows) + INITIAL_CAPACITY:
+            return
+        entries = [
+            {"op": "put", "id": self.ids[row], "row": row, "metadata": self.metadata[row], "sparse": self.sparse[row]}
+            for row in sorted(self.rows.values())
+        ]
+        temporary_path = self.log_path + ".tmp"
+        data = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries).encode("utf-8")
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        # Readers notice the new inode and reload from the compacted log
+        os.replace(temporary_path, self.log_path)
+        self.log_offset = len(data)
+        self.log_entries = len(entries)
+        self.log_inode = os.stat(self.log_path).st_ino
+
+    # -- reads ---------------------------------------------------------------------------
+
+    def _dense_scores(self, query: np.ndarray) -> np.ndarray:
+        matrix = self.matrix[:self.row_count]
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        return self._blockwise_scores(matrix, query)
+
+    def _blockwise_scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # No BLAS for float16 or int8: multiply in float32 blocks
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), DENSE_BLOCK_ROWS):
+            block = matrix[start:start + DENSE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity estimated from the quantized codes."""
+        if self.quantization == "int8":
+            return self._blockwise_scores(self.codes[:self.row_count], query) * self.scales[:self.row_count]
+        # Hamming distance between sign bits estimates the angle between the vectors;
+        # scaled by the query's norm like a dot product (hybrid queries scale it by alpha)
+        distances = np.zeros(self.row_count, dtype=np.uint64)
+        query_bits = _sign_bits(query, self._code_words())
+        for word in range(self._code_words()):
+            distances += _popcount(self.codes[:self.row_count, word] ^ query_bits[word])
+        return np.cos(np.pi * distances.astype(np.float32) / self.dimension) * np.linalg.norm(query)
+
+    def _sparse_scores(self, sparse_vector: Optional[Dict[str, list]]) -> Optional[np.ndarray]:
+        if not sparse_vector:
+            return None
+        scores = np.zeros(self.row_count, dtype=np.float32)
+        for index, weight in zip(sparse_vector["indices"], sparse_vector["values"]):
+            for row, value in self.postings.get(index, {}).items():
+                scores[row] += weight * value
+        return scores
+
+    def _best_rows(self, scores: np.ndarray, count: int, metadata_filter: Optional[Dict[str, Any]]) -> List[int]:
+        """Rows of the `count` highest scores (among those passing the filter), best first."""
+        live_count = len(self.rows)
+        if metadata_filter:
+            # Walk rows best-first until enough pass the filter
+            rows = []
+            for row in np.argsort(-scores)[:live_count]:
+                if matches_filter(self.metadata[row], metadata_filter):
+                    rows.append(int(row))
+                    if len(rows) == count:
+                        break
+            return rows
+        count = min(count, live_count)
+        candidates = np.argpartition(-scores, count - 1)[:count]
+        return candidates[np.argsort(-scores[candidates])].tolist()
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        sparse_vector: Optional[Dict[str, list]] = None,
+        include_metadata: bool = False,
+        include_values: bool = False
+    ) -> List[ScoredVector]:
+        self.refresh()
+        if not self.rows or top_k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query dimension {query.shape[-1]} does not match the namespace dimension {self.dimension}")
+
+        sparse_scores = self._sparse_scores(sparse_vector)
+        quantized = self.quantization != "none"
+        scores = self._approximate_scores(query) if quantized else self._dense_scores(query)
+        if sparse_scores is not None:
+            scores += sparse_scores
+        scores[~self.live[:self.row_count]] = -np.inf
+        rows = self._best_rows(scores, top_k * self.rescore_factor if quantized else top_k, metadata_filter)
+
+        if quantized and rows:
+            # Exact rescoring of the shortlist from the full-precision matrix
+            rows = np.sort(rows)
+            exact = self.matrix[rows].astype(np.float32) @ query
+            if sparse_scores is not None:
+                exact += sparse_scores[rows]
+            order = np.argsort(-exact)[:top_k]
+            scores = dict(zip(rows[order].tolist(), exact[order].tolist()))
+            rows = list(scores)
+
+        return [
+            ScoredVector(
+                id=self.ids[row],
+                score=float(scores[row]),
+                metadata=self.metadata[row] if include_metadata else None,
+                values=self.matrix[row].astype(np.float32).tolist() if include_values else [],
+            )
+            for row in rows
+        ]
+
+
+class LocalVectorStore:
+    """In-process vector index with one memory-mapped matrix per namespace, optionally quantized."""
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: str = "float32",
+        quantization: str = "none",
+        rescore_factor: int = DEFAULT_RESCORE_FACTOR
+    ):
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be float32 or float16")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {', '.join(QUANTIZATIONS)}")
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _namespace(self, name: str) -> _Namespace:
+        with self._lock:
+            if name not in self._namespaces:
+                path = os.path.join(self.directory, quote(name, safe=""))
+                self._namespaces[name] = _Namespace(path, self.dtype, self.quantization, self.rescore_factor)
+            return self._namespaces[name]
+
+    def upsert(self, vectors: List[Any], namespace: str = "") -> Dict[str, int]:
+        """Insert or overwrite vectors given as dicts (id, values, metadata, sparse_values) or (id, values, metadata) tuples."""
+        vectors = [
+            vector if isinstance(vector, dict) else {"id": vector[0], "values": vector[1], "metadata": vector[2] if len(vector) > 2 else None}
+            for vector in vectors
+        ]
+        store = self._namespace(namespace)
+        with store.lock:
+            return {"upserted_count": store.upsert(vectors)}
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        namespace: str = "",
+        filter: Optional[Dict[str, Any]] = None,
+        sparse_vector: Optional[Dict[str, list]] = None,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        **kwargs
+    ) -> QueryResponse:
+        store = self._namespace(namespace)
+        with store.lock:
+            matches = store.query(vector, top_k, filter, sparse_vector, include_metadata, include_values)
+        return QueryResponse(matches=matches, namespace=namespace)
+
+    def delete(self, ids: Optional[List[str]] = None, namespace: str = "", delete_all: bool = False, **kwargs) -> Dict[str, Any]:
+        store = self._namespace(namespace)
+        with store.lock:
+            store.delete(ids, delete_all)
+        return {}
+
+    def describe_index_stats(self, **kwargs) -> IndexStats:
+        names = set(self._namespaces)
+        names.update(unquote(entry) for entry in os.listdir(self.directory))
+        namespaces, dimension = {}, None
+        for name in sorted(names):
+            store = self._namespace(name)
+            with store.lock:
+                store.refresh()
+                if store.rows:
+                    namespaces[name] = NamespaceStats(vector_count=len(store.rows))
+                    dimension = dimension or store.dimension
+        return IndexStats(
+            namespaces=namespaces,
+            dimension=dimension,
+            total_vector_count=sum(stats.vector_count for stats in namespaces.values()),
+        )
+
+    # Defined last: inside the class body, `list` is this method from here on
+    def list(self, namespace: str = "", limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        """Yield pages of the namespace's vector IDs, like Pinecone's list()."""
+        store = self._namespace(namespace)
+        with store.lock:
+            store.refresh()
+            ids = sorted(store.rows)
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> FetchResponse:
+        store = self._namespace(namespace)
+        with store.lock:
+            store.refresh()
+            vectors = {
+                vector_id: FetchedVector(
+                    id=vector_id,
+                    values=store.matrix[row].astype(np.float32).tolist(),
+                    metadata=store.metadata[row],
+                    sparse_values=store.sparse[row],
+                )
+                for vector_id, row in ((vector_id, store.rows.get(vector_id)) for vector_id in ids)
+                if row is not None
+            }
+        return FetchResponse(vectors=vectors, namespace=namespace)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.db import get_database
+from app.core.vector_store import get_vector_index
+from app.services import ingest_manifest_service, profile_store_service, sparse_vocabulary_service
+
+logger = logging.getLogger(__name__)
+
+# Searches read a user's profiles from the namespace their alias document
+# (namespace_aliases, keyed by user ID) points at. Each upload is built into a
+# fresh versioned namespace, {user_id}__v{n}, and the alias is switched to it
+# in one update once every chunk is indexed, so a search sees the previous
+# upload or the new one, never a mix. Replaced and abandoned namespaces are
+# queued in namespace_gc and deleted after NAMESPACE_GC_DELAY_SECONDS, when
+# searches that resolved them before the switch have finished. Users without
+# an alias (data uploaded before versioning) are served from the bare user ID.
+
+_indexes_ready = False
+_VERSION_SUFFIX = re.compile(r"__v(\d+)$")
+
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.namespace_gc.create_index([("due_at", 1)])
+        _indexes_ready = True
+
+
+def versioned_namespace(user_id: str, version: int) -> str:
+    return f"{user_id}__v{version}"
+
+
+def namespace_version(namespace: str) -> int:
+    """Version of a namespace built by versioned_namespace; 0 for a bare user ID"""
+    match = _VERSION_SUFFIX.search(namespace)
+    return int(match.group(1)) if match else 0
+
+
+async def get_namespace(db, user_id: str) -> str:
+    """Return the namespace holding the user's live upload"""
+    alias = await db.namespace_aliases.find_one({"_id": user_id}, {"namespace": 1})
+    if alias and alias.get("namespace"):
+        return alias["namespace"]
+    return user_id
+
+
+async def allocate_namespace(db, user_id: str) -> str:
+    """Reserve a new versioned namespace to build an upload into"""
+    alias = await db.namespace_aliases.find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"next_version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return versioned_namespace(user_id, alias["next_version"])
+
+
+async def activate_namespace(db, user_id: str, namespace: str, index_name: str) -> bool:
+    """
+    Switch the user's searches to a completely built namespace and queue the
+    namespace it replaces for garbage collection. A build finishing after a
+    newer one was activated is not switched to, and is collected instead.
+
+    Returns:
+        Whether the namespace is now live
+    """
+    version = namespace_version(namespace)
+    previous = await db.namespace_aliases.find_one_and_update(
+        {"_id": user_id, "$or": [{"version": {"$exists": False}}, {"version": {"$lt": version}}]},
+        {"$set": {"namespace": namespace, "version": version, "activated_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
+        await queue_garbage(db, user_id, namespace, index_name)
+        return False
+    await queue_garbage(db, user_id, previous.get("namespace") or user_id, index_name)
+    return True
+
+
+async def queue_garbage(db, user_id: str, namespace: str, index_name: str) -> None:
+    """Delete a namespace (vectors, manifest, profiles and vocabulary) after the GC delay"""
+    await _ensure_indexes(db)
+    await db.namespace_gc.insert_one({
+        "user_id": user_id,
+        "namespace": namespace,
+        "index_name": index_name,
+        "due_at": datetime.now(timezone.utc) + timedelta(seconds=settings.NAMESPACE_GC_DELAY_SECONDS),
+    })
+
+
+async def collect_garbage(db) -> int:
+    """
+    Delete every queued namespace that is due, unless it has become live again.
+
+    Returns:
+        Number of namespaces deleted
+    """
+    await _ensure_indexes(db)
+    collected = 0
+    async for entry in db.namespace_gc.find({"due_at": {"$lte": datetime.now(timezone.utc)}}):
+        namespace = entry["namespace"]
+        if namespace != await get_namespace(db, entry["user_id"]):
+            index = get_vector_index(entry["index_name"])
+            if index is not None:
+                try:
+                    await asyncio.to_thread(index.delete, delete_all=True, namespace=namespace)
+                except Exception as e:
+                    # Pinecone answers 404 for a namespace that holds no vectors
+                    if getattr(e, "status", None) != 404:
+                        logger.error(f"Could not delete namespace {namespace}: {e}")
+                        continue
+            await ingest_manifest_service.clear_manifest(db, namespace)
+            await profile_store_service.clear_profiles(db, namespace)
+            await sparse_vocabulary_service.clear_vocabulary(db, namespace)
+            collected += 1
+        await db.namespace_gc.delete_one({"_id": entry["_id"]})
+    if collected:
+        print(f"Garbage-collected {collected} replaced namespaces")
+    return collected
+
+
+async def watch_garbage() -> None:
+    """Periodically collect replaced namespaces; runs for the lifetime of the API process."""
+    while True:
+        try:
+            await collect_garbage(get_database())
+        except Exception as e:
+            logger.error(f"Could not collect replaced namespaces: {e}")
+        await asyncio.sleep(settings.NAMESPACE_GC_DELAY_SECONDS)
@@ -7,18 +7,27 @@ from app.core.config import settings
 class PineconeIndexService:
     """Service for managing Pinecone index creation and configuration."""
     
-    def __init__(self):
-        """Initialize the Pinecone client."""
+    def __init__(self, index_name: Optional[str] = None, dimension: Optional[int] = None):
+        """
+        Initialize the Pinecone client.
+        
+        Args:
+            index_name: Index to manage (default: PINECONE_INDEX_NAME)
+            dimension: Vector dimension to create it with (default: EMBEDDING_DIMENSIONS)
+        """
         if not settings.PINECONE_API_KEY:
             raise ValueError("PINECONE_API_KEY is required but not provided in configuration.")
         
         self.client = Pinecone(api_key=settings.PINECONE_API_KEY)
-        self.index_name = settings.PINECONE_INDEX_NAME
+        self.index_name = index_name or settings.PINECONE_INDEX_NAME
         
         # Index configuration as specified in requirements
         self.index_config = {
-            "dimension": 1536,  # For text-embedding-3-small model
-            "metric": "cosine",
+            # Must match the embeddings: EMBEDDING_MODEL at EMBEDDING_DIMENSIONS
+            "dimension": dimension or settings.EMBEDDING_DIMENSIONS,
+            # OpenAI embeddings are unit length, so dot product ranks like cosine;
+            # unlike cosine it also allows sparse values for hybrid search
+            "metric": "dotproduct",
             "spec": ServerlessSpec(
                 cloud=settings.PINECONE_CLOUD,
                 region=settings.PINECONE_REGION
@@ -176,26 +185,31 @@ class PineconeIndexService:
                 "message": error_msg,
                 "deleted": False
             }
-    def clear_namespace(self, namespace: str) -> Dict[str, Any]:
+    def clear_namespace(self, namespace: str, index_name: Optional[str] = None) -> Dict[str, Any]:
         """
         Clear all vectors from a specific namespace in the Pinecone index.
 
         Args:
             namespace: The namespace to clear.
+            index_name: Index to clear it in, e.g. the one a migration switched to
+                (default: this service's index)
 
         Returns:
             Dictionary containing the result of the operation.
         """
+        index_name = index_name or self.index_name
         try:
-            print(f"Clearing namespace '{namespace}' in index '{self.index_name}'...")
+            print(f"Clearing namespace '{namespace}' in index '{index_name}'...")
             
-            if not self.index_exists():
+            existing_indexes = self.client.list_indexes()
+            if not any(index.name == index_name for index in existing_indexes):
                 return {
                     "success": False,
-                    "message": f"Index '{self.index_name}' does not exist. Cannot clear namespace.",
+                    "message": f"Index '{index_name}' does not exist. Cannot clear namespace.",
                 }
 
-            self.index.delete(delete_all=True, namespace=namespace)
+            index = self.index if index_name == self.index_name else self.client.Index(index_name)
+            index.delete(delete_all=True, namespace=namespace)
             
             return {
                 "success": True,
@@ -234,8 +248,8 @@ class PineconeIndexService:
             print("\n✅ Pinecone index setup completed successfully!")
             print("\nIndex Features:")
             print("- ✅ Serverless configuration (AWS us-west-2)")
-            print("- ✅ Dimension: 1536 (compatible with text-embedding-3-small)")
-            print("- ✅ Metric: cosine similarity")
+            print(f"- ✅ Dimension: {self.index_config['dimension']} (compatible with {settings.EMBEDDING_MODEL})")
+            print(f"- ✅ Metric: {self.index_config['metric']} (required for sparse-dense hybrid queries)")
             print("- ✅ Hybrid search support (dense + sparse vectors)")
             print("- ✅ Metadata filtering enabled")
             print("- ✅ Namespace support for tenant isolation")
@@ -249,5 +263,5 @@ class PineconeIndexService:
         return result
 
 
-# Global instance
-pinecone_index_service = PineconeIndexService()
\ No newline at end of file
+# Global instance (None when Pinecone is not configured, e.g. with VECTOR_STORE=local)
+pinecone_index_service = PineconeIndexService() if settings.PINECONE_API_KEY else None
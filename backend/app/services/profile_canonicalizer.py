@@ -0,0 +1,539 @@
+"""
+Profile canonicalization and metadata extraction.
+
+Pure functions (no service state, no I/O) shared by EmbeddingsService's per-row
+methods and the batched, column-at-a-time versions used during ingestion. The
+batched versions produce exactly the same output as the per-row ones. Nothing
+here imports app settings, so worker processes can import it cheaply.
+"""
+import hashlib
+import json
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+from bs4 import BeautifulSoup
+import emoji
+from app.services import sparse_encoder
+
+# Precompiled once instead of on every row
+SENIOR_ABBREVIATION_PATTERN = re.compile(r'\bSr\.?\s*', flags=re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NON_DIGIT_PATTERN = re.compile(r'[^\d]')
+WHITESPACE_SPLIT_PATTERN = re.compile(r'(\s+)')
+# Every non-ASCII character that occurs in any emoji sequence. Emoji sequences that
+# contain ASCII (keycaps like "#️⃣") always contain one of these too, so text that
+# shares no character with this set cannot contain an emoji.
+EMOJI_CHARS = frozenset(char for key in emoji.EMOJI_DATA for char in key if not char.isascii())
+
+
+def strip_html(text: str) -> str:
+    """
+    Remove HTML tags and decode entities.
+
+    Text without '<' or '&' contains no markup, so the parser is skipped; the only
+    thing html.parser would change in such text is whitespace, which
+    clean_profile_text normalizes afterwards anyway.
+    """
+    if '<' not in text and '&' not in text:
+        return text
+    return BeautifulSoup(text, 'html.parser').get_text()
+
+
+def remove_emoji(text: str) -> str:
+    """
+    Remove emojis. emoji.replace_emoji tokenizes character by character, so it only
+    runs on the whitespace-separated pieces that contain an emoji character; no
+    emoji sequence contains whitespace, so the result is the same.
+    """
+    if EMOJI_CHARS.isdisjoint(text):
+        return text
+    return ''.join(
+        piece if EMOJI_CHARS.isdisjoint(piece) else emoji.replace_emoji(piece, replace='')
+        for piece in WHITESPACE_SPLIT_PATTERN.split(text)
+    )
+
+
+def clean_profile_text(text: str) -> str:
+    """
+    Apply the canonical cleanup to combined profile text: strip HTML, remove emojis,
+    expand "Sr." to "Senior", normalize whitespace, lowercase and strip.
+    """
+    text = strip_html(text)
+    text = remove_emoji(text)
+    text = SENIOR_ABBREVIATION_PATTERN.sub('Senior ', text)
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    return text.lower().strip()
+
+
+def combine_profile_fields(
+    full_name: str,
+    headline: str,
+    about: str,
+    experiences: str,
+    education: str,
+    skills: str,
+    company_name: str,
+    location: str
+) -> str:
+    """Combine the (already stripped) profile fields into a single string."""
+    return " ".join(filter(None, [
+        full_name,
+        headline,
+        about,
+        "Past Experience: " + experiences if experiences else "",
+        "Education: " + education if education else "",
+        "Skills: " + skills if skills else "",
+        "Current Company: " + company_name if company_name else "",
+        "Location: " + location if location else ""
+    ]))
+
+
+def canonicalize_profile_row(row: pd.Series) -> str:
+    """
+    Canonicalize profile text by merging all relevant fields from a row into a clean string.
+
+    Args:
+        row: A pandas Series representing a row from the connections DataFrame.
+
+    Returns:
+        A single canonicalized text string for vectorization.
+    """
+    location = f"{str(row.get('city', '')).strip()} {str(row.get('country', '')).strip()}".strip()
+    combined_text = combine_profile_fields(
+        str(row.get("fullName", "")).strip(),
+        str(row.get("headline", "")).strip(),
+        str(row.get("about", "")).strip(),
+        str(row.get("experiences", "")).strip(),
+        str(row.get("education", "")).strip(),
+        str(row.get("skills", "")).strip(),
+        str(row.get("companyName", "")).strip(),
+        location
+    )
+    return clean_profile_text(combined_text)
+
+
+def column_as_text(df: pd.DataFrame, column: str) -> pd.Series:
+    """Column rendered the way str(row.get(column, "")).strip() renders each cell."""
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    # str() on the Python objects (not astype(str)) so floats render exactly as per row
+    return pd.Series([str(value) for value in df[column].tolist()], index=df.index, dtype=object).str.strip()
+
+
+def canonicalize_profiles(df: pd.DataFrame) -> List[str]:
+    """
+    Batched canonicalize_profile_row: operates on whole DataFrame columns and
+    returns the canonical text of every row, in order.
+
+    Args:
+        df: Chunk of rows from the connections CSV
+
+    Returns:
+        One canonicalized text string per row
+    """
+    if df.empty:
+        return []
+
+    location = (column_as_text(df, 'city') + " " + column_as_text(df, 'country')).str.strip()
+    combined = [
+        combine_profile_fields(*fields)
+        for fields in zip(
+            column_as_text(df, "fullName").tolist(),
+            column_as_text(df, "headline").tolist(),
+            column_as_text(df, "about").tolist(),
+            column_as_text(df, "experiences").tolist(),
+            column_as_text(df, "education").tolist(),
+            column_as_text(df, "skills").tolist(),
+            column_as_text(df, "companyName").tolist(),
+            location.tolist()
+        )
+    ]
+
+    # Only rows with markup or non-ASCII characters pay for the parser / emoji scan
+    texts = pd.Series([remove_emoji(strip_html(text)) for text in combined], index=df.index, dtype=object)
+    # The rest runs as whole-column string operations
+    texts = texts.str.replace(SENIOR_ABBREVIATION_PATTERN, 'Senior ', regex=True)
+    texts = texts.str.replace(WHITESPACE_PATTERN, ' ', regex=True)
+    return texts.str.lower().str.strip().tolist()
+
+
+PROFILE_ID_FIELDS = ('urn', 'publicIdentifier', 'linkedin_url')
+# Profile IDs are UUIDv5s of the identifying field in this namespace, so the same
+# person gets the same ID in every store (Pinecone vectors, connections, profiles)
+# and on every upload. Changing it re-keys everything.
+PROFILE_ID_NAMESPACE = uuid.UUID('9a63d258-529a-48e6-a01b-b6ade69e9a3c')
+LINKEDIN_PROFILE_URL_PATTERN = re.compile(r'linkedin\.com/in/([^/?#]+)', flags=re.IGNORECASE)
+
+
+def _profile_key(field: str, value: str) -> str:
+    # A profile URL and a bare public identifier name the same person
+    if field == 'linkedin_url':
+        match = LINKEDIN_PROFILE_URL_PATTERN.search(value)
+        if match:
+            return f"publicIdentifier:{match.group(1)}"
+    return f"{field}:{value}"
+
+
+def stable_profile_id(key: str) -> str:
+    """Deterministic profile ID (a UUID string) for a profile key."""
+    return str(uuid.uuid5(PROFILE_ID_NAMESPACE, key))
+
+
+def resolve_profile_id_row(row: pd.Series, fallback: str) -> str:
+    """
+    Resolve the stable profile ID for a row, shared by its vector and its
+    connection document.
+
+    Derived from 'urn' as the primary unique identifier, then publicIdentifier,
+    then linkedin_url, and finally the supplied row-based fallback.
+    """
+    for key in PROFILE_ID_FIELDS:
+        value = row.get(key)
+        if value is not None and not pd.isna(value):
+            profile_key = str(value).strip()
+            if profile_key:
+                return stable_profile_id(_profile_key(key, profile_key))
+    return stable_profile_id(fallback)
+
+
+def resolve_profile_ids(df: pd.DataFrame) -> List[str]:
+    """Batched resolve_profile_id_row, falling back to f"profile_{index}"."""
+    profile_keys: List[Optional[str]] = [None] * len(df)
+    for key in PROFILE_ID_FIELDS:
+        if key not in df.columns:
+            continue
+        column = df[key]
+        for position, (value, missing) in enumerate(zip(column.tolist(), column.isna().tolist())):
+            if profile_keys[position] is None and not missing:
+                profile_key = str(value).strip()
+                if profile_key:
+                    profile_keys[position] = _profile_key(key, profile_key)
+    return [
+        stable_profile_id(profile_key if profile_key is not None else f"profile_{index}")
+        for profile_key, index in zip(profile_keys, df.index)
+    ]
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    s = str(value).strip()
+    return s if s else None
+
+
+def _to_int(value):
+    if value is None:
+        return None
+    try:
+        # Handle cases like '500+' by removing non-digits
+        if isinstance(value, str):
+            try:
+                # Numbers read as text, e.g. '500' or '500.0' from a float column
+                return int(float(value))
+            except ValueError:
+                cleaned_value = NON_DIGIT_PATTERN.sub('', value)
+                return int(cleaned_value) if cleaned_value else None
+        return int(float(value))
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def _to_bool(value):
+    if value is None:
+        return False # Default to False for boolean flags
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ['true', '1', 't', 'y', 'yes']
+
+
+# Define all possible profile fields and their conversion functions
+# This combines fields from the Connection model and observed CSV columns
+METADATA_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    # Personal Info
+    'fullName': _to_str,
+    'firstName': _to_str,
+    'lastName': _to_str,
+    'headline': _to_str,
+    'about': _to_str,
+    'description': _to_str,
+    'city': _to_str,
+    'state': _to_str,
+    'country': _to_str,
+    'location': _to_str,
+    'profilePicture': _to_str,
+    'publicIdentifier': _to_str,
+    'linkedin_url': _to_str,
+    'email_address': _to_str,
+
+    # Connection & Stats
+    'connected_on': _to_str,
+    'followerCount': _to_int,
+    'followers': _to_int,
+    'connectionsCount': _to_int,
+
+    # Flags
+    'isCreator': _to_bool,
+    'isPremium': _to_bool,
+    'isTopVoice': _to_bool,
+    'isOpenToWork': _to_bool,
+    'isHiring': _to_bool,
+    'isInfluencer': _to_bool,
+
+    # Professional Details
+    'title': _to_str,
+    'experiences': _to_str,
+    'education': _to_str,
+    'skills': _to_str,
+    'schoolName': _to_str,
+    'pronoun': _to_str,
+    'associated_hashtags': _to_str,
+
+    # Company Details
+    'companyName': _to_str,
+    'company': _to_str,
+    'company_size': _to_str,
+    'company_website': _to_str,
+    'company_phone': _to_str,
+    'company_industry': _to_str,
+    'company_industry_topics': _to_str,
+    'company_description': _to_str,
+    'company_address': _to_str,
+    'company_city': _to_str,
+    'company_state': _to_str,
+    'company_country': _to_str,
+    'company_revenue': _to_str,
+    'company_latest_funding': _to_str,
+    'company_linkedin': _to_str,
+    'urn': _to_str,
+}
+
+# Use a consistent key, e.g., 'companyName' over 'company'
+METADATA_KEY_ALIASES = {'company': 'companyName', 'followers': 'followerCount'}
+
+# The only metadata kept on Pinecone vectors in "slim" mode: what search filters
+# can match on. Everything else is hydrated from the profiles collection.
+FILTERABLE_METADATA_FIELDS = (
+    'city', 'state', 'country',
+    'company_industry', 'company_size',
+    'followerCount', 'connectionsCount',
+    'isCreator', 'isPremium', 'isTopVoice', 'isOpenToWork', 'isHiring', 'isInfluencer',
+)
+
+
+def _finalize_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    # Post-processing to ensure consistency
+    if 'fullName' not in metadata and ('firstName' in metadata or 'lastName' in metadata):
+        first = metadata.get('firstName', '') or ''
+        last = metadata.get('lastName', '') or ''
+        full_name = f"{first} {last}".strip()
+        if full_name:
+            metadata['fullName'] = full_name
+    return metadata
+
+
+def extract_metadata_row(row: pd.Series) -> Dict[str, Any]:
+    """
+    Extract metadata from a CSV row, ensuring all profile fields are included
+    and data types are compatible with Pinecone (string, number, boolean).
+
+    Args:
+        row: Pandas Series representing a row from the CSV
+
+    Returns:
+        Metadata dictionary with flattened profile data.
+    """
+    metadata = {}
+    for field, converter in METADATA_FIELDS.items():
+        value = row.get(field)
+        # Check for pandas missing values (NaT, nan, None) and empty cells read as text
+        if value is None or pd.isna(value) or value == '':
+            continue
+        converted_value = converter(value)
+        # Add to metadata only if it's not None and not an empty string
+        if converted_value is not None and converted_value != '':
+            key = METADATA_KEY_ALIASES.get(field, field)
+            if key not in metadata: # Prioritize first-seen key
+                metadata[key] = converted_value
+    return _finalize_metadata(metadata)
+
+
+def extract_metadata_batch(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Batched extract_metadata_row: converts one column at a time instead of
+    walking every field of every row.
+
+    Args:
+        df: Chunk of rows from the connections CSV
+
+    Returns:
+        One metadata dictionary per row, in order
+    """
+    results: List[Dict[str, Any]] = [{} for _ in range(len(df))]
+    for field, converter in METADATA_FIELDS.items():
+        if field not in df.columns:
+            continue
+        column = df[field]
+        key = METADATA_KEY_ALIASES.get(field, field)
+        for metadata, value, missing in zip(results, column.tolist(), column.isna().tolist()):
+            if missing or value == '':
+                continue
+            converted_value = converter(value)
+            if converted_value is not None and converted_value != '' and key not in metadata:
+                metadata[key] = converted_value
+    return [_finalize_metadata(metadata) for metadata in results]
+
+
+def slim_metadata(profile_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a profile's metadata to the filterable fields plus its profile ID."""
+    slim = {key: metadata[key] for key in FILTERABLE_METADATA_FIELDS if key in metadata}
+    slim['profile_id'] = profile_id
+    return slim
+
+
+def compute_content_hash(
+    embedding_model: str,
+    canonical_text: str,
+    metadata: Dict[str, Any],
+    metadata_mode: str = "full",
+    sparse: bool = False
+) -> str:
+    """
+    Hash everything that ends up in a profile's vector record, so an unchanged
+    profile can be skipped on re-ingestion.
+
+    Args:
+        embedding_model: Model the canonical text is embedded with
+        canonical_text: Canonicalized profile text (determines the embedding)
+        metadata: Metadata stored alongside the vector
+        metadata_mode: "full" or "slim" (where the metadata is stored)
+        sparse: Whether the record carries a BM25 sparse vector
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    record = [embedding_model, canonical_text, metadata]
+    # Switching layouts changes every record, so profiles get re-upserted in the
+    # new layout; full-mode hashes are unchanged from before slim mode existed.
+    if metadata_mode != "full":
+        record.append(metadata_mode)
+    if sparse:
+        record.append("sparse")
+    payload = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def prepare_profiles(
+    df: pd.DataFrame,
+    indexed_profiles: Optional[Dict[str, str]],
+    embedding_model: str,
+    metadata_mode: str = "full",
+    avg_doc_length: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    CPU stage of ingestion: canonicalize, extract metadata and diff one chunk of rows.
+
+    Args:
+        df: Chunk of rows from the connections CSV
+        indexed_profiles: {profile_id: content_hash} already indexed, or None to upsert everything
+        embedding_model: Model the profiles will be embedded with (part of the content hash)
+        metadata_mode: Where profile metadata is stored (part of the content hash)
+        avg_doc_length: Namespace average document length for BM25 sparse vectors,
+            or None to index dense vectors only
+
+    Returns:
+        Dictionary with the profiles to index ('items'), the IDs seen in the chunk,
+        unchanged/error counts and, with sparse vectors, the chunk's term statistics
+        ('vocabulary')
+    """
+    items = []
+    seen_profile_ids = set()
+    unchanged_count = 0
+    error_count = 0
+    sparse = avg_doc_length is not None
+    vocabulary = sparse_encoder.VocabularyStats() if sparse else None
+
+    # Whole-chunk, column-at-a-time work instead of per-row iterrows()
+    profile_ids = resolve_profile_ids(df)
+    full_names = column_as_text(df, 'fullName').tolist()
+    canonical_texts = canonicalize_profiles(df)
+    metadatas = extract_metadata_batch(df)
+
+    for index, profile_id, full_name, canonical_text, metadata in zip(
+        df.index, profile_ids, full_names, canonical_texts, metadatas
+    ):
+        try:
+            # Skip if essential data is missing
+            if not full_name:
+                continue
+
+            # Skip if canonical text is too short
+            if len(canonical_text.strip()) < 20: # Increased threshold for meaningful content
+                continue
+
+            metadata["canonical_text"] = canonical_text # Add canonical text to metadata
+            content_hash = compute_content_hash(embedding_model, canonical_text, metadata, metadata_mode, sparse)
+            seen_profile_ids.add(profile_id)
+            if sparse:
+                # Unchanged profiles count towards the namespace's term statistics too
+                counts = sparse_encoder.term_counts(canonical_text)
+                vocabulary.add_document(counts)
+
+            # Skip profiles that are already indexed with identical content
+            if indexed_profiles is not None and indexed_profiles.get(profile_id) == content_hash:
+                unchanged_count += 1
+                continue
+
+            item = {
+                'profile_id': profile_id,
+                'canonical_text': canonical_text,
+                'metadata': metadata,
+                'content_hash': content_hash,
+            }
+            if sparse:
+                item['sparse_values'] = sparse_encoder.encode_document(counts, avg_doc_length)
+            items.append(item)
+
+        except Exception as e:
+            error_count += 1
+            if profile_id:
+                # Keep the existing vector rather than deleting it as removed
+                seen_profile_ids.add(profile_id)
+            print(f"Error preparing row {index}: {e}")
+
+    return {
+        "items": items,
+        "seen_profile_ids": seen_profile_ids,
+        "unchanged_count": unchanged_count,
+        "error_count": error_count,
+        "vocabulary": vocabulary,
+    }
+
+
+def to_column_block(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Serialize a chunk as plain column lists for a worker process. Pickling lists of
+    Python scalars per column is much cheaper than pickling pandas objects row by row.
+    """
+    return {
+        "index": df.index.tolist(),
+        "columns": [(name, str(df[name].dtype), df[name].tolist()) for name in df.columns],
+    }
+
+
+def from_column_block(block: Dict[str, Any]) -> pd.DataFrame:
+    """Rebuild the DataFrame serialized by to_column_block, with the original dtypes."""
+    return pd.DataFrame(
+        {name: pd.Series(values, dtype=dtype) for name, dtype, values in block["columns"]},
+    ).set_axis(block["index"])
+
+
+def prepare_column_block(
+    block: Dict[str, Any],
+    indexed_profiles: Optional[Dict[str, str]],
+    embedding_model: str,
+    metadata_mode: str = "full",
+    avg_doc_length: Optional[float] = None
+) -> Dict[str, Any]:
+    """prepare_profiles for a column block; runs in a worker process."""
+    return prepare_profiles(from_column_block(block), indexed_profiles, embedding_model, metadata_mode, avg_doc_length)
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from pymongo import UpdateOne
+
+# Full profile metadata per Pinecone namespace, keyed by the vector's profile ID.
+# In slim metadata mode vectors carry only filterable fields, and search results
+# are hydrated from here.
+_indexes_ready = False
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.profiles.create_index([("namespace", 1), ("profile_id", 1)], unique=True)
+        _indexes_ready = True
+
+async def store_profiles(db, namespace: str, profiles: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """Store (profile_id, metadata) pairs for a namespace, replacing older versions"""
+    if not profiles:
+        return
+    await _ensure_indexes(db)
+    now = datetime.now(timezone.utc)
+    await db.profiles.bulk_write([
+        UpdateOne(
+            {"namespace": namespace, "profile_id": profile_id},
+            {"$set": {"metadata": metadata, "updated_at": now}},
+            upsert=True
+        )
+        for profile_id, metadata in profiles
+    ], ordered=False)
+
+async def get_profiles(db, namespace: str, profile_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Return {profile_id: metadata} for the given IDs in one batched read"""
+    if not profile_ids:
+        return {}
+    await _ensure_indexes(db)
+    cursor = db.profiles.find(
+        {"namespace": namespace, "profile_id": {"$in": profile_ids}},
+        {"_id": 0, "profile_id": 1, "metadata": 1}
+    )
+    return {doc["profile_id"]: doc["metadata"] async for doc in cursor}
+
+async def iter_profiles(db, namespace: str, batch_size: int = 500) -> AsyncIterator[List[Tuple[str, Dict[str, Any]]]]:
+    """Yield every (profile_id, metadata) pair stored for a namespace, in batches"""
+    batch = []
+    async for doc in db.profiles.find({"namespace": namespace}, {"_id": 0, "profile_id": 1, "metadata": 1}):
+        batch.append((doc["profile_id"], doc["metadata"]))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def remove_profiles(db, namespace: str, profile_ids: List[str]) -> int:
+    """Remove profiles whose vectors were deleted from a namespace"""
+    if not profile_ids:
+        return 0
+    result = await db.profiles.delete_many({"namespace": namespace, "profile_id": {"$in": profile_ids}})
+    return result.deleted_count
+
+async def clear_profiles(db, namespace: str) -> int:
+    """Remove every profile stored for a namespace (e.g. after clearing it)"""
+    result = await db.profiles.delete_many({"namespace": namespace})
+    return result.deleted_count
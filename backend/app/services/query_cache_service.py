@@ -0,0 +1,189 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from bson.binary import Binary
+from app.core.config import settings
+from app.core.db import get_database
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query"""
+    return " ".join(query.split()).lower()
+
+
+def _encode_embedding(embedding: List[float]) -> Binary:
+    return Binary(np.asarray(embedding, dtype=np.float32).tobytes())
+
+
+def _decode_embedding(value: bytes) -> List[float]:
+    return np.frombuffer(value, dtype=np.float32).tolist()
+
+
+class QueryCache:
+    """
+    Bounded in-process LRU cache with a TTL for per-query work (LLM query
+    rewrites, query embeddings), so repeated and paginated searches skip the
+    OpenAI round trip.
+
+    With QUERY_CACHE_SHARED=true entries are also written to the `query_cache`
+    collection, so API processes share them: a local miss falls back to
+    MongoDB, and a TTL index on `expires_at` removes expired entries. Values
+    are kept in their encoded form, so an embedding costs 4 bytes per dimension.
+    """
+
+    COLLECTION_NAME = "query_cache"
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl_seconds: float,
+        shared: bool = False,
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value
+    ):
+        self.name = name
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.encode = encode
+        self.decode = decode
+        # key -> (expires at, in time.monotonic(), encoded value), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._indexes_ready = False
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def make_key(self, *parts: Any) -> str:
+        """Hex SHA-256 digest of the parts that determine the cached value"""
+        return hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    async def _get_collection(self):
+        """Return the shared collection, or None when sharing is off or MongoDB is unavailable."""
+        if not self.shared:
+            return None
+        try:
+            collection = get_database()[self.COLLECTION_NAME]
+        except Exception:
+            return None
+        if not self._indexes_ready:
+            await collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+        return collection
+
+    def _store_local(self, key: str, encoded: Any, ttl_seconds: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl_seconds, encoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a value, locally first and then in the shared store.
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, encoded = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self.decode(encoded)
+            del self._entries[key]
+            self.expirations += 1
+
+        collection = await self._get_collection()
+        if collection is not None:
+            try:
+                now = datetime.now(timezone.utc)
+                document = await collection.find_one({"_id": f"{self.name}:{key}", "expires_at": {"$gt": now}})
+            except Exception as e:
+                print(f"Error reading {self.name} cache: {e}")
+                document = None
+            if document is not None:
+                expires_at = document["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                self._store_local(key, document["value"], (expires_at - now).total_seconds())
+                self.shared_hits += 1
+                return self.decode(document["value"])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Cache a value for the TTL, locally and in the shared store."""
+        if not self.enabled:
+            return
+        encoded = self.encode(value)
+        self._store_local(key, encoded, self.ttl_seconds)
+
+        collection = await self._get_collection()
+        if collection is not None:
+            try:
+                await collection.update_one(
+                    {"_id": f"{self.name}:{key}"},
+                    {"$set": {
+                        "value": encoded,
+                        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds),
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                print(f"Error writing {self.name} cache: {e}")
+
+    def clear(self) -> None:
+        """Drop this process's entries (the shared store expires on its own)."""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters for this process."""
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "shared": self.shared,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Global instances
+# Normalized user query -> LLM-rewritten query
+query_rewrite_cache = QueryCache(
+    "query_rewrite",
+    settings.QUERY_REWRITE_CACHE_SIZE,
+    settings.QUERY_REWRITE_CACHE_TTL_SECONDS,
+    shared=settings.QUERY_CACHE_SHARED
+)
+# Embedding model, dimensions and processed query -> query embedding
+query_embedding_cache = QueryCache(
+    "query_embedding",
+    settings.QUERY_EMBEDDING_CACHE_SIZE,
+    settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    shared=settings.QUERY_CACHE_SHARED,
+    encode=_encode_embedding,
+    decode=_decode_embedding
+)
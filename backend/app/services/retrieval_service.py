@@ -3,15 +3,36 @@ import math
 import asyncio
 import os
 import logging
-from typing import List, Dict, Any, Optional
-import openai
-import httpx
-from pinecone import Pinecone
+from typing import AsyncGenerator, Callable, List, Dict, Any, Optional, Tuple
 from app.core.config import settings
+from app.core.db import get_database
+from app.core.disconnect import disconnect_stats
+from app.core.openai_client import get_openai_client
+from app.core.openai_governor import Priority, estimate_chat_tokens, openai_governor
+from app.core.single_flight import SingleFlight
+from app.core.vector_store import get_vector_index, vector_store
 from app.services.embeddings_service import embeddings_service
+from app.services import profile_store_service, sparse_encoder, sparse_vocabulary_service
+from app.services.query_cache_service import normalize_query, query_embedding_cache, query_rewrite_cache
 
 logger = logging.getLogger(__name__)
 
+# Re-ranked profiles scoring below this are dropped, and at most MAX_RESULTS are returned
+MIN_RELEVANCE_SCORE = 6
+MAX_RESULTS = 20
+
+# Receives the pipeline's stage events as they happen:
+#   {"stage": "rewrite", "query": ...}            query rewritten (or kept as is)
+#   {"stage": "embedding"}                        query embedded
+#   {"stage": "candidates", "count": n}           candidates retrieved from the index
+#   {"stage": "rerank", "chunk": k, "chunks": n,  k of n re-ranking chunks done; results
+#    "results": [...]}                            holds the relevant profiles of that chunk
+SearchEventCallback = Callable[[Dict[str, Any]], None]
+
+
+def _ignore_event(event: Dict[str, Any]) -> None:
+    pass
+
 class RetrievalService:
     def _to_snake_case(self, name: str) -> str:
         """Converts a camelCase string to snake_case."""
@@ -37,43 +58,43 @@ class RetrievalService:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
         try:
-            # Create a custom HTTP client without proxy configuration
-            http_client = httpx.Client(
-                timeout=60.0,
-                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
-            )
-            
-            # Initialize OpenAI client with custom HTTP client
-            self.openai_client = openai.OpenAI(
-                api_key=settings.OPENAI_API_KEY,
-                http_client=http_client
-            )
+            # Shared AsyncOpenAI client so rewrite/rerank calls never block the event loop
+            self.openai_client = get_openai_client()
             print("OpenAI client initialized successfully")
         except Exception as e:
             print(f"Error initializing OpenAI client: {e}")
             raise ValueError(f"Failed to initialize OpenAI client: {e}")
             
-        # Initialize Pinecone client
-        if settings.PINECONE_API_KEY:
-            try:
-                self.pinecone_client = Pinecone(api_key=settings.PINECONE_API_KEY)
-                self.index = self.pinecone_client.Index(settings.PINECONE_INDEX_NAME)
-            except Exception as e:
-                print(f"Warning: Could not initialize Pinecone client: {e}")
-                self.pinecone_client = None
-                self.index = None
-        else:
-            self.pinecone_client = None
+        # Pinecone index, or the local index when VECTOR_STORE=local
+        self.index_name = settings.PINECONE_INDEX_NAME
+        try:
+            self.index = get_vector_index(self.index_name)
+        except Exception as e:
+            print(f"Warning: Could not initialize vector store: {e}")
             self.index = None
+        self.pinecone_client = vector_store.pinecone_client
             
         # Configuration constants
         self.TOTAL_TOKEN_LIMIT = 128000
         self.ESTIMATED_PROMPT_TOKENS = 500  # Conservative estimate for system prompt + user query
         self.ESTIMATED_AVG_PROFILE_TOKENS = 200  # Conservative estimate per profile
+        self.rerank_max_concurrency = max(1, settings.RERANK_MAX_CONCURRENCY)
+        # Identical searches running at the same time (double clicks, retries, tabs) share one run
+        self.search_flights = SingleFlight("retrieve_and_rerank")
+        # Rerank work abandoned because the client went away
+        self.cancelled_rerank_chunks = 0
         
+    async def sync_active_index(self) -> None:
+        """Query the index the embeddings service currently uses (it follows index migrations)."""
+        await embeddings_service.refresh_active_index()
+        if embeddings_service.index_name != self.index_name:
+            self.index = embeddings_service.index
+            self.index_name = embeddings_service.index_name
+    
     async def rewrite_query_with_llm(self, verbose_query: str, enable_rewrite: bool = True) -> str:
         """
         Optional LLM query rewrite using gpt-4o-mini to transform verbose query into concise search intent.
+        Rewrites are cached by normalized query; a failed rewrite is not cached.
         
         Args:
             verbose_query: The original user query
@@ -84,6 +105,11 @@ class RetrievalService:
         """
         if not enable_rewrite or not self.openai_client:
             return verbose_query
+        
+        cache_key = query_rewrite_cache.make_key("gpt-4o-mini", normalize_query(verbose_query))
+        cached_query = await query_rewrite_cache.get(cache_key)
+        if cached_query is not None:
+            return cached_query
             
         try:
             system_prompt = """You are a query optimization assistant. Transform verbose user queries into concise, focused search intent sentences that capture the core requirements for finding relevant professional profiles.
@@ -97,47 +123,84 @@ Focus on:
 
 Keep the output to 1-2 sentences maximum."""
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Rewrite this query into a concise search intent: {verbose_query}"}
-                ],
-                max_tokens=100,
-                temperature=0.3
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Rewrite this query into a concise search intent: {verbose_query}"}
+            ]
+            response = await openai_governor.run(
+                "gpt-4o-mini",
+                lambda: self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    max_tokens=100,
+                    temperature=0.3
+                ),
+                priority=Priority.INTERACTIVE,
+                estimated_tokens=estimate_chat_tokens(messages, 100)
             )
             
             rewritten_query = response.choices[0].message.content.strip()
             print(f"Query rewritten from: '{verbose_query}' to: '{rewritten_query}'")
+            await query_rewrite_cache.set(cache_key, rewritten_query)
             return rewritten_query
             
         except Exception as e:
             print(f"Error rewriting query: {e}")
             return verbose_query
     
+    async def embed_query(self, processed_query: str) -> List[float]:
+        """
+        Embed a search query for the active index, reusing the cached embedding of
+        the same text, model and dimensions.
+        """
+        await self.sync_active_index()
+        cache_key = query_embedding_cache.make_key(
+            embeddings_service.embedding_model, embeddings_service.embedding_dimensions, processed_query
+        )
+        query_embedding = await query_embedding_cache.get(cache_key)
+        if query_embedding is not None:
+            return query_embedding
+        
+        query_embedding = await embeddings_service.generate_embedding(processed_query)
+        if len(query_embedding) != embeddings_service.embedding_dimensions:
+            # The index was switched while embedding; embed again for the new one
+            await self.sync_active_index()
+            query_embedding = await embeddings_service.generate_embedding(processed_query)
+            cache_key = query_embedding_cache.make_key(
+                embeddings_service.embedding_model, embeddings_service.embedding_dimensions, processed_query
+            )
+        await query_embedding_cache.set(cache_key, query_embedding)
+        return query_embedding
+    
     async def hybrid_pinecone_query(
         self, 
         vector: List[float], 
         top_k: int = 600, 
         alpha: float = 0.6, 
         filter_dict: Optional[Dict[str, Any]] = None,
-        namespace: str = "default_user"
+        namespace: str = "default_user",
+        query_text: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform hybrid search query on Pinecone index.
         
+        With hybrid search enabled and query text given, the query also carries a
+        BM25 sparse vector, and the dense and sparse vectors are scaled by alpha
+        and 1 - alpha. Otherwise the query is dense only.
+        
         Args:
             vector: Dense embedding of the search query
             top_k: Number of results to retrieve (default: 600)
-            alpha: Balance between dense and sparse results (default: 0.6)
+            alpha: Weight of dense vs. sparse (lexical) similarity, 1 = dense only (default: 0.6)
             filter_dict: Metadata filtering dictionary
             namespace: Namespace for tenant isolation
+            query_text: Query text to build the sparse vector from
             
         Returns:
             List of profiles from the query response, including metadata
         """
         if not self.index:
-            raise ValueError("Pinecone client not initialized. Please check PINECONE_API_KEY configuration.")
+            raise ValueError("Vector index not initialized. Please check PINECONE_API_KEY, or set VECTOR_STORE=local.")
             
         try:
             # Prepare query parameters
@@ -152,17 +215,23 @@ Keep the output to 1-2 sentences maximum."""
             if filter_dict:
                 query_params["filter"] = filter_dict
                 
-            # Note: Pinecone serverless automatically handles hybrid search
-            # The alpha parameter is handled internally by Pinecone for serverless indexes
-            print(f"Performing hybrid query with top_k={top_k}, alpha={alpha}, namespace={namespace}")
+            sparse_vector = await self.encode_sparse_query(query_text, namespace) if query_text else None
+            if sparse_vector:
+                query_params["vector"], query_params["sparse_vector"] = sparse_encoder.hybrid_scale(vector, sparse_vector, alpha)
             
-            # Execute the query
-            query_response = self.index.query(**query_params)
+            search_type = "hybrid" if sparse_vector else "dense"
+            print(f"Performing {search_type} query with top_k={top_k}, alpha={alpha}, namespace={namespace}")
+            
+            # Execute the query off the event loop (the Pinecone client is synchronous)
+            query_response = await asyncio.to_thread(self.index.query, **query_params)
+            
+            # Slim vectors only carry filterable fields; hydrate the full profiles
+            stored_profiles = await self.hydrate_profiles(query_response.matches, namespace)
             
             # Extract profiles with metadata from matches
             profiles = []
             for match in query_response.matches:
-                profile_data = self._convert_keys_to_snake_case(match.metadata)
+                profile_data = self._convert_keys_to_snake_case(stored_profiles.get(match.id) or match.metadata or {})
                 profile_data["id"] = match.id
                 profile_data["profile_id"] = match.id
                 # Construct linkedin_url if public_identifier is available and linkedin_url is missing
@@ -183,6 +252,57 @@ Keep the output to 1-2 sentences maximum."""
             logger.error(f"Error performing hybrid Pinecone query: {e}", exc_info=True)
             raise
     
+    async def encode_sparse_query(self, query_text: str, namespace: str) -> Optional[Dict[str, list]]:
+        """
+        BM25 sparse vector for a query, weighted by the namespace's document frequencies.
+        
+        Args:
+            query_text: Query text
+            namespace: Namespace whose vocabulary to use
+            
+        Returns:
+            Sparse vector, or None without hybrid search, a fitted vocabulary, or known query terms
+        """
+        if not embeddings_service.hybrid_search:
+            return None
+        try:
+            db = get_database()
+            stats = await sparse_vocabulary_service.get_stats(db, namespace)
+            if not stats:
+                return None
+            terms = list(sparse_encoder.term_counts(query_text))
+            document_frequencies = await sparse_vocabulary_service.get_document_frequencies(
+                db, namespace, stats["generation"], terms
+            )
+            return sparse_encoder.encode_query(query_text, document_frequencies, stats["doc_count"])
+        except Exception as e:
+            logger.error(f"Error encoding sparse query: {e}")
+            return None
+    
+    async def hydrate_profiles(self, matches: List[Any], namespace: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the full stored profiles for query matches in one batched read.
+        
+        Matches without a stored profile (vectors upserted in full metadata mode)
+        keep their Pinecone metadata.
+        
+        Args:
+            matches: Pinecone query matches
+            namespace: Namespace the matches came from
+            
+        Returns:
+            {profile_id: metadata} for the matches that have a stored profile
+        """
+        if embeddings_service.metadata_mode != "slim" or not matches:
+            return {}
+        try:
+            return await profile_store_service.get_profiles(
+                get_database(), namespace, [match.id for match in matches]
+            )
+        except Exception as e:
+            logger.error(f"Error hydrating profiles from MongoDB: {e}")
+            return {}
+    
     def calculate_chunk_size(self) -> int:
         """
         Calculate the chunk size for profiles to send to the re-ranking model.
@@ -220,38 +340,28 @@ Keep the output to 1-2 sentences maximum."""
             
         return content
     
-    async def rerank_with_openai(
+    async def _rerank_chunk(
         self,
-        candidates: List[Dict[str, Any]],
-        user_query: str
+        chunk: List[Dict[str, Any]],
+        user_query: str,
+        chunk_number: int
     ) -> List[Dict[str, Any]]:
         """
-        Re-rank candidates using gpt-4o with context budgeting.
+        Score a single chunk of candidates with one gpt-4o call.
         
         Args:
-            candidates: List of candidate profiles to re-rank
+            chunk: Candidate profiles in this chunk
             user_query: Original user query for context
+            chunk_number: 1-based chunk number, used for logging
             
         Returns:
-            List of re-ranked profiles with scores, pros, and cons
+            Scored profiles for this chunk (unsorted)
         """
-        if not self.openai_client:
-            raise ValueError("OpenAI client not initialized. Please check OPENAI_API_KEY configuration.")
-            
-        if not candidates:
-            return []
-            
-        chunk_size = self.calculate_chunk_size()
-        all_results = []
+        print(f"Processing chunk {chunk_number} with {len(chunk)} profiles")
+        chunk_scored = []
         
-        # Process candidates in chunks
-        for i in range(0, len(candidates), chunk_size):
-            chunk = candidates[i:i + chunk_size]
-            print(f"Processing chunk {i//chunk_size + 1} with {len(chunk)} profiles")
-            
-            try:
-                # Prepare the system prompt
-                system_prompt = """You are a sophisticated recruiting assistant responsible for accurately scoring professional profiles against a user's search query. Your task is to provide a relevance score from 0 to 10, where 10 indicates a perfect match and 0 indicates no relevance.
+        # Prepare the system prompt
+        system_prompt = """You are a sophisticated recruiting assistant responsible for accurately scoring professional profiles against a user's search query. Your task is to provide a relevance score from 0 to 10, where 10 indicates a perfect match and 0 indicates no relevance.
 
 **Scoring Guidelines:**
 - **10:** Perfect match. The profile explicitly meets all key criteria in the user's query.
@@ -264,10 +374,10 @@ Keep the output to 1-2 sentences maximum."""
 
 For each profile, provide up to 5 reasons "Why this may be a good match" and up to 5 reasons "Why this may not be a good match". Each reason should be a concise sentence directly relevant to the user's search query. Only include reasons that are clearly supported by the profile information. Do not include generic or irrelevant statements.
 """
-                
-                # Prepare the user message with profiles
-                profiles_json = json.dumps(chunk, indent=2)
-                user_message = """User Query: "{}"
+        
+        # Prepare the user message with profiles
+        profiles_json = json.dumps(chunk, indent=2)
+        user_message = """User Query: "{}"
 
 Profiles to evaluate:
 {}
@@ -295,84 +405,189 @@ Example format:
   }}
 ]""".format(user_query, profiles_json)
 
-                # Call gpt-4o
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    max_tokens=8000,  # Increased for enhanced pros/cons
-                    temperature=0.3
-                )
-                
-                # Parse the response
-                ai_response = response.choices[0].message.content.strip()
-                logger.info(f"Raw OpenAI response for re-ranking: {ai_response}")
-                
-                try:
-                    # Clean the response before parsing JSON
-                    cleaned_response = self.clean_json_response(ai_response)
-                    
-                    # Check if response is empty or just whitespace
-                    if not cleaned_response.strip():
-                        logger.error(f"Empty response from OpenAI for chunk {i//chunk_size + 1}")
-                        continue
+        # Call gpt-4o
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        response = await openai_governor.run(
+            "gpt-4o",
+            lambda: self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                max_tokens=8000,  # Increased for enhanced pros/cons
+                temperature=0.3
+            ),
+            priority=Priority.INTERACTIVE,
+            estimated_tokens=estimate_chat_tokens(messages, 8000)
+        )
+        
+        # Parse the response
+        ai_response = response.choices[0].message.content.strip()
+        logger.info(f"Raw OpenAI response for re-ranking: {ai_response}")
+        
+        try:
+            # Clean the response before parsing JSON
+            cleaned_response = self.clean_json_response(ai_response)
+            
+            # Check if response is empty or just whitespace
+            if not cleaned_response.strip():
+                logger.error(f"Empty response from OpenAI for chunk {chunk_number}")
+                return []
+            
+            # Try to parse as JSON
+            chunk_results = json.loads(cleaned_response)
+            
+            # Validate and process results
+            for result in chunk_results:
+                if isinstance(result, dict) and all(key in result for key in ["profile_id", "score", "pros", "cons"]):
+                    # Find the original profile data with improved matching logic
+                    result_profile_id = str(result["profile_id"])
+                    profile_data = None
                     
-                    # Try to parse as JSON
-                    chunk_results = json.loads(cleaned_response)
+                    # Try multiple matching strategies
+                    for p in chunk:
+                        # Strategy 1: Match against 'id' field
+                        if str(p.get("id", "")) == result_profile_id:
+                            profile_data = p
+                            break
+                        # Strategy 2: Match against 'profile_id' field
+                        elif str(p.get("profile_id", "")) == result_profile_id:
+                            profile_data = p
+                            break
+                        # Strategy 3: Match against '_id' field (if still present)
+                        elif str(p.get("_id", "")) == result_profile_id:
+                            profile_data = p
+                            break
+                        # Strategy 4: Match against linkedin_url (original Pinecone ID)
+                        elif str(p.get("linkedin_url", "")) == result_profile_id:
+                            profile_data = p
+                            break
                     
-                    # Validate and process results
-                    for result in chunk_results:
-                        if isinstance(result, dict) and all(key in result for key in ["profile_id", "score", "pros", "cons"]):
-                            # Find the original profile data with improved matching logic
-                            result_profile_id = str(result["profile_id"])
-                            profile_data = None
-                            
-                            # Try multiple matching strategies
-                            for p in chunk:
-                                # Strategy 1: Match against 'id' field
-                                if str(p.get("id", "")) == result_profile_id:
-                                    profile_data = p
-                                    break
-                                # Strategy 2: Match against 'profile_id' field
-                                elif str(p.get("profile_id", "")) == result_profile_id:
-                                    profile_data = p
-                                    break
-                                # Strategy 3: Match against '_id' field (if still present)
-                                elif str(p.get("_id", "")) == result_profile_id:
-                                    profile_data = p
-                                    break
-                                # Strategy 4: Match against linkedin_url (original Pinecone ID)
-                                elif str(p.get("linkedin_url", "")) == result_profile_id:
-                                    profile_data = p
-                                    break
-                            
-                            if profile_data:
-                                pros = result.get("pros", [])
-                                cons = result.get("cons", [])
-                                
-                                all_results.append({
-                                    "profile": profile_data,
-                                    "score": max(0, min(10, int(float(result["score"])))),  # Ensure score is 0-10
-                                    "pros": pros,
-                                    "cons": cons,
-                                    # Keep backward compatibility
-                                    "pro": pros[0] if pros else "Strong candidate match.",
-                                    "con": cons[0] if cons else "Some limitations may apply."
-                                })
-                                logger.debug(f"Successfully matched profile_id: {result_profile_id}")
-                            else:
-                                logger.warning(f"Could not find profile data for profile_id: {result_profile_id}")
-                                logger.warning(f"Available profile IDs in chunk: {[str(p.get('id', p.get('profile_id', p.get('_id', 'unknown')))) for p in chunk]}")
-                                
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to parse JSON response for chunk {i//chunk_size + 1}: {ai_response}")
-                    raise
+                    if profile_data:
+                        pros = result.get("pros", [])
+                        cons = result.get("cons", [])
                         
-            except Exception as e:
-                logger.error(f"Error processing chunk {i//chunk_size + 1}: {e}", exc_info=True)
-                raise
+                        chunk_scored.append({
+                            "profile": profile_data,
+                            "score": max(0, min(10, int(float(result["score"])))),  # Ensure score is 0-10
+                            "pros": pros,
+                            "cons": cons,
+                            # Keep backward compatibility
+                            "pro": pros[0] if pros else "Strong candidate match.",
+                            "con": cons[0] if cons else "Some limitations may apply."
+                        })
+                        logger.debug(f"Successfully matched profile_id: {result_profile_id}")
+                    else:
+                        logger.warning(f"Could not find profile data for profile_id: {result_profile_id}")
+                        logger.warning(f"Available profile IDs in chunk: {[str(p.get('id', p.get('profile_id', p.get('_id', 'unknown')))) for p in chunk]}")
+                        
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse JSON response for chunk {chunk_number}: {ai_response}")
+            raise
+        
+        return chunk_scored
+    
+    async def iter_rerank_chunks(
+        self,
+        candidates: List[Dict[str, Any]],
+        user_query: str
+    ) -> AsyncGenerator[Tuple[int, int, List[Dict[str, Any]]], None]:
+        """
+        Re-rank candidates using gpt-4o with context budgeting, yielding each
+        chunk's scores as soon as its response is parsed.
+        
+        Chunks are scored concurrently, bounded by RERANK_MAX_CONCURRENCY, and
+        yielded in completion order, so the first scores arrive after one LLM
+        round trip. A failing chunk is logged and yields no results; only if
+        every chunk fails is the error re-raised. Closing the generator early
+        cancels the chunks still running.
+        
+        Args:
+            candidates: List of candidate profiles to re-rank
+            user_query: Original user query for context
+            
+        Yields:
+            (chunks done, total chunks, scored profiles of the chunk just done, unsorted)
+        """
+        if not self.openai_client:
+            raise ValueError("OpenAI client not initialized. Please check OPENAI_API_KEY configuration.")
+            
+        if not candidates:
+            return
+            
+        chunk_size = self.calculate_chunk_size()
+        chunks = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+        semaphore = asyncio.Semaphore(self.rerank_max_concurrency)
+        
+        async def score_chunk(chunk_number: int, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self._rerank_chunk(chunk, user_query, chunk_number)
+                except Exception as e:
+                    logger.error(f"Error processing chunk {chunk_number}: {e}", exc_info=True)
+                    raise
+        
+        tasks = [
+            asyncio.create_task(score_chunk(chunk_number, chunk))
+            for chunk_number, chunk in enumerate(chunks, start=1)
+        ]
+        
+        failed_chunks = 0
+        last_error: Optional[Exception] = None
+        try:
+            for chunks_done, finished in enumerate(asyncio.as_completed(tasks), start=1):
+                try:
+                    chunk_results = await finished
+                except Exception as e:
+                    # Isolate the failure; the other chunks still count
+                    failed_chunks += 1
+                    last_error = e
+                    chunk_results = []
+                yield chunks_done, len(chunks), chunk_results
+        finally:
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                self.cancelled_rerank_chunks += len(unfinished)
+                logger.info(f"Cancelled {len(unfinished)} of {len(chunks)} re-ranking chunks")
+        
+        if failed_chunks == len(chunks) and last_error is not None:
+            raise last_error
+        if failed_chunks:
+            logger.warning(f"{failed_chunks} of {len(chunks)} re-ranking chunks failed; returning partial results")
+    
+    async def rerank_with_openai(
+        self,
+        candidates: List[Dict[str, Any]],
+        user_query: str,
+        on_event: SearchEventCallback = _ignore_event
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-rank candidates using gpt-4o (see iter_rerank_chunks) and merge the chunks.
+        
+        Args:
+            candidates: List of candidate profiles to re-rank
+            user_query: Original user query for context
+            on_event: Receives a "rerank" stage event as each chunk finishes
+            
+        Returns:
+            List of re-ranked profiles with scores, pros, and cons
+        """
+        all_results = []
+        async for chunks_done, chunks, chunk_results in self.iter_rerank_chunks(candidates, user_query):
+            all_results.extend(chunk_results)
+            on_event({
+                "stage": "rerank",
+                "chunk": chunks_done,
+                "chunks": chunks,
+                "results": sorted(
+                    (result for result in chunk_results if result["score"] >= MIN_RELEVANCE_SCORE),
+                    key=lambda x: x["score"],
+                    reverse=True
+                ),
+            })
         
         # Sort by score descending
         all_results.sort(key=lambda x: x["score"], reverse=True)
@@ -385,37 +600,71 @@ Example format:
         user_query: str, 
         user_id: str = "default_user",
         enable_query_rewrite: bool = True,
-        filter_dict: Optional[Dict[str, Any]] = None
+        filter_dict: Optional[Dict[str, Any]] = None,
+        on_event: Optional[SearchEventCallback] = None
     ) -> List[Dict[str, Any]]:
         """
         Main service orchestration method that ties all steps together.
         
+        Concurrent calls for the same namespace, normalized query, filters and
+        options join one run (SEARCH_COALESCING_ENABLED); each caller receives
+        the run's stage events.
+        
         Args:
             user_query: Original user query
             user_id: User ID for namespace isolation and data fetching
             enable_query_rewrite: Whether to enable optional query rewriting
             filter_dict: Optional metadata filtering
+            on_event: Receives stage events (see SearchEventCallback) as each stage finishes
             
         Returns:
             List of re-ranked and annotated results
         """
+        namespace = await embeddings_service.get_live_namespace(user_id)
+        run = lambda emit: self._retrieve_and_rerank(user_query, namespace, enable_query_rewrite, filter_dict, emit)
+        if not settings.SEARCH_COALESCING_ENABLED:
+            return await run(on_event or _ignore_event)
+        
+        key = (
+            namespace,
+            normalize_query(user_query),
+            json.dumps(filter_dict, sort_keys=True, default=str),
+            enable_query_rewrite,
+            embeddings_service.index_name,
+        )
+        # Each caller gets its own list, as callers slice and store results
+        return list(await self.search_flights.run(key, run, on_event))
+    
+    async def _retrieve_and_rerank(
+        self,
+        user_query: str,
+        namespace: str,
+        enable_query_rewrite: bool,
+        filter_dict: Optional[Dict[str, Any]],
+        on_event: SearchEventCallback
+    ) -> List[Dict[str, Any]]:
         try:
             logger.info(f"Starting retrieval and re-ranking for query: '{user_query}'")
             
             # Step 1: Optional query rewrite
             processed_query = await self.rewrite_query_with_llm(user_query, enable_query_rewrite)
+            on_event({"stage": "rewrite", "query": processed_query})
             
-            # Step 2: Generate embedding for the query
-            query_embedding = await embeddings_service.generate_embedding(processed_query)
+            # Step 2: Generate embedding for the query, in the active index's embedding space
+            query_embedding = await self.embed_query(processed_query)
+            on_event({"stage": "embedding"})
             
-            # Step 3: Execute hybrid query against Pinecone
+            # Step 3: Execute hybrid query against the namespace of the user's live upload
             candidate_profiles = await self.hybrid_pinecone_query(
                 vector=query_embedding,
                 top_k=30,
                 alpha=0.6,
                 filter_dict=filter_dict,
-                namespace=user_id
+                namespace=namespace,
+                # The user's own words, so exact names and rare terms still match
+                query_text=user_query
             )
+            on_event({"stage": "candidates", "count": len(candidate_profiles)})
             
             if not candidate_profiles:
                 logger.warning("No profiles found in Pinecone query")
@@ -423,13 +672,13 @@ Example format:
             
             logger.info(f"Re-ranking {len(candidate_profiles)} candidates.")
             # Step 4: Chunk and re-rank candidates using OpenAI
-            reranked_results = await self.rerank_with_openai(candidate_profiles, user_query)
+            reranked_results = await self.rerank_with_openai(candidate_profiles, user_query, on_event)
             
             # Step 5: Filter results based on relevance score
-            filtered_results = [result for result in reranked_results if result['score'] >= 6]
+            filtered_results = [result for result in reranked_results if result['score'] >= MIN_RELEVANCE_SCORE]
             
             # Step 6: Limit results to top 20
-            final_results = filtered_results[:20]
+            final_results = filtered_results[:MAX_RESULTS]
             
             logger.info(f"Total final results: {len(final_results)}")
             # Log details of the first 3 profiles for inspection
@@ -447,5 +696,14 @@ Example format:
             logger.error(f"Error in retrieve_and_rerank: {e}", exc_info=True)
             raise
 
+    def get_cancellation_stats(self) -> Dict[str, int]:
+        """Counters for search work cancelled because the client disconnected."""
+        return {
+            "disconnected_searches": disconnect_stats.searches,
+            "cancelled_runs": self.search_flights.cancelled,
+            "cancelled_rerank_chunks": self.cancelled_rerank_chunks,
+            "cancelled_openai_requests": sum(state.cancelled for state in openai_governor.models.values()),
+        }
+
 # Global instance
 retrieval_service = RetrievalService()
\ No newline at end of file
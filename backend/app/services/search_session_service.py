@@ -0,0 +1,95 @@
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.query_cache_service import QueryCache, normalize_query
+from app.services.retrieval_service import SearchEventCallback, retrieval_service
+
+# A search's first page stores its complete ranked list as a result session
+# under a new search ID, returned to the client. Later pages of the same search
+# pass the ID back and are sliced from the session instead of rerunning the
+# rewrite, embedding, vector query and rerank. Sessions live in this process
+# only, bounded by SEARCH_SESSION_MAX_ENTRIES across all users (least recently
+# used evicted first) and expiring after SEARCH_SESSION_TTL_SECONDS; a page
+# requested for an unknown, expired or foreign search ID runs a new search.
+
+search_sessions = QueryCache(
+    "search_session",
+    settings.SEARCH_SESSION_MAX_ENTRIES,
+    settings.SEARCH_SESSION_TTL_SECONDS
+)
+
+
+def _session_query(query: str, filter_dict: Optional[Dict[str, Any]]) -> str:
+    return f"{normalize_query(query)}\x00{json.dumps(filter_dict, sort_keys=True, default=str)}"
+
+
+async def get_session(
+    search_id: Optional[str],
+    user_id: str,
+    query: str,
+    filter_dict: Optional[Dict[str, Any]] = None
+) -> Optional[List[Dict[str, Any]]]:
+    """Return the ranked results of the user's session for this query and filters, if it is still cached"""
+    if not search_id:
+        return None
+    session = await search_sessions.get(search_id)
+    if session is None or session["user_id"] != user_id or session["query"] != _session_query(query, filter_dict):
+        return None
+    return session["results"]
+
+
+async def create_session(
+    user_id: str,
+    query: str,
+    filter_dict: Optional[Dict[str, Any]],
+    results: List[Dict[str, Any]]
+) -> str:
+    """Store a search's complete ranked results and return its new search ID"""
+    search_id = uuid.uuid4().hex
+    await search_sessions.set(search_id, {
+        "user_id": user_id,
+        "query": _session_query(query, filter_dict),
+        "results": results,
+    })
+    return search_id
+
+
+async def get_or_run_search(
+    search_id: Optional[str],
+    user_id: str,
+    query: str,
+    filter_dict: Optional[Dict[str, Any]] = None,
+    enable_query_rewrite: bool = True,
+    on_event: Optional[SearchEventCallback] = None
+) -> Tuple[str, List[Dict[str, Any]], bool]:
+    """
+    Serve a search from its result session, or run it and open a session.
+
+    Args:
+        search_id: ID returned with an earlier page of this search, if any
+        user_id: Authenticated user
+        query: Search query
+        filter_dict: Metadata filter the search runs with
+        enable_query_rewrite: Whether a new search rewrites the query
+        on_event: Receives a new search's stage events (see retrieval_service)
+
+    Returns:
+        (search ID, complete ranked results, whether they came from the session)
+    """
+    results = await get_session(search_id, user_id, query, filter_dict)
+    if results is not None:
+        return search_id, results, True
+
+    results = await retrieval_service.retrieve_and_rerank(
+        user_query=query,
+        user_id=user_id,
+        enable_query_rewrite=enable_query_rewrite,
+        filter_dict=filter_dict,
+        on_event=on_event
+    )
+    return await create_session(user_id, query, filter_dict, results), results, False
+
+
+def get_stats() -> Dict[str, Any]:
+    return search_sessions.get_stats()
@@ -0,0 +1,133 @@
+"""
+BM25 sparse vectors for hybrid (dense + lexical) search.
+
+Documents are encoded at ingestion with the BM25 term-frequency part of the
+score; queries carry the inverse document frequencies of their terms, fitted
+on the namespace's own profiles. The dot product of the two is the BM25 score,
+which Pinecone computes for the sparse half of a hybrid query.
+
+Terms are hashed to 32-bit indices, so no vocabulary has to be shared between
+processes. Like profile_canonicalizer, this module is pure and does not import
+app settings, so worker processes can import it cheaply.
+"""
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Mapping, Optional
+
+TOKEN_PATTERN = re.compile(r'\w+')
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have he her his i in is it its me my
+of on or our she so than that the their them they this to was we were what when
+which who will with you your
+""".split())
+
+# BM25 parameters: term-frequency saturation and document-length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Average document length (in terms) until a namespace has been fitted
+DEFAULT_AVG_DOC_LENGTH = 400.0
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, without stopwords and single characters."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def term_index(term: str) -> int:
+    """Stable 32-bit index of a term (the same in every process)."""
+    return zlib.crc32(term.encode("utf-8")) & 0xffffffff
+
+
+def term_counts(text: str) -> Counter:
+    """{term_index: frequency} for a text."""
+    return Counter(term_index(token) for token in tokenize(text))
+
+
+def encode_document(counts: Mapping[int, int], avg_doc_length: float) -> Dict[str, list]:
+    """
+    Sparse vector for a document: the BM25 term-frequency weight of each term.
+
+    Args:
+        counts: {term_index: frequency}, from term_counts
+        avg_doc_length: Average document length of the namespace
+
+    Returns:
+        {"indices": [...], "values": [...]} in Pinecone's sparse format
+    """
+    doc_length = sum(counts.values())
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_length / max(avg_doc_length, 1.0))
+    indices = sorted(counts)
+    return {
+        "indices": indices,
+        "values": [counts[index] * (BM25_K1 + 1) / (counts[index] + length_norm) for index in indices],
+    }
+
+
+def encode_query(
+    text: str,
+    document_frequencies: Mapping[int, int],
+    doc_count: int
+) -> Optional[Dict[str, list]]:
+    """
+    Sparse vector for a query: the BM25 inverse document frequency of each term,
+    normalized to sum to 1. Terms no document contains are dropped.
+
+    Args:
+        text: Query text
+        document_frequencies: {term_index: number of documents containing it}
+        doc_count: Number of documents in the namespace
+
+    Returns:
+        Sparse vector, or None when no query term occurs in the namespace
+    """
+    weights = {}
+    for index, frequency in term_counts(text).items():
+        df = document_frequencies.get(index, 0)
+        if df:
+            weights[index] = frequency * math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+    total = sum(weights.values())
+    if not total:
+        return None
+    indices = sorted(weights)
+    return {"indices": indices, "values": [weights[index] / total for index in indices]}
+
+
+def hybrid_scale(dense: List[float], sparse: Dict[str, list], alpha: float):
+    """
+    Convex combination of a dense and a sparse query vector: alpha=1 is pure
+    dense (semantic) search, alpha=0 pure sparse (lexical) search.
+    """
+    if not 0 <= alpha <= 1:
+        raise ValueError("alpha must be between 0 and 1")
+    return (
+        [value * alpha for value in dense],
+        {"indices": sparse["indices"], "values": [value * (1 - alpha) for value in sparse["values"]]},
+    )
+
+
+class VocabularyStats:
+    """Document frequencies and lengths over a namespace's profiles, fitted during ingestion."""
+
+    def __init__(self):
+        self.doc_count = 0
+        self.total_length = 0
+        self.document_frequencies: Counter = Counter()
+
+    def add_document(self, counts: Mapping[int, int]) -> None:
+        self.doc_count += 1
+        self.total_length += sum(counts.values())
+        self.document_frequencies.update(counts.keys())
+
+    def merge(self, other: "VocabularyStats") -> None:
+        self.doc_count += other.doc_count
+        self.total_length += other.total_length
+        self.document_frequencies.update(other.document_frequencies)
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / self.doc_count if self.doc_count else DEFAULT_AVG_DOC_LENGTH
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+from app.services.sparse_encoder import VocabularyStats
+
+# BM25 statistics per Pinecone namespace: document frequencies spread over
+# BUCKETS documents by term index (so a query reads only the buckets of its
+# terms), plus a stats document with the document count and total length.
+# Each fit is written under a new generation and switched to in one update,
+# so queries never see a half-written vocabulary.
+_indexes_ready = False
+BUCKETS = 256
+
+async def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.sparse_vocabulary.create_index([("namespace", 1), ("generation", 1), ("bucket", 1)], unique=True)
+        _indexes_ready = True
+
+async def get_stats(db, namespace: str) -> Optional[Dict[str, Any]]:
+    """Return the current fit for a namespace (generation, doc_count, avg_doc_length), or None"""
+    stats = await db.sparse_vocabulary_stats.find_one({"_id": namespace})
+    if not stats or not stats.get("doc_count"):
+        return None
+    stats["avg_doc_length"] = stats["total_length"] / stats["doc_count"]
+    return stats
+
+async def get_document_frequencies(db, namespace: str, generation: str, terms: List[int]) -> Dict[int, int]:
+    """Return {term: document frequency} for the given terms in one batched read"""
+    if not terms:
+        return {}
+    await _ensure_indexes(db)
+    cursor = db.sparse_vocabulary.find(
+        {"namespace": namespace, "generation": generation, "bucket": {"$in": sorted({term % BUCKETS for term in terms})}},
+        {"_id": 0, "terms": 1}
+    )
+    wanted = {str(term): term for term in terms}
+    frequencies = {}
+    async for doc in cursor:
+        for key, term in wanted.items():
+            if key in doc["terms"]:
+                frequencies[term] = doc["terms"][key]
+    return frequencies
+
+async def save_vocabulary(db, namespace: str, vocabulary: VocabularyStats) -> None:
+    """Replace a namespace's fit with a new one"""
+    await _ensure_indexes(db)
+    generation = uuid4().hex
+    buckets: Dict[int, Dict[str, int]] = {}
+    for term, df in vocabulary.document_frequencies.items():
+        # MongoDB keys are strings
+        buckets.setdefault(term % BUCKETS, {})[str(term)] = df
+    if buckets:
+        await db.sparse_vocabulary.insert_many([
+            {"namespace": namespace, "generation": generation, "bucket": bucket, "terms": terms}
+            for bucket, terms in buckets.items()
+        ], ordered=False)
+
+    await db.sparse_vocabulary_stats.update_one(
+        {"_id": namespace},
+        {"$set": {
+            "generation": generation,
+            "doc_count": vocabulary.doc_count,
+            "total_length": vocabulary.total_length,
+            "term_count": len(vocabulary.document_frequencies),
+            "updated_at": datetime.now(timezone.utc),
+        }},
+        upsert=True
+    )
+    # Older generations are no longer read
+    await db.sparse_vocabulary.delete_many({"namespace": namespace, "generation": {"$ne": generation}})
+
+async def clear_vocabulary(db, namespace: str) -> None:
+    """Forget a namespace's fit (e.g. after clearing it)"""
+    await db.sparse_vocabulary_stats.delete_one({"_id": namespace})
+    await db.sparse_vocabulary.delete_many({"namespace": namespace})
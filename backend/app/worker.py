@@ -0,0 +1,73 @@
+"""
+Celery worker for ingestion jobs.
+
+Run one or more dedicated worker processes next to the API:
+
+    celery -A app.worker worker --pool solo --loglevel=info
+
+Each worker runs one job at a time on its own event loop (the solo pool keeps
+the worker process free to start its own canonicalization process pool); run
+more workers to ingest more uploads at once. Job state lives in MongoDB, so a
+job whose worker dies is picked up by the next worker to start and resumes
+after its last checkpointed chunk.
+"""
+
+import asyncio
+import logging
+from celery import Celery
+from celery.signals import worker_ready, worker_shutdown
+from app.core.config import settings
+from app.core.db import connect_to_mongo, close_mongo_connection, get_database
+from app.core.openai_client import close_openai_client
+from app.core.process_pool import close_process_pool
+from app.core.vector_upsert_engine import close_vector_upsert_engine
+
+logger = logging.getLogger(__name__)
+
+celery_app = Celery("superconnector", broker=settings.CELERY_BROKER_URL)
+celery_app.conf.update(
+    task_default_queue="ingestion",
+    # Acknowledge only once a job has run, so a killed worker's job is redelivered
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_connection_retry_on_startup=True,
+)
+
+# Motor and the shared OpenAI client are bound to the loop that created them,
+# so every task in this process runs on the same loop.
+_loop = None
+
+
+def _run(coro):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        _loop.run_until_complete(connect_to_mongo())
+    return _loop.run_until_complete(coro)
+
+
+@celery_app.task(name="ingestion.run_job")
+def run_ingest_job(job_id: str):
+    from app.services import ingest_job_service
+    return _run(ingest_job_service.run_job(job_id))
+
+
+@worker_ready.connect
+def _resume_abandoned_jobs(**kwargs):
+    from app.services import ingest_job_service
+    try:
+        _run(ingest_job_service.resume_abandoned_jobs(get_database()))
+    except Exception as e:
+        logger.error(f"Could not resume abandoned ingestion jobs: {e}")
+
+
+@worker_shutdown.connect
+def _close_clients(**kwargs):
+    if _loop is None:
+        return
+    _loop.run_until_complete(close_openai_client())
+    close_process_pool()
+    close_vector_upsert_engine()
+    _loop.run_until_complete(close_mongo_connection())
+    _loop.close()
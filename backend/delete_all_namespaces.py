@@ -1,6 +1,8 @@
 import os
 from dotenv import load_dotenv
 from pinecone import Pinecone
+from pymongo import MongoClient
+import certifi
 
 # Load environment variables from .env file
 load_dotenv()
@@ -8,6 +10,8 @@ load_dotenv()
 # Get Pinecone configuration from environment variables
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
+DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "superconnector")
 
 def get_all_namespaces():
     """
@@ -51,6 +55,29 @@ def delete_namespace(namespace: str):
     except Exception as e:
         print(f"An error occurred while deleting namespace {namespace}: {e}")
 
+def clear_ingest_manifest():
+    """
+    Clears the ingest manifest so the next upload re-indexes every profile
+    instead of skipping the ones it believes are already in Pinecone, along with
+    the stored profiles that search results are hydrated from.
+    """
+    if not DATABASE_URL:
+        print("Warning: DATABASE_URL not set; the ingest manifest was not cleared.")
+        return
+
+    client = None
+    try:
+        client = MongoClient(DATABASE_URL, tlsCAFile=certifi.where())
+        result = client[DATABASE_NAME].ingest_manifest.delete_many({})
+        print(f"Cleared {result.deleted_count} ingest manifest entries.")
+        result = client[DATABASE_NAME].profiles.delete_many({})
+        print(f"Cleared {result.deleted_count} stored profiles.")
+    except Exception as e:
+        print(f"An error occurred while clearing the ingest manifest: {e}")
+    finally:
+        if client:
+            client.close()
+
 
 if __name__ == "__main__":
     print(f"Fetching namespaces for index '{PINECONE_INDEX_NAME}' to delete them...")
@@ -68,6 +95,7 @@ if __name__ == "__main__":
             print("\nDeleting namespaces...")
             for ns in namespaces:
                 delete_namespace(ns)
+            clear_ingest_manifest()
             print("\nAll namespaces have been deleted.")
         else:
             print("\nDeletion cancelled.")
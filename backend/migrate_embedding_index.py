@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Embedding Index Migration Script
+
+Moves every namespace to a new vector index built with another embedding model
+or dimension (e.g. text-embedding-3-small shortened to 512 dimensions):
+
+1. Creates the target index at the new dimension (Pinecone; a local index is
+   created on first write).
+2. For each namespace of the active index, reads every profile's canonical
+   text (from the profiles collection in slim metadata mode, from the vectors'
+   metadata in full mode), embeds it with the new model and dimensions
+   (through the embedding cache) and upserts it, with its metadata and sparse
+   values, to the target index.
+3. Checks the target holds every migrated vector, then switches reads and
+   writes with a single update of the active index record in MongoDB. Running
+   API and worker processes follow within ACTIVE_INDEX_REFRESH_SECONDS; an
+   ingestion run already in progress finishes on the index it started with.
+4. Rewrites the ingest manifest for the new embedding space, so the next upload
+   still skips unchanged profiles.
+
+The source index is left untouched, so a switch can be reverted with
+--switch-only. Profiles uploaded to the source index while the migration runs
+are not copied; run it again (cached embeddings make reruns cheap) or migrate
+when no uploads are in flight. Set EMBEDDING_MODEL, EMBEDDING_DIMENSIONS and
+PINECONE_INDEX_NAME to the new values afterwards so fresh deployments match.
+
+Usage:
+    python migrate_embedding_index.py --dimensions 512 [--model MODEL] [--index-name NAME]
+        [--namespace NS ...] [--no-switch]
+    python migrate_embedding_index.py --switch-only --index-name NAME --dimensions D [--model MODEL]
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.db import close_mongo_connection, connect_to_mongo, get_database
+from app.services import (
+    embedding_index_service,
+    ingest_manifest_service,
+    profile_canonicalizer,
+    profile_store_service,
+    sparse_encoder,
+)
+from app.services.embeddings_service import EmbeddingsService, embeddings_service
+
+FETCH_BATCH_SIZE = 100  # Pinecone fetches at most this many IDs per request
+READ_BATCH_SIZE = 500  # Profiles re-embedded and upserted at a time
+
+
+async def iter_namespace_profiles(source: EmbeddingsService, namespace: str, batch_size: int):
+    """Yield batches of (profile_id, full metadata) for a namespace of the source index."""
+    if source.metadata_mode == "slim":
+        async for batch in profile_store_service.iter_profiles(get_database(), namespace, batch_size):
+            yield batch
+        return
+
+    # Full mode: the profiles live on the vectors themselves
+    pages = await asyncio.to_thread(lambda: [ids for ids in source.index.list(namespace=namespace)])
+    profile_ids = [profile_id for page in pages for profile_id in page]
+    for start in range(0, len(profile_ids), FETCH_BATCH_SIZE):
+        response = await asyncio.to_thread(
+            source.index.fetch, ids=profile_ids[start:start + FETCH_BATCH_SIZE], namespace=namespace
+        )
+        yield [(vector_id, vector.metadata or {}) for vector_id, vector in response.vectors.items()]
+
+
+async def migrate_namespace(
+    source: EmbeddingsService,
+    target: EmbeddingsService,
+    namespace: str
+) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Re-embed a namespace's profiles into the target index.
+
+    Returns:
+        Tuple of ((profile_id, new content_hash) for every migrated profile, number that failed)
+    """
+    avg_doc_length = await target._get_avg_doc_length(namespace)
+    sparse = avg_doc_length is not None
+    migrated: List[Tuple[str, str]] = []
+    failed = 0
+
+    async for batch in iter_namespace_profiles(source, namespace, READ_BATCH_SIZE):
+        items = []
+        for profile_id, metadata in batch:
+            canonical_text = metadata.get("canonical_text")
+            if not canonical_text:
+                failed += 1
+                continue
+            item = {
+                "profile_id": profile_id,
+                "canonical_text": canonical_text,
+                "metadata": metadata,
+                "content_hash": profile_canonicalizer.compute_content_hash(
+                    target.embedding_key, canonical_text, metadata, target.metadata_mode, sparse
+                ),
+            }
+            if sparse:
+                item["sparse_values"] = sparse_encoder.encode_document(
+                    sparse_encoder.term_counts(canonical_text), avg_doc_length
+                )
+            items.append(item)
+
+        embedded, errors = await target.embed_prepared_items(items)
+        failed += errors
+        await target.index_profiles(embedded, namespace)
+        migrated.extend((item["profile_id"], item["content_hash"]) for item in embedded)
+        print(f"  {namespace}: {len(migrated)} profiles migrated")
+    return migrated, failed
+
+
+async def wait_for_vectors(target: EmbeddingsService, expected: Dict[str, int], timeout: int = 120) -> bool:
+    """Wait until the target index reports every migrated vector (Pinecone upserts are eventually consistent)."""
+    for _ in range(timeout):
+        stats = await asyncio.to_thread(target.index.describe_index_stats)
+        if all(
+            count == 0 or (namespace in stats.namespaces and stats.namespaces[namespace].vector_count >= count)
+            for namespace, count in expected.items()
+        ):
+            return True
+        await asyncio.sleep(1)
+    return False
+
+
+def create_target_index(index_name: str, dimensions: int) -> None:
+    if settings.VECTOR_STORE != "pinecone":
+        return
+    from app.services.pinecone_index_service import PineconeIndexService
+    result = PineconeIndexService(index_name, dimensions).create_index()
+    if not result["success"]:
+        raise RuntimeError(result["message"])
+    info = result["index_info"]
+    if info and info["dimension"] != dimensions:
+        raise RuntimeError(f"Index '{index_name}' already exists with dimension {info['dimension']}")
+
+
+async def migrate(
+    index_name: str,
+    model: str,
+    dimensions: int,
+    namespaces: Optional[List[str]] = None,
+    switch: bool = True
+) -> Dict[str, Any]:
+    """Copy namespaces of the active index into a new index and (optionally) switch to it."""
+    await embeddings_service.refresh_active_index()
+    source = embeddings_service
+    if index_name == source.index_name:
+        raise ValueError(f"'{index_name}' is already the active index")
+    print(f"Migrating {source.index_name} ({source.embedding_key}) -> "
+          f"{index_name} ({embedding_index_service.embedding_key(model, dimensions)})")
+
+    create_target_index(index_name, dimensions)
+    target = copy.copy(source)
+    target.use_index(index_name, model, dimensions)
+
+    if namespaces is None:
+        stats = await asyncio.to_thread(source.index.describe_index_stats)
+        namespaces = sorted(stats.namespaces)
+
+    manifests: Dict[str, List[Tuple[str, str]]] = {}
+    failed = 0
+    for namespace in namespaces:
+        manifests[namespace], namespace_failed = await migrate_namespace(source, target, namespace)
+        failed += namespace_failed
+
+    summary = {
+        "index_name": index_name,
+        "namespaces": len(namespaces),
+        "profiles_migrated": sum(len(entries) for entries in manifests.values()),
+        "profiles_failed": failed,
+        "switched": False,
+    }
+    if not await wait_for_vectors(target, {namespace: len(entries) for namespace, entries in manifests.items()}):
+        print("Target index does not report every migrated vector yet; not switching")
+        return summary
+    if not switch:
+        return summary
+
+    db = get_database()
+    await embedding_index_service.set_active_index(db, index_name, model, dimensions)
+    summary["switched"] = True
+    print(f"Switched reads and writes to {index_name}")
+    for namespace, entries in manifests.items():
+        await ingest_manifest_service.record_profiles(db, namespace, entries)
+    return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--dimensions", type=int, required=True)
+    parser.add_argument("--index-name", help="Target index (default: PINECONE_INDEX_NAME-<dimensions>)")
+    parser.add_argument("--namespace", action="append", help="Only migrate this namespace (repeatable)")
+    parser.add_argument("--no-switch", action="store_true", help="Copy without switching reads and writes")
+    parser.add_argument("--switch-only", action="store_true", help="Only switch to an already migrated index (e.g. to roll back)")
+    args = parser.parse_args()
+    index_name = args.index_name or f"{settings.PINECONE_INDEX_NAME}-{args.dimensions}"
+
+    await connect_to_mongo()
+    try:
+        if args.switch_only:
+            previous = await embedding_index_service.set_active_index(get_database(), index_name, args.model, args.dimensions)
+            print(f"Switched reads and writes to {index_name} (previously {previous['index_name'] if previous else settings.PINECONE_INDEX_NAME})")
+            return
+        summary = await migrate(index_name, args.model, args.dimensions, args.namespace, not args.no_switch)
+        print(f"\nMigrated {summary['profiles_migrated']} profiles in {summary['namespaces']} namespaces "
+              f"({summary['profiles_failed']} failed); switched: {summary['switched']}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
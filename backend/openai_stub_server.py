@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI API, for exercising rate limiting offline.
+
+Serves /v1/embeddings and /v1/chat/completions with OpenAI-shaped responses,
+enforces per-model request and token budgets that refill continuously over a
+window (like the real API), answers over-budget calls with 429 plus
+retry-after, and sends x-ratelimit-* headers on every response. Latency grows
+with the number of requests in flight, so overload shows up as slowness as
+well as 429s. Rerank prompts (containing '"id": "..."') get a JSON score list.
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python openai_stub_server.py [--port 8765] [--rpm 300] [--tpm 200000]
+                                 [--window 10] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import re
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class Budget:
+    """Bucket of `limit` units that refills at limit/window per second."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.rate = limit / window
+        self.available = float(limit)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.limit, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float) -> bool:
+        self._refill()
+        if amount > self.available:
+            return False
+        self.available -= amount
+        return True
+
+    def seconds_until(self, amount: float) -> float:
+        self._refill()
+        return max(0.0, (min(amount, self.limit) - self.available) / self.rate)
+
+    def reset_header(self) -> str:
+        return f"{int(self.seconds_until(self.limit) * 1000)}ms"
+
+
+def count_tokens(text: str) -> int:
+    # The server's own "tokenizer": deliberately not the client's estimate
+    return max(1, math.ceil(len(text.encode("utf-8")) / 4))
+
+
+def fake_embedding(text: str, dimensions: int, encoding_format: str):
+    digest = np.frombuffer(hashlib.md5(text.encode("utf-8")).digest(), dtype=np.uint8)
+    vector = ((np.resize(digest, dimensions) + np.arange(dimensions)) % 256 / 255.0 - 0.5).astype(np.float32)
+    if encoding_format == "base64":
+        # What the SDK asks for by default; far cheaper to serve than float lists
+        return base64.b64encode(vector.tobytes()).decode("ascii")
+    return vector.tolist()
+
+
+def create_app(rpm: int, tpm: int, window: float, latency: float) -> FastAPI:
+    app = FastAPI()
+    budgets = {}
+    stats = {"requests": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def budgets_for(model):
+        if model not in budgets:
+            budgets[model] = (Budget(rpm, window), Budget(tpm, window))
+        return budgets[model]
+
+    def headers_for(model):
+        requests, tokens = budgets_for(model)
+        return {
+            "x-ratelimit-limit-requests": str(requests.limit),
+            "x-ratelimit-remaining-requests": str(int(requests.available)),
+            "x-ratelimit-reset-requests": requests.reset_header(),
+            "x-ratelimit-limit-tokens": str(tokens.limit),
+            "x-ratelimit-remaining-tokens": str(int(tokens.available)),
+            "x-ratelimit-reset-tokens": tokens.reset_header(),
+        }
+
+    async def admit(model, token_count):
+        """Charge the budgets, or return a 429 response."""
+        stats["requests"] += 1
+        requests, tokens = budgets_for(model)
+        if requests.seconds_until(1) > 0 or tokens.seconds_until(token_count) > 0:
+            stats["rate_limited"] += 1
+            wait = max(requests.seconds_until(1), tokens.seconds_until(token_count))
+            headers = headers_for(model)
+            headers["retry-after-ms"] = str(int(wait * 1000))
+            headers["retry-after"] = str(math.ceil(wait))
+            return JSONResponse(
+                status_code=429,
+                headers=headers,
+                content={"error": {
+                    "message": f"Rate limit reached for {model}. Please try again in {wait:.3f}s.",
+                    "type": "requests" if requests.seconds_until(1) > 0 else "tokens",
+                    "code": "rate_limit_exceeded",
+                }},
+            )
+        requests.take(1)
+        tokens.take(token_count)
+        return None
+
+    async def work():
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            # Each request in flight slows every other one down a little
+            await asyncio.sleep(latency * (1 + stats["in_flight"] / 8))
+        finally:
+            stats["in_flight"] -= 1
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        model = body["model"]
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        rejected = await admit(model, sum(count_tokens(text) for text in inputs))
+        if rejected:
+            return rejected
+        await work()
+        dimensions = body.get("dimensions") or 1536
+        encoding_format = body.get("encoding_format") or "float"
+        return JSONResponse(headers=headers_for(model), content={
+            "object": "list",
+            "model": model,
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions, encoding_format)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body["model"]
+        prompt = " ".join(str(message.get("content", "")) for message in body["messages"])
+        rejected = await admit(model, count_tokens(prompt) + (body.get("max_tokens") or 0))
+        if rejected:
+            return rejected
+        await work()
+
+        profile_ids = re.findall(r'"id": "([^"]+)"', prompt)
+        if profile_ids:
+            content = json.dumps([
+                {"profile_id": profile_id, "score": 8, "pros": ["Relevant."], "cons": ["None."]}
+                for profile_id in profile_ids
+            ])
+        else:
+            content = "concise search intent"
+        return JSONResponse(headers=headers_for(model), content={
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        budgets.clear()
+        stats.update(requests=0, rate_limited=0, max_in_flight=0)
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=300, help="Requests per window, per model")
+    parser.add_argument("--tpm", type=int, default=200000, help="Tokens per window, per model")
+    parser.add_argument("--window", type=float, default=10.0, help="Budget window in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="Base response latency in seconds")
+    args = parser.parse_args()
+
+    app = create_app(args.rpm, args.tpm, args.window, args.latency)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
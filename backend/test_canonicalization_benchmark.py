@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Equivalence check and microbenchmark for batched profile canonicalization.
+
+Compares the batched, column-at-a-time canonicalizer and metadata extraction
+in app.services.profile_canonicalizer against a frozen copy of the original
+per-row iterrows() implementation. Output must be byte-identical on the sample
+CSVs and on a synthetic frame full of HTML, entities, emojis and odd whitespace;
+then both implementations are timed on a large frame.
+
+Usage:
+    python test_canonicalization_benchmark.py [rows]
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+import emoji
+import pandas as pd
+from bs4 import BeautifulSoup
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services import profile_canonicalizer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CSVS = ["updated_connections.csv", "Connections.csv"]
+
+
+# --- Original per-row implementation, kept verbatim as the reference ---
+
+def reference_canonicalize(row):
+    full_name = str(row.get("fullName", "")).strip()
+    headline = str(row.get("headline", "")).strip()
+    about = str(row.get("about", "")).strip()
+    experiences = str(row.get("experiences", "")).strip()
+    education = str(row.get("education", "")).strip()
+    skills = str(row.get("skills", "")).strip()
+    company_name = str(row.get("companyName", "")).strip()
+    location = f"{str(row.get('city', '')).strip()} {str(row.get('country', '')).strip()}".strip()
+
+    combined_text = " ".join(filter(None, [
+        full_name,
+        headline,
+        about,
+        "Past Experience: " + experiences if experiences else "",
+        "Education: " + education if education else "",
+        "Skills: " + skills if skills else "",
+        "Current Company: " + company_name if company_name else "",
+        "Location: " + location if location else ""
+    ]))
+
+    soup = BeautifulSoup(combined_text, 'html.parser')
+    text = soup.get_text()
+    text = emoji.replace_emoji(text, replace='')
+    text = re.sub(r'\bSr\.?\s*', 'Senior ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\s+', ' ', text)
+    return text.lower().strip()
+
+
+def reference_extract_metadata(row):
+    metadata = {}
+
+    def safe_get(key, default=None):
+        val = row.get(key)
+        if pd.isna(val):
+            return default
+        return val
+
+    def to_str(value):
+        if value is None:
+            return None
+        s = str(value).strip()
+        return s if s else None
+
+    def to_int(value):
+        if value is None:
+            return None
+        try:
+            if isinstance(value, str):
+                cleaned_value = re.sub(r'[^\d]', '', value)
+                return int(cleaned_value) if cleaned_value else None
+            return int(float(value))
+        except (ValueError, TypeError):
+            return None
+
+    def to_bool(value):
+        if value is None:
+            return False
+        if isinstance(value, bool):
+            return value
+        return str(value).lower() in ['true', '1', 't', 'y', 'yes']
+
+    field_map = {
+        'fullName': to_str, 'firstName': to_str, 'lastName': to_str, 'headline': to_str,
+        'about': to_str, 'description': to_str, 'city': to_str, 'state': to_str,
+        'country': to_str, 'location': to_str, 'profilePicture': to_str,
+        'publicIdentifier': to_str, 'linkedin_url': to_str, 'email_address': to_str,
+        'connected_on': to_str, 'followerCount': to_int, 'followers': to_int,
+        'connectionsCount': to_int, 'isCreator': to_bool, 'isPremium': to_bool,
+        'isTopVoice': to_bool, 'isOpenToWork': to_bool, 'isHiring': to_bool,
+        'isInfluencer': to_bool, 'title': to_str, 'experiences': to_str,
+        'education': to_str, 'skills': to_str, 'schoolName': to_str, 'pronoun': to_str,
+        'associated_hashtags': to_str, 'companyName': to_str, 'company': to_str,
+        'company_size': to_str, 'company_website': to_str, 'company_phone': to_str,
+        'company_industry': to_str, 'company_industry_topics': to_str,
+        'company_description': to_str, 'company_address': to_str, 'company_city': to_str,
+        'company_state': to_str, 'company_country': to_str, 'company_revenue': to_str,
+        'company_latest_funding': to_str, 'company_linkedin': to_str, 'urn': to_str,
+    }
+
+    for field, converter in field_map.items():
+        value = safe_get(field)
+        if value is not None:
+            converted_value = converter(value)
+            if converted_value is not None and converted_value != '':
+                key = 'companyName' if field == 'company' else field
+                key = 'followerCount' if field == 'followers' else key
+                if key not in metadata:
+                    metadata[key] = converted_value
+
+    if 'fullName' not in metadata and ('firstName' in metadata or 'lastName' in metadata):
+        first = metadata.get('firstName', '') or ''
+        last = metadata.get('lastName', '') or ''
+        full_name = f"{first} {last}".strip()
+        if full_name:
+            metadata['fullName'] = full_name
+
+    return metadata
+
+
+def reference_prepare(df):
+    texts, metadatas = [], []
+    for _, row in df.iterrows():
+        texts.append(reference_canonicalize(row))
+        metadatas.append(reference_extract_metadata(row))
+    return texts, metadatas
+
+
+def batched_prepare(df):
+    return profile_canonicalizer.canonicalize_profiles(df), profile_canonicalizer.extract_metadata_batch(df)
+
+
+# --- Synthetic data ---
+
+FRAGMENTS = [
+    "Senior Software Engineer", "Sr. Data Scientist", "sr Product Manager", "SR.engineer",
+    "<strong>10+ years</strong> in Python", "<p>Building <em>AI</em> products</p>",
+    "Tom &amp; Jerry Studios", "caf&eacute; owner", "R&D lead", "AT&T", "a < b", "x <br/> y",
+    "loves 🐍 and 🚀", "👩🏽‍💻 engineer", "Zürich", "São Paulo", "naïve résumé", "日本語",
+    "tabs\tand\nnewlines\r\nhere", "form\x0cfeed", "   padded   ", "", "nan", "Mr Srinivasan",
+]
+
+
+def synthetic_frame(rows, seed=7):
+    rng = random.Random(seed)
+
+    def text(max_parts=4):
+        return " ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, max_parts)))
+
+    def maybe(value):
+        return value if rng.random() > 0.15 else None
+
+    records = []
+    for i in range(rows):
+        records.append({
+            "urn": maybe(f"urn:li:member:{i}") if rng.random() > 0.1 else "  ",
+            "publicIdentifier": maybe(f"person-{i}"),
+            "fullName": maybe(text(2)),
+            "firstName": maybe(text(1)),
+            "lastName": maybe(text(1)),
+            "headline": maybe(text()),
+            "about": maybe(text(8)),
+            "experiences": maybe(text(6)),
+            "education": maybe(text(2)),
+            "skills": maybe(text(3)),
+            "companyName": maybe(text(1)),
+            "company": maybe(text(1)),
+            "city": maybe(rng.choice(["Zürich", "London", " New York ", ""])),
+            "country": maybe(rng.choice(["CH", "UK", "US"])),
+            "followerCount": maybe(rng.choice([12, 500, 1234567])),
+            "followers": maybe(rng.choice(["500+", "1,200", "n/a"])),
+            "connectionsCount": maybe(rng.choice([0.1 + 0.2, 1e21, 350.0, float("nan")])),
+            "isPremium": maybe(rng.choice([True, False])),
+            "isHiring": maybe(rng.choice(["yes", "No", "1", 0])),
+            "pronoun": maybe(rng.choice(["she/her", 3.0, ""])),
+        })
+    return pd.DataFrame(records)
+
+
+def check_equivalence(name, df):
+    expected = reference_prepare(df)
+    actual = batched_prepare(df)
+    assert actual[0] == expected[0], f"{name}: canonical text differs"
+    assert actual[1] == expected[1], f"{name}: metadata differs"
+    expected_ids = [
+        profile_canonicalizer.resolve_profile_id_row(row, f"profile_{index}") for index, row in df.iterrows()
+    ]
+    assert profile_canonicalizer.resolve_profile_ids(df) == expected_ids, f"{name}: profile ids differ"
+    print(f"  {name}: {len(df)} rows identical")
+
+
+def benchmark(df, repeats=3):
+    timings = {}
+    for label, prepare in (("iterrows + BeautifulSoup", reference_prepare), ("batched", batched_prepare)):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            prepare(df)
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+        print(f"  {label:<26} {best:.3f}s  ({len(df) / best:,.0f} rows/s)")
+    return timings["iterrows + BeautifulSoup"] / timings["batched"]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print("Equivalence:")
+    sample_frames = []
+    for csv_name in SAMPLE_CSVS:
+        df = pd.read_csv(os.path.join(BACKEND_DIR, csv_name))
+        check_equivalence(csv_name, df)
+        sample_frames.append(df)
+    check_equivalence("synthetic", synthetic_frame(5000))
+
+    # Benchmark on a realistic export: the sample profiles repeated up to `rows`
+    sample = pd.read_csv(os.path.join(BACKEND_DIR, SAMPLE_CSVS[0]))
+    large = pd.concat([sample] * (rows // len(sample) + 1), ignore_index=True).head(rows)
+
+    print(f"Benchmark ({len(large)} rows, best of 3):")
+    speedup = benchmark(large)
+    print(f"Speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the local vector store (VECTOR_STORE=local) without any external service.
+
+Upserts random unit vectors with profile-like filterable metadata into a
+scratch directory for each layout (float32, float16, and float32 with int8 or
+binary quantization) and reports:
+
+- memory scanned per query, per 100k vectors (the in-memory working set), and size on disk;
+- upsert throughput and the time to reopen the namespace from disk;
+- query latency percentiles for dense, filtered and hybrid (dense + sparse) queries;
+- recall@top_k against a brute-force float32 search (1.0 for float32, whose
+  scan is exact).
+
+By default vectors are drawn around cluster centres and queries near stored
+vectors, so that like real embeddings, a query's neighbours are much closer
+than the rest. --uniform draws isotropic random vectors instead, the worst case
+for quantization (every vector is about equally far from every query).
+
+Usage:
+    python test_local_vector_store.py [--vectors N] [--dimension D] [--queries Q] [--top-k K] [--rescore-factor F] [--uniform]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from app.services.local_vector_store import LocalVectorStore
+
+CITIES = ["San Francisco", "New York", "London", "Paris", "Berlin", "Toronto", "Austin", "Seattle"]
+NAMESPACE = "benchmark"
+LAYOUTS = [("float32", "none"), ("float16", "none"), ("float32", "int8"), ("float32", "binary")]
+UPSERT_BATCH = 500
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+def sparse_vector(indices):
+    return {"indices": indices, "values": [1.0] * len(indices)}
+
+
+def make_matrix(count: int, dimension: int, rng, uniform: bool):
+    matrix = rng.standard_normal((count, dimension), dtype=np.float32)
+    if uniform:
+        return matrix
+    centres = rng.standard_normal((max(1, count // 100), dimension), dtype=np.float32)
+    return centres[rng.integers(0, len(centres), count)] + 0.8 * matrix
+
+
+def make_vectors(matrix, rng):
+    vectors = [
+        {
+            "id": f"profile-{i}",
+            "values": matrix[i].tolist(),
+            "metadata": {"city": CITIES[i % len(CITIES)], "followerCount": int(rng.integers(0, 10000))},
+            "sparse_values": sparse_vector(sorted({int(term) for term in rng.integers(0, 5000, 20)})),
+        }
+        for i in range(len(matrix))
+    ]
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True), vectors
+
+
+def timed_queries(store, queries, top_k, **kwargs):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        response = store.query(vector=query.tolist(), top_k=top_k, namespace=NAMESPACE, include_metadata=True, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        results.append(response.matches)
+    return latencies, results
+
+
+def report(label, latencies, recall=None):
+    line = (f"  {label:<22} p50 {statistics.median(latencies) * 1000:7.2f} ms  "
+            f"p95 {percentile(latencies, 0.95) * 1000:7.2f} ms")
+    if recall is not None:
+        line += f"  recall@k {recall:.3f}"
+    print(line)
+
+
+def scanned_bytes_per_vector(dtype: str, quantization: str, dimension: int) -> int:
+    if quantization == "int8":
+        return dimension + 4  # codes plus a float32 scale
+    if quantization == "binary":
+        return (dimension + 63) // 64 * 8
+    return dimension * np.dtype(dtype).itemsize
+
+
+def benchmark(dtype: str, quantization: str, rescore_factor: int, normalized, vectors, queries, top_k: int):
+    directory = tempfile.mkdtemp(prefix=f"local-vector-store-{dtype}-{quantization}-")
+    try:
+        store = LocalVectorStore(directory, dtype, quantization, rescore_factor)
+        start = time.perf_counter()
+        for i in range(0, len(vectors), UPSERT_BATCH):
+            store.upsert(vectors[i:i + UPSERT_BATCH], namespace=NAMESPACE)
+        upsert_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reopened = LocalVectorStore(directory, dtype, quantization, rescore_factor)
+        count = reopened.describe_index_stats().namespaces[NAMESPACE].vector_count
+        reopen_seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+        scanned = scanned_bytes_per_vector(dtype, quantization, normalized.shape[1])
+        print(f"{dtype}, quantization={quantization}: {count} vectors, {size / 1024 / 1024:.1f} MB on disk")
+        print(f"  memory scanned per 100k vectors {scanned * 100000 / 1024 / 1024:,.1f} MB")
+        print(f"  upsert {len(vectors) / upsert_seconds:,.0f} vectors/s, reopen {reopen_seconds * 1000:.0f} ms")
+
+        # Brute-force ground truth in float32
+        expected = [set(np.argsort(-(normalized @ query))[:top_k]) for query in queries]
+        latencies, results = timed_queries(store, queries, top_k)
+        recall = statistics.mean(
+            len({int(match.id.split("-")[1]) for match in matches} & truth) / top_k
+            for matches, truth in zip(results, expected)
+        )
+        report("dense", latencies, recall)
+
+        latencies, results = timed_queries(store, queries, top_k, filter={"city": {"$in": CITIES[:2]}, "followerCount": {"$gte": 1000}})
+        assert all(match.metadata["city"] in CITIES[:2] for matches in results for match in matches)
+        report("filtered", latencies)
+
+        sparse = {"indices": list(range(0, 5000, 250)), "values": [0.05] * 20}
+        latencies, _ = timed_queries(store, queries, top_k, sparse_vector=sparse)
+        report("hybrid", latencies)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=30)
+    parser.add_argument("--uniform", action="store_true", help="Isotropic random vectors instead of clustered ones")
+    parser.add_argument("--rescore-factor", type=int, default=10, help="Shortlist size for quantized layouts, as a multiple of top_k")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = make_matrix(args.vectors, args.dimension, rng, args.uniform)
+    normalized, vectors = make_vectors(matrix, rng)
+    if args.uniform:
+        queries = rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+    else:
+        queries = matrix[rng.integers(0, args.vectors, args.queries)] + 0.8 * rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+    print(f"Local vector store: {args.vectors} vectors x {args.dimension} dims, "
+          f"{args.queries} queries, top_k={args.top_k}")
+    for dtype, quantization in LAYOUTS:
+        benchmark(dtype, quantization, args.rescore_factor, normalized, vectors, queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
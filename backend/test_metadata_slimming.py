@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Measures what slim Pinecone metadata saves on search queries.
+
+Prepares the profiles in a connections CSV exactly as ingestion does and
+compares the two PINECONE_METADATA_MODE layouts:
+
+- full: every profile field (including the canonical text) on each vector;
+- slim: only the filterable fields plus the profile ID, with the full profile
+  hydrated from MongoDB by one batched read per search.
+
+Offline it reports metadata bytes per vector and the size and JSON decode time
+of a top_k query response. With --live it also upserts the profiles (random
+vectors, no OpenAI calls) into two scratch namespaces of the configured index,
+runs the same queries through retrieval_service.hybrid_pinecone_query in both
+modes, reports response bytes and latency percentiles, and cleans up.
+
+Usage:
+    python test_metadata_slimming.py [csv_path] [--live] [--queries N] [--top-k K]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The services refuse to start without a key; no OpenAI request is made.
+os.environ.setdefault("OPENAI_API_KEY", "sk-metadata-test")
+
+import pandas as pd
+from app.services import profile_canonicalizer
+
+logging.getLogger("app").setLevel(logging.WARNING)
+
+EMBEDDING_DIMENSION = 1536
+# Pinecone rejects vectors whose metadata exceeds 40 KB
+PINECONE_METADATA_LIMIT = 40 * 1024
+
+
+def load_items(csv_path: str):
+    prepared = profile_canonicalizer.prepare_profiles(pd.read_csv(csv_path), None, "text-embedding-3-small")
+    return prepared["items"]
+
+
+def metadata_for(item, mode: str):
+    if mode == "slim":
+        return profile_canonicalizer.slim_metadata(item["profile_id"], item["metadata"])
+    return item["metadata"]
+
+
+def json_bytes(value) -> int:
+    return len(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+def offline_report(items, top_k: int):
+    print(f"Offline: {len(items)} profiles, top_k={top_k}")
+    sizes = {}
+    for mode in ("full", "slim"):
+        per_vector = [json_bytes(metadata_for(item, mode)) for item in items]
+        # What a query with include_metadata=True returns: ID, score and metadata per match
+        matches = [
+            {"id": item["profile_id"], "score": 0.5, "values": [], "metadata": metadata_for(item, mode)}
+            for item in (items * (top_k // len(items) + 1))[:top_k]
+        ]
+        body = json.dumps({"matches": matches, "namespace": "ns", "usage": {"read_units": 6}})
+        start = time.perf_counter()
+        for _ in range(200):
+            json.loads(body)
+        decode_ms = (time.perf_counter() - start) / 200 * 1000
+
+        sizes[mode] = len(body)
+        print(f"  {mode:<5} metadata/vector  avg {statistics.mean(per_vector):>8.0f} B  "
+              f"max {max(per_vector):>7} B  over 40 KB: {sum(size > PINECONE_METADATA_LIMIT for size in per_vector)}")
+        print(f"  {mode:<5} query response   {len(body):>8} B  decode {decode_ms:.3f} ms")
+    print(f"  response bytes: {sizes['full']} -> {sizes['slim']} "
+          f"({100 * (1 - sizes['slim'] / sizes['full']):.0f}% smaller)")
+
+
+async def live_report(items, queries: int, top_k: int):
+    from app.core.db import close_mongo_connection, connect_to_mongo, get_database
+    from app.services import profile_store_service
+    from app.services.embeddings_service import embeddings_service
+    from app.services.retrieval_service import retrieval_service
+
+    if not embeddings_service.index:
+        print("Live run needs PINECONE_API_KEY and PINECONE_INDEX_NAME")
+        return
+    await connect_to_mongo()
+    index = embeddings_service.index
+    query = retrieval_service.index.query
+    response_bytes = []
+
+    def measured_query(**kwargs):
+        response = query(**kwargs)
+        response_bytes.append(json_bytes(response.to_dict()))
+        return response
+
+    rng = random.Random(0)
+    embedded = [dict(item, embedding=[rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)]) for item in items]
+    query_vectors = [[rng.gauss(0, 1) for _ in range(EMBEDDING_DIMENSION)] for _ in range(queries)]
+
+    print(f"Live: {len(items)} profiles, {queries} queries per mode, top_k={top_k}")
+    try:
+        for mode in ("full", "slim"):
+            namespace = f"metadata-test-{mode}"
+            embeddings_service.metadata_mode = mode
+            await embeddings_service.index_profiles(embedded, namespace)
+
+            # Upserts are eventually consistent; wait until the namespace is complete
+            for _ in range(60):
+                stats = await asyncio.to_thread(index.describe_index_stats)
+                if namespace in stats.namespaces and stats.namespaces[namespace].vector_count >= len(items):
+                    break
+                await asyncio.sleep(1)
+
+            retrieval_service.index.query = measured_query
+            response_bytes.clear()
+            latencies = []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                profiles = await retrieval_service.hybrid_pinecone_query(vector, top_k=top_k, namespace=namespace)
+                latencies.append(time.perf_counter() - start)
+            del retrieval_service.index.query
+
+            print(f"  {mode:<5} response {statistics.mean(response_bytes):>8.0f} B  "
+                  f"latency p50 {statistics.median(latencies) * 1000:.0f} ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms  "
+                  f"(fields per profile: {len(profiles[0]) if profiles else 0})")
+    finally:
+        for mode in ("full", "slim"):
+            namespace = f"metadata-test-{mode}"
+            await asyncio.to_thread(index.delete, delete_all=True, namespace=namespace)
+            await profile_store_service.clear_profiles(get_database(), namespace)
+        await close_mongo_connection()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "updated_connections.csv"))
+    parser.add_argument("--live", action="store_true", help="Also measure against the configured Pinecone index and MongoDB")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=30)
+    args = parser.parse_args()
+
+    items = load_items(args.csv_path)
+    if not items:
+        print(f"No indexable profiles in {args.csv_path}")
+        return
+    offline_report(items, args.top_k)
+    if args.live:
+        await live_report(items, args.queries, args.top_k)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
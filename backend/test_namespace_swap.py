@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Check that re-uploads into versioned namespaces (INGEST_NAMESPACE_SWAP) stay incremental.
+
+Uploads a CSV for a scratch user, then:
+
+1. re-uploads it unchanged: nothing may be embedded or upserted, and searches
+   must stay on the same namespace;
+2. uploads it with one profile edited and one removed: only the edited profile
+   may be embedded and upserted, the rest are copied from the live namespace,
+   and the new live namespace must hold exactly the uploaded profiles.
+
+Vectors go to a local index in a scratch directory and embeddings come from a
+stand-in client, so nothing leaves the machine; the alias, manifests and
+profiles live in the configured MongoDB and are removed afterwards.
+
+Usage:
+    python test_namespace_swap.py [csv_path]
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="namespace-swap-test-")
+os.environ["VECTOR_STORE"] = "local"
+os.environ["LOCAL_VECTOR_STORE_DIR"] = SCRATCH_DIR
+os.environ["INGEST_NAMESPACE_SWAP"] = "true"
+# The services refuse to start without a key; no request leaves this process.
+os.environ.setdefault("OPENAI_API_KEY", "sk-namespace-swap-test")
+
+import pandas as pd
+from app.core.db import close_mongo_connection, connect_to_mongo, get_database
+from app.services import ingest_manifest_service, namespace_alias_service, profile_store_service, sparse_vocabulary_service
+from app.services.embedding_cache_service import embedding_cache_service
+from app.services.embeddings_service import embeddings_service
+
+
+class _FakeEmbeddingsClient:
+    """Minimal stand-in for openai.AsyncOpenAI that counts the texts it embeds."""
+
+    def __init__(self):
+        self.texts = 0
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    async def _create_embedding(self, model, input, **kwargs):
+        inputs = [input] if isinstance(input, str) else input
+        self.texts += len(inputs)
+        dimensions = kwargs.get("dimensions") or embeddings_service.embedding_dimensions
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=[(hash(text) % 1000 + i) / 1000.0 for i in range(dimensions)])
+            for text in inputs
+        ])
+
+
+async def upload(csv_path: str, user_id: str, client: _FakeEmbeddingsClient, upserted: list):
+    texts, vectors = client.texts, len(upserted)
+    result = await embeddings_service.process_profiles_and_upsert(csv_path=csv_path, user_id=user_id)
+    live = await namespace_alias_service.get_namespace(get_database(), user_id)
+    return result, live, client.texts - texts, len(upserted) - vectors
+
+
+async def run(csv_path: str) -> bool:
+    user_id = f"namespace-swap-test-{uuid.uuid4()}"
+    client = _FakeEmbeddingsClient()
+    embeddings_service.openai_client = client
+    embedding_cache_service.enabled = False
+    index = embeddings_service.index
+    upserted = []
+    upsert = index.upsert
+
+    def counted_upsert(vectors, namespace=""):
+        upserted.extend(vector["id"] for vector in vectors)
+        return upsert(vectors, namespace=namespace)
+
+    index.upsert = counted_upsert
+    changed_path = os.path.join(SCRATCH_DIR, "changed.csv")
+    passed = True
+    try:
+        result, first_live, texts, vectors = await upload(csv_path, user_id, client, upserted)
+        print(f"First upload: {vectors} vectors upserted into {first_live}")
+
+        result, live, texts, vectors = await upload(csv_path, user_id, client, upserted)
+        print(f"Unchanged re-upload: {texts} texts embedded, {vectors} vectors upserted, live namespace {live}")
+        if texts or vectors or live != first_live:
+            print("❌ An unchanged re-upload should embed and upsert nothing and keep the live namespace")
+            passed = False
+
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+        df.loc[df.index[0], "headline"] = "Headline edited by test_namespace_swap.py"
+        df.drop(index=df.index[1]).to_csv(changed_path, index=False)
+        expected = result["unchanged_count"] - 1
+
+        result, live, texts, vectors = await upload(changed_path, user_id, client, upserted)
+        stats = await asyncio.to_thread(index.describe_index_stats)
+        held = stats.namespaces[live].vector_count if live in stats.namespaces else 0
+        manifest = await ingest_manifest_service.get_manifest(get_database(), live)
+        print(f"Edited upload: {texts} texts embedded, {result['vectors_upserted']} vectors upserted, "
+              f"{result['vectors_copied']} copied, {result['vectors_deleted']} dropped; {live} holds {held} vectors")
+        if texts != 1 or result["vectors_upserted"] != 1 or result["vectors_copied"] != expected - 1:
+            print("❌ Only the edited profile should be embedded and upserted, the rest copied")
+            passed = False
+        if live == first_live or held != expected or len(manifest) != expected:
+            print(f"❌ The new live namespace should hold the {expected} uploaded profiles")
+            passed = False
+    finally:
+        index.upsert = upsert
+        db = get_database()
+        namespaces = {entry["namespace"] async for entry in db.namespace_gc.find({"user_id": user_id})}
+        namespaces.add(await namespace_alias_service.get_namespace(db, user_id))
+        for namespace in namespaces:
+            await ingest_manifest_service.clear_manifest(db, namespace)
+            await profile_store_service.clear_profiles(db, namespace)
+            await sparse_vocabulary_service.clear_vocabulary(db, namespace)
+        await db.namespace_gc.delete_many({"user_id": user_id})
+        await db.namespace_aliases.delete_one({"_id": user_id})
+    return passed
+
+
+async def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "updated_connections.csv")
+    print("=== Testing Namespace Swap Re-uploads ===")
+    await connect_to_mongo()
+    try:
+        await get_database().command("ping")
+    except Exception as e:
+        print(f"❌ MongoDB is not available: {e}")
+        return
+    try:
+        passed = await run(csv_path)
+    finally:
+        await close_mongo_connection()
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+    print("✅ Re-uploads only index what changed" if passed else "❌ Namespace swap test failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Check for the ingestion process pool (app/core/process_pool.py).
+
+Gets the pool twice and checks the second call reuses the first pool and keeps
+its worker count, which sizes the window of chunks ingestion keeps in flight.
+
+Usage:
+    python test_process_pool.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add the backend directory to the Python path
+backend_dir = Path(__file__).parent
+sys.path.insert(0, str(backend_dir))
+
+from app.core.process_pool import close_process_pool, get_process_pool, process_pool
+
+
+def main():
+    print("=== Testing Process Pool Reuse ===")
+    try:
+        first = get_process_pool()
+        workers = process_pool.max_workers
+        print(f"First call: {workers} workers")
+        assert workers > 0, "first call should size the pool"
+
+        second = get_process_pool()
+        print(f"Second call: {process_pool.max_workers} workers")
+        assert second is first, "second call should reuse the pool"
+        assert process_pool.max_workers > 0, "reused pool lost its worker count"
+        assert process_pool.max_workers == workers
+    finally:
+        close_process_pool()
+    print("✅ Process pool reused with its worker count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Load test for the OpenAI rate-limit governor.
+
+Starts openai_stub_server.py with tight per-model budgets, then runs a bulk
+embedding ingestion (background priority) while searches arrive one after
+another (interactive priority: query rewrite, query embedding, rerank). The
+same load runs twice through the real AsyncOpenAI client:
+
+- ungoverned: calls go straight out with the SDK's default retries, the
+  behaviour before the governor;
+- governed: calls go through app.core.openai_governor.
+
+and the report compares 429s, failed calls and search latency percentiles.
+Pinecone is stubbed; nothing leaves the machine.
+
+Usage:
+    python test_rate_limit_governor.py [batches] [searches] [port]
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PORT = int(sys.argv[3]) if len(sys.argv) > 3 else 8765
+
+# Settings are read at import time, so point the client at the stub first
+os.environ.setdefault("OPENAI_API_KEY", "sk-rate-limit-test")
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+
+# Add the backend directory to the Python path
+sys.path.append(BACKEND_DIR)
+
+import openai
+from app.core.openai_governor import OpenAIGovernor, openai_governor
+from app.core.openai_client import close_openai_client, get_openai_client
+from app.services.retrieval_service import retrieval_service
+from app.services.embeddings_service import embeddings_service
+
+logging.getLogger("app").setLevel(logging.ERROR)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+CANDIDATES = 30
+TEXTS_PER_BATCH = 20
+INGEST_CONCURRENCY = 16
+
+
+async def _fake_pinecone_query(vector, top_k=30, alpha=0.6, filter_dict=None, namespace="default_user", query_text=None):
+    return [
+        {"id": f"profile_{i}", "profile_id": f"profile_{i}", "full_name": f"Profile {i}"}
+        for i in range(CANDIDATES)
+    ]
+
+
+async def _ungoverned_run(model, call, priority=None, estimated_tokens=0):
+    return await call()
+
+
+def start_stub_server():
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "openai_stub_server.py"),
+         "--port", str(PORT), "--rpm", "30", "--tpm", "200000", "--window", "5", "--latency", "0.05"],
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/stats")
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("stub server did not start")
+
+
+async def ingest(batches: int) -> int:
+    """Embed `batches` batches of profile texts; returns how many texts failed."""
+    semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+    async def embed_batch(batch_number):
+        texts = [
+            f"profile {batch_number}-{i} senior engineer python distributed systems " * 8
+            for i in range(TEXTS_PER_BATCH)
+        ]
+        async with semaphore:
+            try:
+                embeddings = await embeddings_service.generate_embeddings_batch(texts)
+                return sum(1 for embedding in embeddings if embedding is None)
+            except openai.APIError:
+                return len(texts)
+
+    return sum(await asyncio.gather(*[embed_batch(n) for n in range(batches)]))
+
+
+async def search_stream(searches: int, interval: float):
+    """Run searches one after another at a fixed pace; returns (latencies, failures)."""
+    latencies, failures = [], 0
+
+    async def one_search(i):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            results = await retrieval_service.retrieve_and_rerank(
+                user_query=f"senior python engineer in zurich {i}",
+                user_id="rate_limit_test_user"
+            )
+            if not results:
+                failures += 1
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    for i in range(searches):
+        tasks.append(asyncio.create_task(one_search(i)))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return latencies, failures
+
+
+async def run_scenario(label: str, governed: bool, batches: int, searches: int):
+    httpx.post(f"http://127.0.0.1:{PORT}/stats/reset")
+    openai_governor.models.clear()
+    if governed:
+        openai_governor.run = OpenAIGovernor.run.__get__(openai_governor)
+    else:
+        openai_governor.run = _ungoverned_run
+
+    # Rebuild the shared client for each scenario: the SDK's default retries
+    # for the ungoverned run, none (the governor retries) for the governed one
+    await close_openai_client()
+    client = get_openai_client()
+    if not governed:
+        client = client.with_options(max_retries=2)
+    embeddings_service.openai_client = client
+    retrieval_service.openai_client = client
+    retrieval_service.hybrid_pinecone_query = _fake_pinecone_query
+
+    start = time.perf_counter()
+    failed_texts, (latencies, failed_searches) = await asyncio.gather(
+        ingest(batches),
+        search_stream(searches, interval=0.5),
+    )
+    elapsed = time.perf_counter() - start
+    stats = httpx.get(f"http://127.0.0.1:{PORT}/stats").json()
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{label}:")
+    print(f"  wall time          {elapsed:.1f}s")
+    print(f"  requests / 429s    {stats['requests']} / {stats['rate_limited']}")
+    print(f"  failed texts       {failed_texts} of {batches * TEXTS_PER_BATCH}")
+    print(f"  failed searches    {failed_searches} of {searches}")
+    print(f"  search latency     p50 {statistics.median(latencies):.2f}s  p95 {p95:.2f}s  max {latencies[-1]:.2f}s")
+    if governed:
+        for model, model_stats in openai_governor.get_stats().items():
+            print(f"  {model:<24} limit {model_stats['concurrency_limit']:>2}  "
+                  f"retries {model_stats['retries']:>3}  429s {model_stats['rate_limited']:>3}  "
+                  f"failures {model_stats['failures']}")
+    return stats["rate_limited"], failed_texts + failed_searches
+
+
+async def main():
+    batches = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print(f"Rate-limit test: {batches} embedding batches of {TEXTS_PER_BATCH} texts "
+          f"alongside {searches} searches, stub budget 30 requests / 200k tokens per 5s per model")
+    print("=" * 60)
+
+    before_429s, before_failures = await run_scenario("Ungoverned (SDK retries)", False, batches, searches)
+    after_429s, after_failures = await run_scenario("Governed", True, batches, searches)
+    await close_openai_client()
+
+    print("=" * 60)
+    print(f"429s: {before_429s} -> {after_429s}; failures: {before_failures} -> {after_failures}")
+    assert after_failures == 0, "governed run should not fail any call"
+
+
+if __name__ == "__main__":
+    server = start_stub_server()
+    try:
+        asyncio.run(main())
+    finally:
+        server.terminate()
+        server.wait()
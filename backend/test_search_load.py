@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Load test for the retrieval pipeline.
+
+Runs N concurrent searches through retrieval_service.retrieve_and_rerank with
+simulated OpenAI latency and a stubbed Pinecone query, first with a client that
+blocks the event loop (the old synchronous openai.OpenAI behaviour) and then
+with a non-blocking client (the shared AsyncOpenAI path), and reports the
+throughput of each.
+
+Usage:
+    python test_search_load.py [concurrency] [embedding_latency] [chat_latency]
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# The services refuse to start without a key; no request leaves this process.
+os.environ.setdefault("OPENAI_API_KEY", "sk-load-test")
+
+from app.services.retrieval_service import retrieval_service
+from app.services.query_cache_service import query_embedding_cache, query_rewrite_cache
+from app.services.embeddings_service import embeddings_service
+
+# Keep the per-search INFO logs from drowning out the report
+logging.getLogger("app").setLevel(logging.WARNING)
+
+CANDIDATES = 30
+EMBEDDING_DIMENSION = 1536
+
+
+def _embedding_response(inputs):
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    return SimpleNamespace(data=[SimpleNamespace(embedding=[0.0] * EMBEDDING_DIMENSION) for _ in inputs])
+
+
+def _chat_response(messages):
+    user_message = messages[-1]["content"]
+    profile_ids = re.findall(r'"id": "([^"]+)"', user_message)
+    if profile_ids:
+        content = json.dumps([
+            {"profile_id": profile_id, "score": 8, "pros": ["Relevant."], "cons": ["None."]}
+            for profile_id in profile_ids
+        ])
+    else:
+        content = "concise search intent"
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class _FakeOpenAIClient:
+    """Minimal stand-in for openai.AsyncOpenAI with configurable latency."""
+
+    def __init__(self, embedding_latency: float, chat_latency: float, blocking: bool):
+        self.embedding_latency = embedding_latency
+        self.chat_latency = chat_latency
+        self.blocking = blocking
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    async def _wait(self, seconds: float):
+        if self.blocking:
+            # What a synchronous client does inside an async def: freeze the loop
+            time.sleep(seconds)
+        else:
+            await asyncio.sleep(seconds)
+
+    async def _create_embedding(self, model, input, **kwargs):
+        await self._wait(self.embedding_latency)
+        return _embedding_response(input)
+
+    async def _create_chat_completion(self, model, messages, **kwargs):
+        await self._wait(self.chat_latency)
+        return _chat_response(messages)
+
+
+async def _fake_pinecone_query(vector, top_k=30, alpha=0.6, filter_dict=None, namespace="default_user", query_text=None):
+    return [
+        {"id": f"profile_{i}", "profile_id": f"profile_{i}", "full_name": f"Profile {i}"}
+        for i in range(CANDIDATES)
+    ]
+
+
+async def run_load(client: _FakeOpenAIClient, concurrency: int) -> float:
+    """Run `concurrency` searches at once and return searches per second."""
+    retrieval_service.openai_client = client
+    embeddings_service.openai_client = client
+    retrieval_service.hybrid_pinecone_query = _fake_pinecone_query
+    # Both runs use the same queries; the second must not be served from the query caches
+    query_rewrite_cache.clear()
+    query_embedding_cache.clear()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        retrieval_service.retrieve_and_rerank(
+            user_query=f"senior python engineer {i}",
+            user_id="load_test_user"
+        )
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    assert all(len(result) > 0 for result in results), "every search should return results"
+    print(f"  {concurrency} searches in {elapsed:.2f}s -> {concurrency / elapsed:.2f} searches/sec")
+    return concurrency / elapsed
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    embedding_latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    chat_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+
+    print(f"Load test: {concurrency} concurrent searches, "
+          f"embedding latency {embedding_latency}s, chat latency {chat_latency}s")
+    print("=" * 60)
+
+    print("Before (synchronous client blocking the event loop):")
+    before = await run_load(_FakeOpenAIClient(embedding_latency, chat_latency, blocking=True), concurrency)
+
+    print("After (shared AsyncOpenAI client):")
+    after = await run_load(_FakeOpenAIClient(embedding_latency, chat_latency, blocking=False), concurrency)
+
+    print("=" * 60)
+    print(f"Throughput improvement: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vector upsert engine (app/core/vector_upsert_engine.py).
+
+Upserts profile-like vectors (1536 float16-precision values and full metadata,
+as in PINECONE_METADATA_MODE=full) into a simulated Pinecone index that:
+
+- charges each request a round trip plus its JSON body size over a fixed bandwidth;
+- rejects requests whose JSON body exceeds 2 MB with HTTP 400, like Pinecone;
+- fails a share of requests with HTTP 503.
+
+It runs the previous behaviour (fixed 500-vector batches sent one after another,
+no retries) and the engine, and reports throughput, rejected requests, the
+largest request actually sent, and per-request latency. Nothing leaves the machine.
+
+Usage:
+    python test_vector_upserts.py [vectors] [round_trip_ms] [bandwidth_mb_per_s] [failure_rate]
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from app.core.vector_upsert_engine import VectorUpsertEngine
+
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+DIMENSION = 1536
+NAMESPACE = "benchmark"
+# Serialized size of each record, measured once so the simulated index spends its time sleeping
+RECORD_BYTES = {}
+
+
+class SimulatedError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SimulatedIndex:
+    """Stands in for a Pinecone Index: sleeps for the request's transfer time."""
+
+    def __init__(self, round_trip: float, bandwidth: float, failure_rate: float):
+        self.round_trip = round_trip
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        self.stored = set()
+        self.rejected = 0
+        self.failed = 0
+        self.largest_request = 0
+
+    def upsert(self, vectors, namespace):
+        # The JSON body the client would send: each record plus ", " between them
+        body = sum(RECORD_BYTES[vector["id"]] for vector in vectors) + 2 * len(vectors) + len(namespace) + 32
+        time.sleep(self.round_trip + body / self.bandwidth)
+        with self.lock:
+            if body > MAX_REQUEST_BYTES:
+                self.rejected += 1
+                raise SimulatedError(400, f"Request size {body} exceeds the maximum of {MAX_REQUEST_BYTES}")
+            if self.random.random() < self.failure_rate:
+                self.failed += 1
+                raise SimulatedError(503, "Service unavailable")
+            self.largest_request = max(self.largest_request, body)
+            self.stored.update(vector["id"] for vector in vectors)
+        return {"upserted_count": len(vectors)}
+
+
+def make_vectors(count: int):
+    rng = np.random.default_rng(0)
+    # Cached embeddings are float16, so values have float16 precision
+    values = rng.standard_normal((count, DIMENSION)).astype(np.float16) / 40
+    experiences = " | ".join(f"Role {i} at Company {i} (2015-2020): led projects and teams" for i in range(12))
+    vectors = [
+        {
+            "id": f"profile-{i}",
+            "values": values[i].astype(np.float64).tolist(),
+            "metadata": {
+                "full_name": f"Profile {i}",
+                "city": "San Francisco",
+                "followerCount": int(rng.integers(0, 10000)),
+                "canonical_text": f"profile {i} senior engineer " + "distributed systems python " * 40,
+                "experiences": experiences,
+            },
+        }
+        for i in range(count)
+    ]
+    for vector in vectors:
+        RECORD_BYTES[vector["id"]] = len(json.dumps(vector))
+    return vectors
+
+
+def serial_fixed_batches(index: SimulatedIndex, vectors, batch_size: int = 500):
+    """The previous batch_upsert_to_pinecone: fixed batches, one at a time, no retries."""
+    latencies = []
+    for i in range(0, len(vectors), batch_size):
+        started = time.perf_counter()
+        try:
+            index.upsert(vectors[i:i + batch_size], NAMESPACE)
+        except SimulatedError:
+            pass
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, index: SimulatedIndex, count: int, seconds: float, latencies):
+    latencies = sorted(latencies)
+    print(f"{label}")
+    print(f"  {len(index.stored)}/{count} vectors stored in {seconds:.2f}s ({len(index.stored) / seconds:,.0f} vectors/s)")
+    print(f"  requests rejected as too large {index.rejected}, transient failures {index.failed}")
+    print(f"  largest request sent {index.largest_request / 1024 / 1024:.2f} MB")
+    if latencies:
+        print(f"  request latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms over {len(latencies)} requests")
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    round_trip = (float(sys.argv[2]) if len(sys.argv) > 2 else 60) / 1000
+    bandwidth = (float(sys.argv[3]) if len(sys.argv) > 3 else 50) * 1024 * 1024
+    failure_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.05
+
+    vectors = make_vectors(count)
+    print(f"Upsert benchmark: {count} vectors x {DIMENSION} dims with full metadata, "
+          f"round trip {round_trip * 1000:.0f} ms, {bandwidth / 1024 / 1024:.0f} MB/s, "
+          f"{failure_rate:.0%} transient failures")
+    print("=" * 60)
+
+    index = SimulatedIndex(round_trip, bandwidth, failure_rate)
+    started = time.perf_counter()
+    latencies = serial_fixed_batches(index, vectors)
+    report("Serial 500-vector batches", index, count, time.perf_counter() - started, latencies)
+
+    index = SimulatedIndex(round_trip, bandwidth, failure_rate)
+    engine = VectorUpsertEngine(max_bytes=1800000, max_vectors=1000, concurrency=8, max_retries=5)
+    started = time.perf_counter()
+    result = await engine.upsert(index, vectors, NAMESPACE)
+    seconds = time.perf_counter() - started
+    report("Upsert engine (byte-sized batches, 8 concurrent, retries)", index, count, seconds,
+           [latency / 1000 for latency in result["latencies_ms"]])
+    print(f"  engine stats: {engine.get_stats()}")
+    engine.close()
+
+    assert len(index.stored) == count, "every vector should be stored"
+    assert index.rejected == 0, "no request should exceed the size limit"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())